@@ -22,6 +22,29 @@ class Settings(BaseSettings):
     # Configuración del modelo
     model_path: Optional[str] = None
     confidence_threshold: float = 0.5
+    model_imgsz: int = 640  # Tamaño de entrada si el modelo no lo define
+    warmup_sizes: list = [[640, 480]]  # Frames [ancho, alto] de warm-up
+    warmup_runs: int = 2  # Inferencias de warm-up por tamaño
+    
+    # Endpoints de administración (deshabilitados si no hay token)
+    admin_token: Optional[str] = None
+    
+    # Inferencia por mosaicos (tiles) para EPP pequeño en frames grandes
+    tiling_enabled: bool = False
+    tile_size: Optional[int] = None  # None = imgsz del modelo
+    tile_overlap: float = 0.2  # Solapamiento entre tiles
+    tile_max: int = 8  # Máximo de tiles por frame
+    tile_latency_budget_ms: float = 0.0  # 0 = sin presupuesto de latencia
+    tile_nms_iou: float = 0.5  # IoU para NMS entre tiles
+    tile_around_persons: bool = True  # Solo tiles que contienen personas
+    
+    # Perfiles de EPP requeridos por zona (se compilan a bitmasks)
+    ppe_profiles: dict = {
+        "completo": ["casco", "lentes", "guantes", "botas", "ropa", "tapabocas"],
+        "general": ["casco", "lentes", "guantes", "botas", "ropa"],
+        "pintura": ["casco", "lentes", "guantes", "botas", "ropa", "tapabocas"],
+    }
+    ppe_default_profile: str = "completo"
     
     # Configuración WebSocket
     ws_heartbeat_interval: int = 15  # Ping cada 15 segundos
@@ -30,9 +53,78 @@ class Settings(BaseSettings):
     
     # Configuración de recursos
     max_image_size_mb: float = 2.0  # Máximo 2MB por imagen
+    max_frame_pixels: int = 3840 * 2160  # Píxeles máximos por frame (0 = sin límite)
+    frame_downscale: bool = True  # Decodificar frames grandes al tamaño del modelo
+    memory_tracing: bool = False  # tracemalloc desde el arranque (/api/debug/memory)
+    profile_max_seconds: int = 60  # Duración máxima de /api/debug/profile
+    slow_frames_capacity: int = 20  # Frames más lentos conservados con sus etapas (0 = deshabilitado)
     max_workers: int = 4  # Workers para ThreadPoolExecutor
+    intra_op_threads: int = 0  # Hilos de torch por worker (0 = núcleos / workers)
+    inter_op_threads: int = 1  # Hilos inter-op de torch por proceso
+    cpu_affinity: bool = False  # Fijar cada worker a su bloque de núcleos (Linux)
+    decode_workers: int = 2  # Hilos de la etapa de decodificación (base64 + imdecode)
+    pipeline_queue_per_worker: int = 1  # Frames en espera por hilo de inferencia entre etapas
     max_queue_size: int = 100  # Máximo tareas en cola
     
+    # Scheduler justo de inferencia (token bucket + WRR por prioridad)
+    scheduler_max_fps: float = 5.0  # FPS máximo admitido por conexión
+    scheduler_burst: int = 3  # Frames que se pueden admitir de golpe
+    scheduler_priority_weights: dict = {"alta": 4, "normal": 2, "baja": 1}
+    scheduler_default_priority: str = "normal"
+    http_client_idle_seconds: float = 300.0  # Se olvida el bucket de un cliente HTTP inactivo
+    
+    # Degradación automática bajo sobrecarga (escalones con histéresis)
+    degradation_enabled: bool = True
+    degradation_levels: list = [
+        {"name": "normal"},
+        {"name": "imgsz_reducido", "imgsz": 480},
+        {"name": "gate_espaciado", "imgsz": 480, "person_every": 3},
+        {"name": "fps_reducido", "imgsz": 416, "person_every": 3, "fps_scale": 0.5},
+        {"name": "descarte", "imgsz": 416, "person_every": 3, "fps_scale": 0.5, "shed": True},
+    ]
+    degradation_queue_high: float = 2.0  # Frames en cola por worker para escalar
+    degradation_queue_low: float = 0.5  # Frames en cola por worker para recuperar
+    degradation_latency_high_ms: float = 1500.0  # p95 (cola + inferencia) para escalar
+    degradation_latency_low_ms: float = 500.0  # p95 para recuperar
+    degradation_escalate_after: float = 3.0  # Segundos de sobrecarga antes de escalar
+    degradation_recover_after: float = 15.0  # Segundos holgados antes de recuperar
+    
+    # Difusión de resultados a suscriptores (dashboards)
+    stream_subscriber_buffer: int = 4  # Resultados en buffer por suscriptor
+    
+    # Suavizado temporal del cumplimiento por stream
+    temporal_window: int = 5  # Frames en la ventana deslizante
+    temporal_on_ratio: float = 0.6  # Fracción para marcar un EPP como presente
+    temporal_off_ratio: float = 0.3  # Fracción para volver a marcarlo faltante
+    
+    # Historial persistente de detecciones (SQLite WAL)
+    history_enabled: bool = True
+    history_db_path: str = "data/history.db"
+    history_queue_size: int = 10000  # Eventos pendientes antes de descartar
+    history_batch_size: int = 500  # Eventos por transacción
+    history_flush_interval: float = 1.0  # Segundos máximos sin escribir
+    
+    # Evidencias JPEG de frames sin cumplimiento (opt-in)
+    snapshots_enabled: bool = False
+    snapshots_dir: str = "data/snapshots"
+    snapshots_queue_size: int = 32  # Frames pendientes antes de descartar
+    snapshots_jpeg_quality: int = 80
+    snapshots_max_side: int = 1280  # Lado mayor del JPEG guardado (0 = original)
+    snapshots_draw_boxes: bool = True  # Dibujar las detecciones sobre la evidencia
+    snapshots_dedup_seconds: float = 30.0  # Una evidencia por stream y ventana (salvo EPP faltante distinto)
+    snapshots_max_bytes: int = 2 * 1024 ** 3  # Tamaño total máximo en disco (0 = sin límite)
+    snapshots_max_age_hours: float = 168.0  # Antigüedad máxima (0 = sin límite)
+    
+    # Recomendaciones de captura enviadas a los clientes
+    hints_min_fps: float = 0.5
+    hints_target_utilization: float = 0.8  # Fracción de capacidad a ocupar
+    
+    # Escalado horizontal: workers front-end + servidor local de inferencia
+    inference_mode: str = "local"  # "local" (un proceso) o "remote" (Unix socket)
+    inference_socket: str = "/tmp/epp_inference.sock"
+    frontend_workers: int = 1  # Workers de uvicorn en modo remote (>1 deshabilita /ws/streams)
+    cluster_report_interval: float = 5.0  # Segundos entre reportes de métricas
+    
     # Configuración Uvicorn
     uvicorn_timeout_keep_alive: int = 600  # 10 minutos
     uvicorn_limit_concurrency: int = 50  # Máximo conexiones
@@ -1,6 +1,12 @@
 """
 Controladores de la API
 """
-from .ppe_controller import router, init_detector
+from .ppe_controller import (
+    router, init_detector, init_cluster, report_cluster_metrics, set_startup_phase,
+    ws_manager, history_store, snapshot_store, thread_topology
+)
 
-__all__ = ["router", "init_detector"]
+__all__ = [
+    "router", "init_detector", "init_cluster", "report_cluster_metrics", "set_startup_phase",
+    "ws_manager", "history_store", "snapshot_store", "thread_topology",
+]
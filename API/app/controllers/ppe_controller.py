@@ -1,41 +1,271 @@
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Header, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 import asyncio
 import json
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
 import time
+import heapq
+import hmac
 import traceback
 import base64
 import os
+import re
+import tracemalloc
+import threading
 from concurrent.futures import ThreadPoolExecutor
 from starlette.websockets import WebSocketState
+from starlette.concurrency import run_in_threadpool
 from collections import deque
 
-from app.models.ppe_models import ImageRequest, DetectionResponse, ErrorResponse
+from app.config import settings
+from app.models.ppe_models import ImageRequest, DetectionResponse, ErrorResponse, ModelReloadRequest
 from app.services.ppe_service import PPEDetectorService
+from app.services.frame_scheduler import FairFrameScheduler
+from app.services.client_hints import ClientHintAdvisor
+from app.services.response_codec import ResponseEncoder, ppe_status_to_bits
+from app.services.stream_hub import StreamHub
+from app.services.history_store import DetectionHistoryStore
+from app.services.temporal_aggregator import StreamAggregators
+from app.services.cpu_topology import ThreadTopology
+from app.services.remote_inference import RemoteDetectorService
+from app.services.frame_memory import process_memory
+from app.services.sampling_profiler import SamplingProfiler, SlowFrameRecorder
+from app.services.degradation import DegradationController
+from app.services.frame_pipeline import FramePipeline
+from app.services.snapshot_store import ViolationSnapshotStore
 
 
 router = APIRouter(prefix="/api", tags=["PPE Detection"])
 
 detector_service: Optional[PPEDetectorService] = None
+detector_factory: Optional[Callable[[Optional[str], Optional[str]], PPEDetectorService]] = None
+hint_advisor: Optional[ClientHintAdvisor] = None
+# Coordinador entre workers front-end (solo con inference_mode="remote")
+cluster_client: Optional[RemoteDetectorService] = None
 
-MAX_WORKERS = min(4, (os.cpu_count() or 1) + 1)
+MAX_WORKERS = min(settings.max_workers, (os.cpu_count() or 1) + 1)
 MAX_IMAGE_SIZE_MB = 2
 MAX_ACTIVE_CONNECTIONS = 50 
 INACTIVE_TIMEOUT = 120
 MAX_QUEUE_SIZE = 100 
+HEARTBEAT_INTERVAL = settings.ws_heartbeat_interval
+# Con varios workers front-end el StreamHub de cada proceso solo ve sus
+# propios productores: las suscripciones a streams se rechazan
+MULTI_WORKER = settings.inference_mode == "remote" and settings.frontend_workers > 1
+HEARTBEAT_SEND_TIMEOUT = 5
+# Ids que asigna WebSocketManager ("ws-N", "ws-<pid>-N")
+CONNECTION_ID_PATTERN = re.compile(r"ws(-\d+)+")
 
-executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="yolo_")
+thread_topology = ThreadTopology(
+    MAX_WORKERS,
+    intra_op_threads=settings.intra_op_threads,
+    inter_op_threads=settings.inter_op_threads,
+    pin_cpus=settings.cpu_affinity,
+)
+thread_topology.limit_native_threads()
 
+executor = ThreadPoolExecutor(
+    max_workers=MAX_WORKERS,
+    thread_name_prefix="yolo_",
+    # En modo remote estos hilos solo esperan al socket: no necesitan torch
+    initializer=thread_topology.initialize_worker if settings.inference_mode == "local" else None
+)
 
-def init_detector(service: PPEDetectorService):
-    global detector_service
+# Frames simultáneos en el pipeline: uno por hilo de inferencia más los que
+# esperan entre etapas; el resto aguarda turno (WRR) en el scheduler
+PIPELINE_SLOTS = MAX_WORKERS * (1 + max(0, settings.pipeline_queue_per_worker))
+inference_scheduler = FairFrameScheduler(
+    max_concurrency=PIPELINE_SLOTS,
+    priority_weights=settings.scheduler_priority_weights,
+    default_priority=settings.scheduler_default_priority,
+    max_fps=settings.scheduler_max_fps,
+    burst=settings.scheduler_burst,
+)
+# Cámara con la que se registran en historial y evidencias los frames HTTP
+HTTP_CONNECTION_ID = "http"
+# Cada cliente HTTP (por host) tiene su propio bucket; se registra al primer
+# uso y se olvida tras `http_client_idle_seconds` sin solicitudes
+http_clients: Dict[str, float] = {}
+_http_sweep = {"next": 0.0}
+
+# Etapa de decodificación en su propio pool: los hilos `yolo_` solo infieren
+DECODE_WORKERS = max(1, settings.decode_workers)
+decode_executor = ThreadPoolExecutor(
+    max_workers=DECODE_WORKERS,
+    thread_name_prefix="decode_"
+)
+frame_pipeline = FramePipeline(
+    decode_executor,
+    DECODE_WORKERS,
+    executor,
+    MAX_WORKERS,
+    inference_scheduler,
+)
+
+degradation: Optional[DegradationController] = None
+if settings.degradation_enabled:
+    degradation = DegradationController(
+        settings.degradation_levels,
+        capacity=MAX_WORKERS,
+        queue_high=settings.degradation_queue_high,
+        queue_low=settings.degradation_queue_low,
+        latency_high_ms=settings.degradation_latency_high_ms,
+        latency_low_ms=settings.degradation_latency_low_ms,
+        escalate_after=settings.degradation_escalate_after,
+        recover_after=settings.degradation_recover_after,
+    )
+
+stream_hub = StreamHub(buffer_size=settings.stream_subscriber_buffer)
+stream_aggregators = StreamAggregators(
+    window=settings.temporal_window,
+    on_ratio=settings.temporal_on_ratio,
+    off_ratio=settings.temporal_off_ratio,
+)
+
+profiler = SamplingProfiler(thread_prefixes=("yolo_", "decode_"))
+slow_frames = SlowFrameRecorder(capacity=settings.slow_frames_capacity)
+
+history_store: Optional[DetectionHistoryStore] = None
+if settings.history_enabled:
+    history_store = DetectionHistoryStore(
+        settings.history_db_path,
+        queue_size=settings.history_queue_size,
+        batch_size=settings.history_batch_size,
+        flush_interval=settings.history_flush_interval,
+    )
+
+snapshot_store: Optional[ViolationSnapshotStore] = None
+if settings.snapshots_enabled:
+    snapshot_store = ViolationSnapshotStore(
+        settings.snapshots_dir,
+        queue_size=settings.snapshots_queue_size,
+        jpeg_quality=settings.snapshots_jpeg_quality,
+        max_side=settings.snapshots_max_side,
+        draw_boxes=settings.snapshots_draw_boxes,
+        dedup_seconds=settings.snapshots_dedup_seconds,
+        max_bytes=settings.snapshots_max_bytes,
+        max_age_hours=settings.snapshots_max_age_hours,
+    )
+
+
+# Progreso del arranque en segundo plano (ver main.initialize_services)
+startup_state: Dict = {"phase": "pending", "started_at": time.time(), "timings_ms": {}}
+
+
+def set_startup_phase(phase: str, **details):
+    """Actualiza la fase de arranque expuesta en /health y /ready"""
+    startup_state["phase"] = phase
+    startup_state.update(details)
+    print(f"Arranque: {phase}")
+
+
+def init_detector(
+    service: PPEDetectorService,
+    factory: Optional[Callable[[Optional[str], Optional[str]], PPEDetectorService]] = None
+):
+    """
+    Publica el detector activo. Reemplazar la referencia es atómico: los
+    trabajos en curso terminan con la instancia que ya tenían.
+    `factory(model_path, version)` construye detectores para recargas.
+    """
+    global detector_service, detector_factory, hint_advisor
     detector_service = service
+    if factory is not None:
+        detector_factory = factory
+    if hint_advisor is None:
+        hint_advisor = ClientHintAdvisor(
+            input_size=service.get_input_size(settings.model_imgsz),
+            workers=MAX_WORKERS,
+            min_fps=settings.hints_min_fps,
+            max_fps=settings.scheduler_max_fps,
+            target_utilization=settings.hints_target_utilization,
+        )
+    else:
+        hint_advisor.input_size = service.get_input_size(settings.model_imgsz)
+
+
+async def claim_stream(stream_id: str, owner: str) -> bool:
+    """Reserva el stream en este worker y, en modo remote, en todo el cluster"""
+    if not stream_hub.claim(stream_id, owner):
+        return False
+    if cluster_client is None:
+        return True
+    try:
+        granted = await run_in_threadpool(cluster_client.claim_stream, stream_id, owner)
+    except Exception as e:
+        print(f"Coordinador no disponible: {e}")
+        granted = False
+    if not granted:
+        stream_hub.release(stream_id, owner)
+    return granted
+
+
+def release_stream(stream_id: str, owner: str):
+    stream_hub.release(stream_id, owner)
+    if cluster_client is not None:
+        # Si falla, la reserva expira con el worker
+        asyncio.get_running_loop().run_in_executor(None, _release_cluster_stream, stream_id, owner)
+
+
+def _release_cluster_stream(stream_id: str, owner: str):
+    try:
+        cluster_client.release_stream(stream_id, owner)
+    except Exception:
+        pass
+
+
+def init_cluster(client: RemoteDetectorService):
+    """Activa la coordinación de límites y métricas entre workers"""
+    global cluster_client
+    cluster_client = client
+    ws_manager.id_prefix = f"ws-{os.getpid()}"
+
+
+async def report_cluster_metrics():
+    """Reporta periódicamente las métricas de este worker al coordinador"""
+    while True:
+        await asyncio.sleep(settings.cluster_report_interval)
+        if cluster_client is None:
+            continue
+        try:
+            await run_in_threadpool(cluster_client.report_metrics, ws_manager.get_metrics())
+        except Exception as e:
+            print(f"No se pudieron reportar métricas al coordinador: {e}")
+
+
+def current_client_hints() -> Dict:
+    """Recomendación de captura según la carga actual del pipeline"""
+    if hint_advisor is None:
+        return {}
+    queued, running = frame_pipeline.load()
+    imgsz, _ = degradation_params()
+    return hint_advisor.recommend(
+        len(ws_manager.active_connections), queued, running,
+        rate_scale=inference_scheduler.rate_scale, input_size=imgsz
+    )
+
+
+def http_connection_id(host: Optional[str]) -> str:
+    """Id del scheduler para el cliente HTTP (lo registra si hace falta)"""
+    now = time.monotonic()
+    conn_id = f"{HTTP_CONNECTION_ID}:{host or 'desconocido'}"
+    if not inference_scheduler.is_registered(conn_id):
+        inference_scheduler.register(conn_id)
+    http_clients[conn_id] = now
+
+    if now >= _http_sweep["next"]:
+        _http_sweep["next"] = now + 10.0
+        limit = now - settings.http_client_idle_seconds
+        for client_id in [cid for cid, seen in http_clients.items() if seen < limit]:
+            if inference_scheduler.is_idle(client_id):
+                inference_scheduler.unregister(client_id)
+                del http_clients[client_id]
+    return conn_id
 
 
 @router.post("/detect", response_model=DetectionResponse)
-async def detect_ppe(request: ImageRequest):
+async def detect_ppe(request: ImageRequest, http_request: Request):
     try:
         if not detector_service or not detector_service.is_ready():
             raise HTTPException(
@@ -43,33 +273,146 @@ async def detect_ppe(request: ImageRequest):
                 detail="Servicio de detección no disponible"
             )
         
-        result = detector_service.detect_from_base64(
+        # Perfil inválido: 400 antes de gastar tokens o decodificar
+        profile = detector_service.resolve_profile(request.profile)
+        
+        conn_id = http_connection_id(http_request.client.host if http_request.client else None)
+        admitted, retry_after = inference_scheduler.try_admit(conn_id)
+        if not admitted:
+            raise HTTPException(
+                status_code=429,
+                detail="Demasiadas solicitudes, reintenta más tarde",
+                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+            )
+        
+        shed_retry = check_overload()
+        if shed_retry is not None:
+            raise HTTPException(
+                status_code=503,
+                detail="Servicio sobrecargado, reintenta más tarde",
+                headers={"Retry-After": str(max(1, int(shed_retry + 0.999)))}
+            )
+        
+        imgsz, _ = degradation_params()
+        frame_start = time.perf_counter()
+        result = await frame_pipeline.run(
+            conn_id,
+            detector_service,
             request.image,
-            confidence=request.confidence
+            request.confidence,
+            profile,
+            None,
+            imgsz
         )
+        inference_ms = (time.perf_counter() - frame_start) * 1000
+        if degradation is not None:
+            degradation.observe_latency(inference_ms)
+            result.degradation_level = degradation.level
+        
+        record_history(HTTP_CONNECTION_ID, result)
+        record_snapshot(HTTP_CONNECTION_ID, request.image, result)
         
+        record_frame_timings(conn_id, frame_start, result, {"inference_ms": inference_ms})
         return result
     
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
 
+def update_degradation():
+    """Reevalúa la escalera y aplica el escalado de FPS del nivel actual"""
+    if degradation is None:
+        return
+    queued, _ = frame_pipeline.load()
+    if degradation.evaluate(queued):
+        inference_scheduler.set_rate_scale(degradation.current.fps_scale)
+
+
+def check_overload() -> Optional[float]:
+    """None si el frame entra; si no, los segundos de Retry-After"""
+    if degradation is None:
+        return None
+    update_degradation()
+    queued, _ = frame_pipeline.load()
+    if degradation.should_shed(queued):
+        return degradation.retry_after()
+    return None
+
+
+def degradation_params() -> Tuple[Optional[int], int]:
+    """(imgsz, detector de personas cada N frames) del nivel actual"""
+    if degradation is None:
+        return None, 1
+    level = degradation.current
+    return level.imgsz, level.person_every
+
+
+def record_history(camera: str, result: DetectionResponse):
+    """Encola el evento con el EPP que exige su perfil (no bloquea)"""
+    # Un frame con persona supuesta (degradación) no es evidencia
+    if history_store is None or result.person_inferred:
+        return
+    try:
+        required = detector_service.get_profile_mask(result.profile)
+    except (KeyError, ValueError):
+        return
+    history_store.record(camera, result, required)
+
+
+def record_snapshot(camera: str, base64_image: str, result: DetectionResponse):
+    """Entrega el frame sin cumplimiento al escritor de evidencias (no bloquea)"""
+    # Un frame con persona supuesta (degradación) no es evidencia
+    if snapshot_store is None or result.is_compliant or result.profile is None or result.person_inferred:
+        return
+    try:
+        required = detector_service.get_profile_mask(result.profile)
+    except (KeyError, ValueError):
+        return
+    missing_bits = required & ~ppe_status_to_bits(result.ppe_status)
+    snapshot_store.record(camera, base64_image, result, missing_bits)
+
+
+def record_frame_timings(connection: str, frame_start: float, result: DetectionResponse, stages: Dict[str, float]):
+    """Registra el frame en el ranking de los más lentos con sus etapas"""
+    total_ms = (time.perf_counter() - frame_start) * 1000
+    stages = dict(stages)
+    timings = result.stage_timings or {}
+    if "inference_ms" in stages and result.processing_time is not None and "inference_wait_ms" not in timings:
+        # Sin pipeline local (modo remote): lo que no gastó el detector fue espera
+        worker_ms = result.processing_time + timings.get("decode_ms", 0.0)
+        stages["queue_ms"] = max(0.0, stages["inference_ms"] - worker_ms)
+    stages.update(timings)
+    slow_frames.record(total_ms, connection, stages, profile=result.profile, has_person=result.has_person)
+
+
 @router.get("/health")
 async def health_check():
     if not detector_service:
+        failed = startup_state["phase"] == "failed"
         return JSONResponse(
             status_code=503,
             content={
-                "status": "unhealthy",
-                "message": "Detector no inicializado"
+                "status": "unhealthy" if failed else "starting",
+                "message": "Error al inicializar el detector" if failed else "Detector inicializándose",
+                "startup": startup_state
             }
         )
     
     is_ready = detector_service.is_ready()
     model_info = detector_service.get_model_info()
     metrics = ws_manager.get_metrics()
+    update_degradation()
+    
+    cluster = {"enabled": False}
+    if cluster_client is not None:
+        try:
+            cluster = {"enabled": True, **await run_in_threadpool(cluster_client.cluster_metrics)}
+        except Exception as e:
+            cluster = {"enabled": True, "error": str(e)}
     
     return {
         "status": "healthy" if is_ready else "unhealthy",
@@ -79,22 +422,297 @@ async def health_check():
             "active_connections": metrics["active"],
             "total_connections": metrics["total"],
             "rejected_connections": metrics["rejected"],
-            "max_connections": MAX_ACTIVE_CONNECTIONS
+            "max_connections": MAX_ACTIVE_CONNECTIONS,
+            "pings_sent": metrics["pings_sent"],
+            "reaped_connections": metrics["reaped"],
+            "heartbeat_interval_seconds": HEARTBEAT_INTERVAL
         },
         "resource_limits": {
             "max_image_size_mb": MAX_IMAGE_SIZE_MB,
             "max_workers": MAX_WORKERS,
+            "thread_topology": thread_topology.get_metrics(),
             "inactive_timeout_seconds": INACTIVE_TIMEOUT
         },
+        "scheduler": inference_scheduler.get_metrics(),
+        "pipeline": frame_pipeline.get_metrics(),
+        "client_hints": current_client_hints(),
+        "streams": stream_hub.get_metrics(),
+        "history": history_store.get_metrics() if history_store else {"enabled": False},
+        "snapshots": snapshot_store.get_metrics() if snapshot_store else {"enabled": False},
+        "startup": startup_state,
+        "cluster": cluster,
+        "degradation": degradation.get_metrics() if degradation else {"enabled": False},
         "timestamp": time.time()
     }
 
+
+@router.get("/ready")
+async def readiness_check():
+    """Readiness para el balanceador: 200 solo con el modelo cargado y precalentado"""
+    if detector_service and detector_service.is_ready():
+        return {"ready": True, "phase": startup_state["phase"]}
+    return JSONResponse(
+        status_code=503,
+        content={"ready": False, "phase": startup_state["phase"]},
+        headers={"Retry-After": "5"}
+    )
+
+def _history_window(hours: float) -> tuple[float, float]:
+    if not history_store:
+        raise HTTPException(status_code=503, detail="Historial deshabilitado")
+    if hours <= 0:
+        raise HTTPException(status_code=400, detail="'hours' debe ser mayor que 0")
+    until = time.time()
+    return until - hours * 3600, until
+
+
+@router.get("/history/compliance")
+async def history_compliance(camera: Optional[str] = None, hours: float = 24.0):
+    """Tasa de cumplimiento por cámara y por hora"""
+    since, until = _history_window(hours)
+    buckets = await run_in_threadpool(history_store.compliance_by_hour, since, until, camera)
+    return {"camera": camera, "since": since, "until": until, "buckets": buckets}
+
+
+@router.get("/history/missing")
+async def history_missing(camera: Optional[str] = None, hours: float = 24.0):
+    """EPP que falta con más frecuencia"""
+    since, until = _history_window(hours)
+    items = await run_in_threadpool(history_store.missing_items, since, until, camera)
+    return {"camera": camera, "since": since, "until": until, "items": items}
+
+
+@router.get("/snapshots")
+async def list_snapshots(
+    camera: Optional[str] = None,
+    hours: float = 24.0,
+    limit: int = 100,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Evidencias de incumplimiento por cámara, de la más reciente a la más antigua"""
+    # Son imágenes de personas: mismo acceso que los endpoints de administración
+    require_admin(x_admin_token)
+    if not snapshot_store:
+        raise HTTPException(status_code=503, detail="Evidencias deshabilitadas")
+    if hours <= 0:
+        raise HTTPException(status_code=400, detail="'hours' debe ser mayor que 0")
+    until = time.time()
+    since = until - hours * 3600
+    limit = max(1, min(limit, 1000))
+    snapshots = await run_in_threadpool(snapshot_store.list_snapshots, since, until, camera, limit)
+    for snapshot in snapshots:
+        snapshot["image_url"] = f"/api/snapshots/{snapshot['id']}/image"
+    return {"camera": camera, "since": since, "until": until, "snapshots": snapshots}
+
+
+@router.get("/snapshots/{snapshot_id}/image")
+async def snapshot_image(snapshot_id: int, x_admin_token: Optional[str] = Header(None)):
+    """JPEG de una evidencia"""
+    require_admin(x_admin_token)
+    if not snapshot_store:
+        raise HTTPException(status_code=503, detail="Evidencias deshabilitadas")
+    path = await run_in_threadpool(snapshot_store.snapshot_path, snapshot_id)
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Evidencia no encontrada")
+    return FileResponse(path, media_type="image/jpeg")
+
+
+# "loading" mientras hay una recarga en curso: se comprueba y se marca sin
+# ceder el event loop, así dos solicitudes simultáneas no recargan dos veces
+model_reload_state: Dict = {"state": "idle"}
+
+
+def require_admin(token: Optional[str]):
+    """Valida el token de administración (header X-Admin-Token)"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Endpoints de administración deshabilitados")
+    if not token or not hmac.compare_digest(token, settings.admin_token):
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+
+
+async def _reload_detector(model_path: str, version: Optional[str]):
+    """Carga y calienta el nuevo modelo fuera del executor de inferencia"""
+    started = time.time()
+    try:
+        loop = asyncio.get_running_loop()
+        candidate = await loop.run_in_executor(None, detector_factory, model_path, version)
+        warmup_ms = await loop.run_in_executor(
+            None, candidate.warmup, settings.warmup_sizes, settings.warmup_runs
+        )
+        previous = detector_service.model_version if detector_service else None
+        init_detector(candidate)
+        model_reload_state.update({
+            "state": "ready",
+            "model_version": candidate.model_version,
+            "previous_version": previous,
+            "warmup_ms": round(warmup_ms, 1),
+            "load_seconds": round(time.time() - started, 2),
+            "finished_at": time.time(),
+            "error": None,
+        })
+        print(f"🔁 Modelo recargado: {previous} → {candidate.model_version}")
+    except Exception as e:
+        model_reload_state.update({"state": "failed", "error": str(e), "finished_at": time.time()})
+        print(f"Error recargando modelo: {type(e).__name__}: {str(e)}")
+    finally:
+        # Tarea cancelada (apagado): no dejar bloqueadas futuras recargas
+        if model_reload_state.get("state") == "loading":
+            model_reload_state.update({"state": "failed", "error": "Recarga interrumpida", "finished_at": time.time()})
+
+
+@router.post("/admin/model/reload", status_code=202)
+async def reload_model(request: ModelReloadRequest, x_admin_token: Optional[str] = Header(None)):
+    """Carga un modelo nuevo en segundo plano y lo activa tras el warm-up"""
+    require_admin(x_admin_token)
+    if detector_factory is None:
+        raise HTTPException(status_code=503, detail="Recarga de modelo no disponible")
+    if not os.path.exists(request.model_path):
+        raise HTTPException(status_code=400, detail=f"No existe el modelo: {request.model_path}")
+    if model_reload_state.get("state") == "loading":
+        raise HTTPException(status_code=409, detail="Ya hay una recarga en curso")
+    
+    model_reload_state.clear()
+    model_reload_state.update({
+        "state": "loading",
+        "model_path": request.model_path,
+        "requested_version": request.version,
+        "started_at": time.time(),
+    })
+    asyncio.create_task(_reload_detector(request.model_path, request.version))
+    return model_reload_state
+
+
+@router.get("/admin/model/status")
+async def reload_status(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return {
+        **model_reload_state,
+        "active_version": detector_service.model_version if detector_service else None,
+    }
+
+
+@router.get("/debug/memory")
+async def debug_memory(
+    top: int = 10,
+    tracing: Optional[bool] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    RSS del proceso, bytes por etapa del frame y, con tracemalloc activo,
+    las líneas que más memoria retienen. `tracing=true/false` lo activa o
+    detiene en caliente (tiene costo de CPU mientras está activo).
+    """
+    require_admin(x_admin_token)
+    if tracing is True and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif tracing is False and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    
+    report: Dict = {"process": process_memory(), "timestamp": time.time()}
+    if detector_service is not None:
+        try:
+            report["frames"] = await run_in_threadpool(detector_service.get_memory_metrics)
+        except Exception as e:
+            report["frames"] = {"error": str(e)}
+    
+    report["tracemalloc"] = {"tracing": tracemalloc.is_tracing()}
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = await run_in_threadpool(tracemalloc.take_snapshot)
+        report["tracemalloc"].update({
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {"location": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:max(1, top)]
+            ],
+        })
+    return report
+
+
+@router.get("/debug/profile")
+async def debug_profile(
+    seconds: float = 10.0,
+    interval_ms: float = 5.0,
+    format: str = "collapsed",
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Perfil por muestreo del event loop y los workers `yolo_` durante
+    `seconds`. `format=collapsed` devuelve pilas colapsadas para
+    flamegraph.pl/speedscope; `format=json` las pilas más frecuentes.
+    """
+    require_admin(x_admin_token)
+    if not 0 < seconds <= settings.profile_max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds debe estar entre 0 y {settings.profile_max_seconds}")
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format debe ser 'collapsed' o 'json'")
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="Ya hay un perfil en curso")
+    
+    # Este handler corre en el hilo del event loop
+    loop_thread = {threading.get_ident(): "event_loop"}
+    interval = min(max(interval_ms, 1.0), 1000.0) / 1000
+    try:
+        profile = await run_in_threadpool(profiler.run, seconds, interval, loop_thread)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if format == "json":
+        return {
+            "samples": profile["samples"],
+            "interval_ms": profile["interval_ms"],
+            "threads": profile["threads"],
+            "top_stacks": [
+                {"stack": stack.split(";"), "count": count}
+                for stack, count in profile["stacks"].most_common(50)
+            ],
+        }
+    
+    return PlainTextResponse(
+        SamplingProfiler.to_collapsed(profile["stacks"]),
+        headers={"Content-Disposition": f'attachment; filename="profile-{int(time.time())}.folded"'}
+    )
+
+
+@router.get("/debug/slow-frames")
+async def debug_slow_frames(
+    limit: int = 10,
+    reset: bool = False,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Los frames más lentos desde el arranque (o el último reset) con sus etapas"""
+    require_admin(x_admin_token)
+    frames = slow_frames.slowest(max(1, limit))
+    if reset:
+        slow_frames.reset()
+    return {"capacity": slow_frames.capacity, "frames": frames}
+
+
 class WebSocketManager:
+    """
+    Registro de conexiones WebSocket con un único planificador de heartbeat
+    y limpieza de inactivas para todas las conexiones.
+
+    Cada conexión tiene exactamente una entrada en un heap ordenado por su
+    próximo vencimiento (ping o desalojo). Los mensajes entrantes solo
+    actualizan un dict (O(1)); el heap se corrige de forma perezosa cuando
+    la entrada vence, así que el costo por conexión es constante.
+    """
     
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
         self.connection_times: Dict[WebSocket, float] = {} 
-        self.connection_metrics: Dict[str, int] = {"total": 0, "active": 0, "rejected": 0}
+        self.last_ping_times: Dict[WebSocket, float] = {}
+        self.connection_ids: Dict[WebSocket, str] = {}
+        self.connection_metrics: Dict[str, int] = {
+            "total": 0, "active": 0, "rejected": 0, "pings_sent": 0, "reaped": 0
+        }
+        self._schedule: List[Tuple[float, int, WebSocket]] = []
+        self._schedule_seq = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._scheduler_task: Optional[asyncio.Task] = None
+        self.id_prefix = "ws"
     
     async def connect(self, websocket: WebSocket) -> bool:
         if len(self.active_connections) >= MAX_ACTIVE_CONNECTIONS:
@@ -103,26 +721,72 @@ class WebSocketManager:
             print(f"Conexión rechazada - Límite alcanzado ({MAX_ACTIVE_CONNECTIONS})")
             return False
         
+        if cluster_client is not None and not await self._acquire_cluster_slot():
+            await websocket.close(code=1008, reason="Máximo de conexiones alcanzado")
+            self.connection_metrics["rejected"] += 1
+            print("Conexión rechazada - Límite del cluster alcanzado")
+            return False
+        
         await websocket.accept()
-        self.active_connections.append(websocket)
-        self.connection_times[websocket] = time.time()
+        now = time.time()
+        self.active_connections.add(websocket)
+        self.connection_times[websocket] = now
+        self.last_ping_times[websocket] = now
         self.connection_metrics["total"] += 1
+        self.connection_ids[websocket] = f"{self.id_prefix}-{self.connection_metrics['total']}"
         self.connection_metrics["active"] = len(self.active_connections)
+        self._ensure_scheduler()
+        self._schedule_next(websocket, now + HEARTBEAT_INTERVAL)
         return True
     
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        if websocket in self.connection_times:
-            del self.connection_times[websocket]
+        # La entrada del heap se descarta sola al vencer (borrado perezoso)
+        if websocket in self.active_connections and cluster_client is not None:
+            asyncio.get_running_loop().run_in_executor(None, self._release_cluster_slot)
+        self.active_connections.discard(websocket)
+        self.connection_times.pop(websocket, None)
+        self.last_ping_times.pop(websocket, None)
+        self.connection_ids.pop(websocket, None)
         self.connection_metrics["active"] = len(self.active_connections)
     
-    async def send_detection(self, websocket: WebSocket, result: DetectionResponse):
+    async def _acquire_cluster_slot(self) -> bool:
         try:
-            await websocket.send_json(result.model_dump())
+            return await run_in_threadpool(cluster_client.acquire_connection)
+        except Exception as e:
+            print(f"Coordinador no disponible: {e}")
+            return False
+    
+    @staticmethod
+    def _release_cluster_slot():
+        # Si falla, el siguiente reporte de métricas corrige el conteo
+        try:
+            cluster_client.release_connection()
+        except Exception:
+            pass
+    
+    async def send_detection(self, websocket: WebSocket, result: DetectionResponse, encoder: ResponseEncoder) -> bool:
+        """Envía el resultado; False si falló (la conexión queda desconectada)"""
+        try:
+            # Tras una recarga del modelo los clientes compactos reciben la nueva tabla
+            if (
+                encoder.is_compact
+                and detector_service is not None
+                and result.model_version == detector_service.model_version
+                and encoder.model_version != result.model_version
+            ):
+                encoder.update_model(detector_service.get_class_names(), detector_service.model_version)
+                await websocket.send_json(encoder.class_table())
+            
+            payload = encoder.encode(result)
+            if isinstance(payload, bytes):
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
+            return True
         except Exception as e:
             print(f"Error enviando detección: {e}")
             self.disconnect(websocket)
+            return False
     
     async def send_error(self, websocket: WebSocket, error: str):
         try:
@@ -138,18 +802,108 @@ class WebSocketManager:
         if websocket in self.connection_times:
             self.connection_times[websocket] = time.time()
     
-    def get_inactive_connections(self) -> List[WebSocket]:
-
-        current_time = time.time()
-        inactive = []
-        for ws, last_activity in self.connection_times.items():
-            if current_time - last_activity > INACTIVE_TIMEOUT:
-                inactive.append(ws)
-        return inactive
-    
     def get_metrics(self) -> Dict[str, int]:
 
-        return self.connection_metrics.copy()
+        metrics = self.connection_metrics.copy()
+        metrics["scheduled"] = len(self._schedule)
+        return metrics
+    
+    async def shutdown(self):
+        """Detiene el planificador de heartbeat"""
+        if self._scheduler_task:
+            self._scheduler_task.cancel()
+            try:
+                await self._scheduler_task
+            except asyncio.CancelledError:
+                pass
+            self._scheduler_task = None
+    
+    def _ensure_scheduler(self):
+        if self._scheduler_task is None or self._scheduler_task.done():
+            self._wakeup = asyncio.Event()
+            self._scheduler_task = asyncio.create_task(self._scheduler_loop())
+    
+    def _schedule_next(self, websocket: WebSocket, due: float):
+        self._schedule_seq += 1
+        heapq.heappush(self._schedule, (due, self._schedule_seq, websocket))
+        if self._wakeup is not None and self._schedule[0][2] is websocket:
+            self._wakeup.set()
+    
+    def _next_due(self, websocket: WebSocket) -> float:
+        last_activity = self.connection_times[websocket]
+        last_seen = max(last_activity, self.last_ping_times[websocket])
+        return min(last_activity + INACTIVE_TIMEOUT, last_seen + HEARTBEAT_INTERVAL)
+    
+    async def _scheduler_loop(self):
+        """Único loop que envía pings y cierra conexiones inactivas"""
+        try:
+            while True:
+                if not self._schedule:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+                
+                delay = self._schedule[0][0] - time.time()
+                if delay > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                
+                now = time.time()
+                to_ping: List[WebSocket] = []
+                to_close: List[WebSocket] = []
+                while self._schedule and self._schedule[0][0] <= now:
+                    _, _, ws = heapq.heappop(self._schedule)
+                    if ws not in self.connection_times:
+                        continue
+                    
+                    # Mismo vencimiento que `_next_due`: en el límite exacto se
+                    # desaloja (si no, se reprogramaría en `now` sin ceder el loop)
+                    if self.connection_times[ws] + INACTIVE_TIMEOUT <= now:
+                        to_close.append(ws)
+                        continue
+                    
+                    due = self._next_due(ws)
+                    if due <= now:
+                        self.last_ping_times[ws] = now
+                        to_ping.append(ws)
+                        due = self._next_due(ws)
+                    self._schedule_next(ws, due)
+                
+                if to_ping or to_close:
+                    await asyncio.gather(
+                        *(self._send_ping(ws) for ws in to_ping),
+                        *(self._close_inactive(ws) for ws in to_close),
+                    )
+        except asyncio.CancelledError:
+            pass
+    
+    async def _send_ping(self, websocket: WebSocket):
+        if websocket.client_state != WebSocketState.CONNECTED:
+            return
+        try:
+            await asyncio.wait_for(
+                websocket.send_json({"type": "ping", "timestamp": time.time()}),
+                timeout=HEARTBEAT_SEND_TIMEOUT
+            )
+            self.connection_metrics["pings_sent"] += 1
+        except Exception:
+            pass
+    
+    async def _close_inactive(self, websocket: WebSocket):
+        print(f"⚠️ Cerrando conexión inactiva (>{INACTIVE_TIMEOUT}s)")
+        self.disconnect(websocket)
+        self.connection_metrics["reaped"] += 1
+        try:
+            await asyncio.wait_for(
+                websocket.close(code=1000, reason="Inactividad"),
+                timeout=HEARTBEAT_SEND_TIMEOUT
+            )
+        except Exception:
+            pass
 
 
 ws_manager = WebSocketManager()
@@ -158,7 +912,8 @@ ws_manager = WebSocketManager()
 def validate_image_size(base64_image: str) -> tuple[bool, str]:
     """Validar tamaño de imagen base64"""
     try:
-        size_bytes = len(base64_image.encode('utf-8'))
+        # base64 es ASCII: la longitud ya son bytes (sin recodificar el frame)
+        size_bytes = len(base64_image)
         size_mb = size_bytes / (1024 * 1024)
         
         if size_mb > MAX_IMAGE_SIZE_MB:
@@ -191,37 +946,25 @@ async def websocket_detect(websocket: WebSocket):
     if not connected:
         return
     
-    pong_task = None
-    cleanup_task = None
-    last_ping_time = time.time()
-
-    async def heartbeat_handler():
-        """Envía ping cada 15s y verifica que cliente responda"""
-        nonlocal last_ping_time
-        try:
-            while websocket.client_state == WebSocketState.CONNECTED:
-                await asyncio.sleep(15)
-                if websocket.client_state == WebSocketState.CONNECTED:
-                    try:
-                        await websocket.send_json({"type": "ping", "timestamp": time.time()})
-                        last_ping_time = time.time()
-                    except (RuntimeError, Exception):
-                        break
-        except asyncio.CancelledError:
-            pass
-
-    async def cleanup_inactive():
-        """Verifica y cierra conexiones inactivas"""
-        try:
-            while websocket.client_state == WebSocketState.CONNECTED:
-                await asyncio.sleep(30)
-                inactive = ws_manager.get_inactive_connections()
-                if websocket in inactive:
-                    print(f"⚠️ Cerrando conexión inactiva (>{INACTIVE_TIMEOUT}s)")
-                    await websocket.close(code=1000, reason="Inactividad")
-                    break
-        except asyncio.CancelledError:
-            pass
+    conn_id = ws_manager.connection_ids[websocket]
+    stream_id = websocket.query_params.get("stream") or conn_id
+    # Los ids de conexión están reservados y un stream con nombre solo
+    # admite un productor: nadie puede mezclar frames en la cámara de otro
+    if (stream_id != conn_id and CONNECTION_ID_PATTERN.fullmatch(stream_id)) or not await claim_stream(stream_id, conn_id):
+        await ws_manager.send_error(websocket, f"El stream '{stream_id}' ya tiene productor o está reservado")
+        await websocket.close(code=1008, reason="Stream en uso")
+        ws_manager.disconnect(websocket)
+        return
+    aggregator = stream_aggregators.acquire(stream_id)
+    try:
+        requested_fps = float(websocket.query_params.get("max_fps", ""))
+    except ValueError:
+        requested_fps = None
+    inference_scheduler.register(
+        conn_id,
+        priority=websocket.query_params.get("priority"),
+        max_fps=requested_fps
+    )
     
     try:
         if not detector_service or not detector_service.is_ready():
@@ -237,21 +980,43 @@ async def websocket_detect(websocket: WebSocket):
             await websocket.send_json({
                 "type": "connected",
                 "message": "Servidor listo para detección",
+                "stream": stream_id,
                 "timestamp": time.time()
             })
             print("✅ Mensaje de bienvenida enviado al cliente")
         except Exception as e:
             print(f"Error enviando mensaje de bienvenida: {e}")
 
-        pong_task = asyncio.create_task(heartbeat_handler())
-        cleanup_task = asyncio.create_task(cleanup_inactive())
-        
+        try:
+            profile = detector_service.resolve_profile(websocket.query_params.get("profile"))
+        except ValueError as e:
+            await ws_manager.send_error(websocket, str(e))
+            await websocket.close(code=1008, reason="Perfil inválido")
+            return
+        aggregator.required_mask = detector_service.get_profile_mask(profile)
+
+        encoder = ResponseEncoder(
+            websocket.query_params.get("format", "full"),
+            detector_service.get_class_names(),
+            delta=websocket.query_params.get("delta", "").lower() in ("1", "true"),
+            model_version=detector_service.model_version
+        )
+        if encoder.is_compact:
+            await websocket.send_json(encoder.class_table())
+
+        last_hints = current_client_hints()
+        # Último resultado del detector de personas (degradación: gate cada N frames)
+        last_has_person: Optional[bool] = None
+        frames_since_gate = 0
+        await websocket.send_json({"type": "config", **last_hints, "timestamp": time.time()})
+
         print("✅ WebSocket listo para recibir datos")
         
         while websocket.client_state == WebSocketState.CONNECTED:
             try:
                 # Aumentar timeout inicial para dar tiempo al cliente
                 data = await asyncio.wait_for(websocket.receive_text(), timeout=30.0)
+                frame_start = time.perf_counter()
                 message = json.loads(data)
                 print(f"📨 Mensaje recibido del cliente: {list(message.keys())}")
 
@@ -289,29 +1054,78 @@ async def websocket_detect(websocket: WebSocket):
                 
                 confidence = message.get("confidence", 0.5)
 
-                # Enviar confirmación de que se está procesando la imagen
-                if websocket.client_state == WebSocketState.CONNECTED:
+                admitted, retry_after = inference_scheduler.try_admit(conn_id)
+                if not admitted:
+                    await websocket.send_json({
+                        "type": "throttled",
+                        "error": "Frame descartado: límite de FPS de la conexión",
+                        "retry_after": round(retry_after, 3),
+                        "timestamp": time.time()
+                    })
+                    continue
+
+                shed_retry = check_overload()
+                if shed_retry is not None:
                     await websocket.send_json({
-                        "type": "processing",
-                        "message": "Procesando imagen...",
+                        "type": "overloaded",
+                        "error": "Frame descartado: servicio sobrecargado",
+                        "retry_after": round(shed_retry, 3),
+                        "degradation_level": degradation.level,
                         "timestamp": time.time()
                     })
+                    continue
+
+                imgsz, person_every = degradation_params()
+                person_hint = None
+                if person_every > 1 and last_has_person is not None and frames_since_gate < person_every - 1:
+                    person_hint = last_has_person
+                    frames_since_gate += 1
 
                 try:
-                    loop = asyncio.get_event_loop()
+                    inference_start = time.perf_counter()
+                    parse_ms = (inference_start - frame_start) * 1000
                     result = await asyncio.wait_for(
-                        loop.run_in_executor(
-                            executor,
-                            detector_service.detect_from_base64,
+                        frame_pipeline.run(
+                            conn_id,
+                            detector_service,
                             image_data,
-                            confidence
+                            confidence,
+                            profile,
+                            person_hint,
+                            imgsz
                         ),
                         timeout=30.0  # Aumentado de 10s a 30s para imágenes grandes
                     )
+                    if person_hint is None:
+                        last_has_person = result.has_person
+                        frames_since_gate = 0
+                    if degradation is not None:
+                        degradation.observe_latency((time.perf_counter() - inference_start) * 1000)
+                        result.degradation_level = degradation.level
+                    
+                    post_start = time.perf_counter()
+                    hint_advisor.record_latency(result.processing_time)
+                    result = aggregator.apply(result)
+                    stream_hub.publish(stream_id, result)
+                    record_history(stream_id, result)
+                    record_snapshot(stream_id, image_data, result)
                     
                     if websocket.client_state == WebSocketState.CONNECTED:
-                        await ws_manager.send_detection(websocket, result)
+                        send_start = time.perf_counter()
+                        await ws_manager.send_detection(websocket, result, encoder)
                         print("✅ Respuesta de detección enviada al cliente")
+                        record_frame_timings(conn_id, frame_start, result, {
+                            "parse_validate_ms": parse_ms,
+                            "inference_ms": (post_start - inference_start) * 1000,
+                            "postprocess_ms": (send_start - post_start) * 1000,
+                            "send_ms": (time.perf_counter() - send_start) * 1000,
+                        })
+                        
+                        # Solo se reenvía la recomendación cuando cambia
+                        hints = current_client_hints()
+                        if hints != last_hints:
+                            last_hints = hints
+                            await websocket.send_json({"type": "config", **hints, "timestamp": time.time()})
                     else:
                         print("⚠️ Cliente desconectado, no se envió respuesta")
                 
@@ -366,14 +1180,97 @@ async def websocket_detect(websocket: WebSocket):
         traceback.print_exc()
     
     finally:
-        for task in [pong_task, cleanup_task]:
-            if task:
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
-        
+        inference_scheduler.unregister(conn_id)
+        release_stream(stream_id, conn_id)
+        stream_hub.forget(stream_id)
+        stream_aggregators.release(stream_id)
         ws_manager.disconnect(websocket)
         metrics = ws_manager.get_metrics()
         print(f"🔌 Conexión cerrada - Activas: {metrics['active']} | Total: {metrics['total']}")
+
+
+@router.websocket("/ws/streams/{stream_id}")
+async def websocket_subscribe(websocket: WebSocket, stream_id: str):
+    """Recibe los resultados de un stream sin enviar frames ni re-inferir"""
+
+    connected = await ws_manager.connect(websocket)
+    if not connected:
+        return
+    
+    if MULTI_WORKER:
+        await ws_manager.send_error(websocket, "Suscripción a streams no disponible con varios workers front-end")
+        await websocket.close(code=1008, reason="Requiere un solo worker")
+        ws_manager.disconnect(websocket)
+        return
+    
+    subscription = stream_hub.subscribe(stream_id)
+    sender_task = None
+    
+    async def forward_results():
+        """Envía los resultados del buffer del suscriptor"""
+        while websocket.client_state == WebSocketState.CONNECTED:
+            result = await subscription.next()
+            if not await ws_manager.send_detection(websocket, result, encoder):
+                break
+        # Envío fallido: se cierra para que termine también el loop de lectura
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+    
+    try:
+        if not detector_service or not detector_service.is_ready():
+            await ws_manager.send_error(websocket, "Servicio de detección no disponible")
+            await websocket.close()
+            return
+        
+        encoder = ResponseEncoder(
+            websocket.query_params.get("format", "full"),
+            detector_service.get_class_names(),
+            delta=websocket.query_params.get("delta", "").lower() in ("1", "true"),
+            model_version=detector_service.model_version
+        )
+        await websocket.send_json({
+            "type": "connected",
+            "message": f"Suscrito al stream '{stream_id}'",
+            "stream": stream_id,
+            "timestamp": time.time()
+        })
+        if encoder.is_compact:
+            await websocket.send_json(encoder.class_table())
+        
+        print(f"📺 Suscriptor conectado al stream '{stream_id}'")
+        sender_task = asyncio.create_task(forward_results())
+        
+        # Solo se leen mensajes de heartbeat; el envío va en sender_task
+        while websocket.client_state == WebSocketState.CONNECTED:
+            data = await websocket.receive_text()
+            ws_manager.update_activity(websocket)
+            try:
+                message = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            if message.get("type") == "ping":
+                await websocket.send_json({"type": "pong", "timestamp": time.time()})
+    
+    except WebSocketDisconnect:
+        pass
+    
+    except RuntimeError as e:
+        if "disconnect" not in str(e).lower():
+            print(f"RuntimeError en suscriptor: {str(e)}")
+    
+    except Exception as e:
+        print(f"Error en suscriptor: {type(e).__name__}: {str(e)}")
+    
+    finally:
+        if sender_task:
+            sender_task.cancel()
+            try:
+                await sender_task
+            except (asyncio.CancelledError, Exception):
+                pass
+        
+        stream_hub.unsubscribe(subscription)
+        ws_manager.disconnect(websocket)
+        print(f"📺 Suscriptor desconectado del stream '{stream_id}' - Activas: {ws_manager.get_metrics()['active']}")
@@ -7,6 +7,7 @@ from .ppe_models import (
     Detection,
     ImageRequest,
     DetectionResponse,
+    ModelReloadRequest,
     ErrorResponse,
     HealthResponse
 )
@@ -17,6 +18,7 @@ __all__ = [
     "Detection",
     "ImageRequest",
     "DetectionResponse",
+    "ModelReloadRequest",
     "ErrorResponse",
     "HealthResponse"
 ]
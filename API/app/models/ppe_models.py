@@ -40,6 +40,7 @@ class PPEStatus(BaseModel):
 class Detection(BaseModel):
     """Detección individual de un objeto"""
     class_name: str = Field(..., alias="class", description="Nombre de la clase detectada")
+    class_id: Optional[int] = Field(None, description="Id de la clase en el modelo")
     confidence: float = Field(..., ge=0.0, le=1.0, description="Confianza de la detección")
     bbox: List[float] = Field(..., description="Bounding box [x1, y1, x2, y2]")
 
@@ -58,12 +59,14 @@ class ImageRequest(BaseModel):
     """Request para detección de EPP en imagen"""
     image: str = Field(..., description="Imagen codificada en base64")
     confidence: float = Field(default=0.5, ge=0.0, le=1.0, description="Umbral de confianza mínimo")
+    profile: Optional[str] = Field(None, description="Perfil de EPP requerido (zona)")
 
     class Config:
         json_schema_extra = {
             "example": {
                 "image": "data:image/jpeg;base64,/9j/4AAQSkZJRg...",
-                "confidence": 0.5
+                "confidence": 0.5,
+                "profile": "completo"
             }
         }
 
@@ -75,8 +78,16 @@ class DetectionResponse(BaseModel):
     is_compliant: bool = Field(..., description="Si cumple con todos los EPP requeridos")
     processing_time: Optional[float] = Field(None, description="Tiempo de procesamiento en ms")
     has_person: bool = Field(default=True, description="Si se detectó al menos una persona en la imagen")
+    smoothed_ppe_status: Optional[PPEStatus] = Field(None, description="Estado de EPP suavizado en la ventana del stream")
+    smoothed_is_compliant: Optional[bool] = Field(None, description="Cumplimiento suavizado con histéresis")
+    profile: Optional[str] = Field(None, description="Perfil de EPP con el que se evaluó el cumplimiento")
+    model_version: Optional[str] = Field(None, description="Versión del modelo que produjo la detección")
+    degradation_level: Optional[int] = Field(None, description="Nivel de degradación por sobrecarga (0 = normal)")
+    person_inferred: Optional[bool] = Field(None, description="Persona supuesta del frame anterior (degradación): el cumplimiento del frame no es evidencia")
+    stage_timings: Optional[Dict[str, float]] = Field(None, exclude=True, description="Tiempos internos por etapa en ms (no se serializa)")
 
     class Config:
+        protected_namespaces = ()
         json_schema_extra = {
             "example": {
                 "ppe_status": {
@@ -99,6 +110,21 @@ class DetectionResponse(BaseModel):
         }
 
 
+class ModelReloadRequest(BaseModel):
+    """Request para recargar el modelo EPP sin reiniciar el servicio"""
+    model_path: str = Field(..., description="Ruta del nuevo modelo .pt")
+    version: Optional[str] = Field(None, description="Etiqueta de versión (por defecto nombre@mtime)")
+
+    class Config:
+        protected_namespaces = ()
+        json_schema_extra = {
+            "example": {
+                "model_path": "models/ppe_best.pt",
+                "version": "ppe-v2"
+            }
+        }
+
+
 class ErrorResponse(BaseModel):
     """Respuesta de error"""
     error: str = Field(..., description="Mensaje de error")
@@ -1,6 +1,37 @@
 """
 Servicios de negocio
 """
-from .ppe_service import PPEDetectorService
+from .ppe_service import PPEDetectorService, load_yolo_class
+from .frame_scheduler import FairFrameScheduler, TokenBucket
+from .client_hints import ClientHintAdvisor
+from .response_codec import ResponseEncoder
+from .stream_hub import StreamHub
+from .history_store import DetectionHistoryStore
+from .temporal_aggregator import ComplianceAggregator, StreamAggregators
+from .cpu_topology import ThreadTopology
+from .remote_inference import RemoteDetectorService, ClusterState
+from .sampling_profiler import SamplingProfiler, SlowFrameRecorder
+from .degradation import DegradationController
+from .frame_pipeline import FramePipeline
+from .snapshot_store import ViolationSnapshotStore
 
-__all__ = ["PPEDetectorService"]
+__all__ = [
+    "PPEDetectorService",
+    "load_yolo_class",
+    "FairFrameScheduler",
+    "TokenBucket",
+    "ClientHintAdvisor",
+    "ResponseEncoder",
+    "StreamHub",
+    "DetectionHistoryStore",
+    "ComplianceAggregator",
+    "StreamAggregators",
+    "ThreadTopology",
+    "RemoteDetectorService",
+    "ClusterState",
+    "SamplingProfiler",
+    "SlowFrameRecorder",
+    "DegradationController",
+    "FramePipeline",
+    "ViolationSnapshotStore",
+]
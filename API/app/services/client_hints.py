@@ -0,0 +1,81 @@
+"""
+Recomendaciones de captura que el servidor envía a los clientes.
+
+El servidor conoce el `imgsz` del modelo, la latencia de inferencia y la
+carga del scheduler; con eso sugiere a cada cliente el tamaño de entrada,
+los FPS y la calidad JPEG para no enviar píxeles ni frames inútiles.
+"""
+from typing import Dict, Optional
+
+
+class ClientHintAdvisor:
+    """Calcula FPS y calidad JPEG recomendados a partir de la carga actual"""
+
+    def __init__(
+        self,
+        input_size: int,
+        workers: int,
+        min_fps: float = 0.5,
+        max_fps: float = 5.0,
+        target_utilization: float = 0.8,
+        quality_levels: tuple = (0.7, 0.6, 0.5),
+        smoothing: float = 0.2,
+    ):
+        self.input_size = input_size
+        self.workers = max(1, workers)
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.target_utilization = target_utilization
+        self.quality_levels = quality_levels
+        self.smoothing = smoothing
+        self.latency_ms: Optional[float] = None
+
+    def record_latency(self, latency_ms: Optional[float]):
+        """Actualiza la media exponencial de la latencia de inferencia"""
+        if not latency_ms or latency_ms <= 0:
+            return
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.smoothing * (latency_ms - self.latency_ms)
+
+    def recommend(
+        self,
+        active_streams: int,
+        queued: int,
+        running: int,
+        rate_scale: float = 1.0,
+        input_size: Optional[int] = None,
+    ) -> Dict:
+        """
+        `rate_scale` e `input_size` vienen de la degradación: los FPS
+        recomendados no superan los que admite el scheduler y el tamaño de
+        entrada es el reducido, así el cliente baja su envío antes de que
+        sus frames se descarten.
+        """
+        streams = max(1, active_streams)
+        max_fps = self.max_fps * rate_scale
+
+        if self.latency_ms is None:
+            fps = max_fps
+        else:
+            capacity_fps = self.workers * 1000.0 / self.latency_ms
+            fps = self.target_utilization * capacity_fps / streams
+            if queued > self.workers:
+                # Cola creciendo: reducir en proporción al exceso
+                fps *= self.workers / queued
+        fps = round(max(self.min_fps, min(max_fps, fps)), 1)
+
+        load = (queued + running) / self.workers
+        if load < 0.5:
+            quality = self.quality_levels[0]
+        elif load <= 1.0:
+            quality = self.quality_levels[1]
+        else:
+            quality = self.quality_levels[2]
+
+        return {
+            "input_size": min(input_size, self.input_size) if input_size else self.input_size,
+            "recommended_fps": fps,
+            "jpeg_quality": quality,
+        }
@@ -0,0 +1,110 @@
+"""
+Topología de hilos de CPU para los workers de inferencia.
+
+Cada worker del executor llama a torch, y por defecto torch usa un pool
+intra-op con tantos hilos como núcleos: con varios workers el CPU queda
+sobresuscrito y la latencia se vuelve irregular. Aquí se reparte el CPU:
+cada worker usa `intra_op_threads` hilos y, opcionalmente, se fija a su
+propio bloque de núcleos (los hilos OpenMP que crea heredan la afinidad).
+"""
+import itertools
+import os
+import threading
+from typing import Dict, List, Optional
+
+
+# Variables que leen las librerías nativas al importarse (antes que torch)
+_NATIVE_THREAD_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def available_cpus() -> List[int]:
+    """Núcleos que el proceso puede usar (respeta cgroups/taskset en Linux)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def resolve_intra_threads(workers: int, intra_op_threads: int, cpu_count: Optional[int] = None) -> int:
+    """0 = repartir los núcleos disponibles entre los workers"""
+    if intra_op_threads > 0:
+        return intra_op_threads
+    cpu_count = cpu_count or len(available_cpus())
+    return max(1, cpu_count // max(1, workers))
+
+
+def plan_affinity(workers: int, threads: int, cpus: List[int]) -> List[List[int]]:
+    """Bloques contiguos de `threads` núcleos por worker (cíclico si no alcanzan)"""
+    if not cpus:
+        return [[] for _ in range(workers)]
+    return [
+        [cpus[(index * threads + offset) % len(cpus)] for offset in range(threads)]
+        for index in range(workers)
+    ]
+
+
+class ThreadTopology:
+    """Configura torch por proceso y por hilo worker del executor"""
+
+    def __init__(self, workers: int, intra_op_threads: int = 0, inter_op_threads: int = 1, pin_cpus: bool = False):
+        self.workers = max(1, workers)
+        self.cpus = available_cpus()
+        self.intra_op_threads = resolve_intra_threads(self.workers, intra_op_threads, len(self.cpus))
+        self.inter_op_threads = max(1, inter_op_threads)
+        self.pin_cpus = pin_cpus and hasattr(os, "sched_setaffinity")
+        self.affinity = plan_affinity(self.workers, self.intra_op_threads, self.cpus)
+
+        self._worker_index = itertools.count()
+        self._lock = threading.Lock()
+        self._process_configured = False
+        self.pinned_workers: Dict[str, List[int]] = {}
+
+    def limit_native_threads(self):
+        """Acota OpenMP/MKL vía entorno; solo surte efecto antes de importar torch"""
+        for name in _NATIVE_THREAD_VARS:
+            os.environ.setdefault(name, str(self.intra_op_threads))
+
+    def configure_process(self):
+        """Hilos inter-op de torch: solo se pueden fijar una vez por proceso"""
+        with self._lock:
+            if self._process_configured:
+                return
+            self._process_configured = True
+        try:
+            import torch
+        except ImportError:
+            return
+        try:
+            torch.set_num_interop_threads(self.inter_op_threads)
+        except RuntimeError as e:
+            # torch ya ejecutó trabajo paralelo; se queda con su valor actual
+            print(f"No se pudieron fijar los hilos inter-op: {e}")
+        torch.set_num_threads(self.intra_op_threads)
+
+    def initialize_worker(self):
+        """`initializer` del ThreadPoolExecutor: corre una vez en cada hilo worker"""
+        with self._lock:
+            index = next(self._worker_index) % self.workers
+
+        if self.pin_cpus and self.affinity[index]:
+            try:
+                # En Linux, pid 0 aplica al hilo que llama
+                os.sched_setaffinity(0, self.affinity[index])
+                self.pinned_workers[threading.current_thread().name] = self.affinity[index]
+            except OSError as e:
+                print(f"No se pudo fijar la afinidad del worker {index}: {e}")
+
+        try:
+            import torch
+        except ImportError:
+            return
+        torch.set_num_threads(self.intra_op_threads)
+
+    def get_metrics(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "available_cpus": len(self.cpus),
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "pin_cpus": self.pin_cpus,
+            "pinned_workers": dict(self.pinned_workers),
+        }
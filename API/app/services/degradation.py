@@ -0,0 +1,151 @@
+"""
+Escalera de degradación automática ante sobrecarga.
+
+Cuando las cámaras ofrecen más frames de los que la inferencia procesa, en
+lugar de dejar crecer la cola hasta los timeouts se baja de nivel paso a
+paso: menor `imgsz` del modelo EPP, detector de personas cada N frames,
+menos FPS por stream y, al final, rechazo rápido (503/Retry-After) de los
+frames que no caben.
+
+Las señales son la profundidad de cola (por worker) y el p95 de latencia de
+los frames recientes. Hay histéresis: se escala tras `escalate_after`
+segundos de sobrecarga sostenida y se recupera un nivel solo tras
+`recover_after` segundos por debajo de los umbrales bajos.
+"""
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+class DegradationLevel:
+
+    def __init__(
+        self,
+        name: str,
+        imgsz: Optional[int] = None,
+        person_every: int = 1,
+        fps_scale: float = 1.0,
+        shed: bool = False,
+    ):
+        self.name = name
+        self.imgsz = imgsz
+        self.person_every = max(1, int(person_every))
+        self.fps_scale = min(1.0, max(0.01, fps_scale))
+        self.shed = shed
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "imgsz": self.imgsz,
+            "person_every": self.person_every,
+            "fps_scale": self.fps_scale,
+            "shed": self.shed,
+        }
+
+
+class DegradationController:
+
+    def __init__(
+        self,
+        levels: List[Dict],
+        capacity: int,
+        queue_high: float = 2.0,
+        queue_low: float = 0.5,
+        latency_high_ms: float = 1500.0,
+        latency_low_ms: float = 500.0,
+        escalate_after: float = 3.0,
+        recover_after: float = 15.0,
+        latency_horizon: float = 10.0,
+        interval: float = 1.0,
+    ):
+        self.levels = [DegradationLevel(**level) for level in levels] or [DegradationLevel("normal")]
+        self.capacity = max(1, capacity)
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.latency_high_ms = latency_high_ms
+        self.latency_low_ms = latency_low_ms
+        self.escalate_after = escalate_after
+        self.recover_after = recover_after
+        self.latency_horizon = latency_horizon
+        self.interval = interval
+
+        self.level = 0
+        self._latencies: Deque[Tuple[float, float]] = deque(maxlen=200)
+        self._over_since: Optional[float] = None
+        self._under_since: Optional[float] = None
+        self._last_evaluation = 0.0
+        self.transitions = 0
+        self.shed_total = 0
+
+    @property
+    def current(self) -> DegradationLevel:
+        return self.levels[self.level]
+
+    def observe_latency(self, latency_ms: float):
+        self._latencies.append((time.monotonic(), latency_ms))
+
+    def p95(self, now: Optional[float] = None) -> float:
+        """p95 de los frames dentro del horizonte (0 si no hubo frames)"""
+        now = now or time.monotonic()
+        recent = sorted(ms for ts, ms in self._latencies if now - ts <= self.latency_horizon)
+        if not recent:
+            return 0.0
+        return recent[min(len(recent) - 1, math.ceil(0.95 * len(recent)) - 1)]
+
+    def evaluate(self, queued: int, now: Optional[float] = None) -> bool:
+        """Revisa las señales (como mucho cada `interval`). True si cambió el nivel"""
+        now = now or time.monotonic()
+        if now - self._last_evaluation < self.interval:
+            return False
+        self._last_evaluation = now
+
+        per_worker = queued / self.capacity
+        p95 = self.p95(now)
+        overloaded = per_worker >= self.queue_high or p95 >= self.latency_high_ms
+        underloaded = per_worker <= self.queue_low and p95 <= self.latency_low_ms
+
+        if overloaded:
+            self._under_since = None
+            self._over_since = self._over_since or now
+            if now - self._over_since >= self.escalate_after and self.level < len(self.levels) - 1:
+                self._over_since = now
+                return self._set_level(self.level + 1)
+        elif underloaded:
+            self._over_since = None
+            self._under_since = self._under_since or now
+            if now - self._under_since >= self.recover_after and self.level > 0:
+                self._under_since = now
+                return self._set_level(self.level - 1)
+        else:
+            # Zona intermedia: se mantiene el nivel (histéresis)
+            self._over_since = None
+            self._under_since = None
+        return False
+
+    def _set_level(self, level: int) -> bool:
+        previous, self.level = self.current, level
+        self.transitions += 1
+        print(f"⚖️ Degradación: {previous.name} → {self.current.name} (nivel {level})")
+        return True
+
+    def should_shed(self, queued: int) -> bool:
+        """En el último escalón se rechaza lo que no cabe en los workers"""
+        if self.current.shed and queued >= self.capacity:
+            self.shed_total += 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Segundos sugeridos al cliente: lo que tarda en vaciarse la cola"""
+        return max(1.0, self.p95() / 1000)
+
+    def get_metrics(self) -> Dict:
+        return {
+            "level": self.level,
+            **self.current.to_dict(),
+            "levels": [level.name for level in self.levels],
+            "p95_ms": round(self.p95(), 1),
+            "transitions": self.transitions,
+            "shed_total": self.shed_total,
+        }
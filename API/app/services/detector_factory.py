@@ -0,0 +1,42 @@
+"""
+Construcción de detectores con la configuración de la aplicación.
+
+Vive en servicios (y no en main) para que el servidor de inferencia y el
+auto-tuner creen detectores sin importar los controladores de la API.
+"""
+from typing import Optional
+
+from app.config import settings
+from app.services.ppe_service import PPEDetectorService
+from app.services.remote_inference import RemoteDetectorService
+
+
+def create_detector(model_path: Optional[str] = None, version: Optional[str] = None) -> PPEDetectorService:
+    """Construye un detector con la configuración actual"""
+    detector = PPEDetectorService(
+        model_path=model_path,
+        profiles=settings.ppe_profiles,
+        default_profile=settings.ppe_default_profile,
+        model_version=version
+    )
+    detector.configure_tiling(
+        settings.tiling_enabled,
+        tile_size=settings.tile_size,
+        overlap=settings.tile_overlap,
+        max_tiles=settings.tile_max,
+        latency_budget_ms=settings.tile_latency_budget_ms,
+        nms_iou=settings.tile_nms_iou,
+        around_persons=settings.tile_around_persons
+    )
+    detector.configure_frames(settings.max_frame_pixels, downscale=settings.frame_downscale)
+    return detector
+
+
+def create_remote_detector(model_path: Optional[str] = None, version: Optional[str] = None) -> RemoteDetectorService:
+    """Cliente del servidor de inferencia; con `model_path` le pide recargar"""
+    detector = RemoteDetectorService(settings.inference_socket)
+    if model_path:
+        detector.reload(model_path, version)
+    else:
+        detector.refresh_info()
+    return detector
@@ -0,0 +1,193 @@
+"""
+Manejo de memoria acotado por frame.
+
+- `read_image_size` lee ancho/alto de la cabecera JPEG/PNG sin decodificar,
+  para rechazar frames enormes antes de reservar el buffer de píxeles.
+- `FrameBufferPool` presta los buffers de salida del redimensionado;
+  `cv2.resize(dst=...)` reutiliza la memoria si la forma coincide y el
+  frame devuelve su buffer al terminar la inferencia, así el número de
+  buffers grandes queda acotado por los frames en vuelo.
+- `FrameMemoryStats` acumula los bytes de cada etapa (base64, bytes
+  decodificados, imagen, entrada al modelo) para el endpoint de depuración.
+"""
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+# Marcadores SOF de JPEG (C4 = DHT, C8 = JPG, CC = DAC no son frames)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Factores de decodificación reducida de libjpeg (escalado en el dominio DCT)
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def is_jpeg(data: bytes) -> bool:
+    return data[:2] == b"\xff\xd8"
+
+
+def read_image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(ancho, alto) desde la cabecera; None si el formato no se reconoce"""
+    if data.startswith(_PNG_SIGNATURE) and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return width, height
+
+    if not is_jpeg(data):
+        return None
+
+    offset = 2
+    length = len(data)
+    while offset + 4 <= length:
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Bytes de relleno entre segmentos
+            offset += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        (segment_length,) = struct.unpack(">H", data[offset + 2:offset + 4])
+        if marker in _JPEG_SOF:
+            if offset + 9 > length:
+                return None
+            height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + segment_length
+    return None
+
+
+def reduced_decode_flag(width: int, height: int, target: int) -> Tuple[int, int]:
+    """
+    (flag de cv2.imdecode, factor) que reduce el JPEG al decodificar sin
+    bajar el lado mayor de `target`.
+    """
+    longest = max(width, height)
+    for factor, flag in _REDUCED_FLAGS:
+        if longest // factor >= target:
+            return flag, factor
+    return cv2.IMREAD_COLOR, 1
+
+
+class FrameBufferPool:
+    """
+    Buffers de redimensionado reutilizables por forma. Cada buffer se presta
+    con `acquire` y vuelve con `release` cuando el frame ya no se usa, así
+    la etapa de decodificación y la de inferencia pueden correr en hilos
+    distintos sin pisarse.
+    """
+
+    def __init__(self, max_free_per_shape: int = 4, max_shapes: int = 4):
+        self.max_free_per_shape = max_free_per_shape
+        self.max_shapes = max_shapes
+        self._free: "OrderedDict[Tuple[int, ...], List[np.ndarray]]" = OrderedDict()
+        self._leased: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._reserved_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, shape: Tuple[int, ...]) -> np.ndarray:
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                self.hits += 1
+                self._free.move_to_end(shape)
+                buffer = free.pop()
+            else:
+                self.misses += 1
+                buffer = np.empty(shape, dtype=np.uint8)
+                self._reserved_bytes += buffer.nbytes
+            self._leased[id(buffer)] = buffer
+        return buffer
+
+    def release(self, buffer: Optional[np.ndarray]):
+        """Devuelve un buffer prestado (ignora arrays que no son del pool)"""
+        if buffer is None:
+            return
+        with self._lock:
+            if self._leased.pop(id(buffer), None) is None:
+                return
+            free = self._free.setdefault(buffer.shape, [])
+            self._free.move_to_end(buffer.shape)
+            if len(free) < self.max_free_per_shape:
+                free.append(buffer)
+            else:
+                self._reserved_bytes -= buffer.nbytes
+            while len(self._free) > self.max_shapes:
+                # Resolución que ya no llega: se liberan sus buffers
+                _, stale = self._free.popitem(last=False)
+                self._reserved_bytes -= sum(b.nbytes for b in stale)
+
+    def resize_into(self, image: np.ndarray, width: int, height: int) -> np.ndarray:
+        """Reduce `image` a (ancho, alto) en un buffer prestado del pool"""
+        buffer = self.acquire((height, width) + image.shape[2:])
+        return cv2.resize(image, (width, height), dst=buffer, interpolation=cv2.INTER_AREA)
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "reserved_bytes": self._reserved_bytes,
+                "leased": len(self._leased),
+                "free": sum(len(free) for free in self._free.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "max_free_per_shape": self.max_free_per_shape,
+            }
+
+
+class FrameMemoryStats:
+    """Bytes por etapa del frame: último, pico y promedio"""
+
+    STAGES = ("base64", "decoded", "image", "model_input")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {stage: {"frames": 0, "last": 0, "peak": 0, "total": 0} for stage in self.STAGES}
+
+    def record(self, stage: str, nbytes: int):
+        with self._lock:
+            stats = self._stats[stage]
+            stats["frames"] += 1
+            stats["last"] = nbytes
+            stats["peak"] = max(stats["peak"], nbytes)
+            stats["total"] += nbytes
+
+    def get_metrics(self) -> Dict:
+        with self._lock:
+            return {
+                stage: {
+                    "frames": stats["frames"],
+                    "last_bytes": stats["last"],
+                    "peak_bytes": stats["peak"],
+                    "avg_bytes": stats["total"] // stats["frames"] if stats["frames"] else 0,
+                }
+                for stage, stats in self._stats.items()
+            }
+
+
+def process_memory() -> Dict:
+    """RSS actual y pico del proceso en bytes (Linux /proc, si no getrusage)"""
+    try:
+        values = {}
+        with open(f"/proc/{os.getpid()}/status", "r") as status:
+            for line in status:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(value.split()[0]) * 1024
+        return {"rss_bytes": values.get("VmRSS"), "peak_rss_bytes": values.get("VmHWM")}
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return {"rss_bytes": None, "peak_rss_bytes": peak}
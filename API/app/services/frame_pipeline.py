@@ -0,0 +1,295 @@
+"""
+Pipeline por etapas para los frames de detección.
+
+    turno en el scheduler → decode (pool `decode_`) → inferencia (pool `yolo_`)
+    → armado de la respuesta en el event loop
+
+Base64, `cv2.imdecode` y la reducción a la entrada del modelo corren en un
+pool propio (OpenCV libera el GIL), así los hilos de inferencia solo ejecutan
+los modelos. Cada frame ocupa un lugar del scheduler desde antes de
+decodificarse hasta terminar la inferencia: la admisión respeta equidad y
+prioridad entre conexiones, y si la inferencia se atrasa los frames esperan
+su turno en el scheduler (visibles para degradación y hints) en lugar de
+acumular imágenes decodificadas en memoria.
+
+`StageMeter` mide por etapa el tiempo ocupado (utilización de sus hilos) y
+la espera en cola, para dimensionar cada pool de forma que la inferencia
+nunca quede ociosa.
+"""
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.models.ppe_models import DetectionResponse
+from app.services.frame_scheduler import FairFrameScheduler
+
+
+class StageJob:
+    """
+    Trabajo de una etapa, medido en el hilo que lo ejecute. Si el llamador
+    lo cancela antes de empezar no se ejecuta; si ya había empezado, su
+    resultado se entrega a `discard` para liberar recursos.
+    """
+
+    def __init__(self, meter: "StageMeter", fn: Callable[..., Any], args: tuple, discard: Optional[Callable[[Any], None]] = None):
+        self.meter = meter
+        self.fn = fn
+        self.args = args
+        self.discard = discard
+        self.submitted = time.perf_counter()
+        self.started = False
+        self.cancelled = False
+        self.discarded = False
+
+    def __call__(self) -> Any:
+        meter = self.meter
+        with meter._lock:
+            if self.cancelled:
+                return None
+            self.started = True
+            meter._start(time.perf_counter() - self.submitted)
+        started = time.perf_counter()
+        try:
+            result = self.fn(*self.args)
+        except BaseException:
+            meter._finish(time.perf_counter() - started, failed=True)
+            raise
+        meter._finish(time.perf_counter() - started)
+        with meter._lock:
+            orphaned = self.cancelled
+        if orphaned and self.discard is not None:
+            self.discarded = True
+            self.discard(result)
+        return result
+
+    def cancel(self) -> bool:
+        """Marca el trabajo como abandonado. True si no llegó a empezar"""
+        with self.meter._lock:
+            self.cancelled = True
+            if self.started:
+                return False
+            self.meter.queued -= 1
+            return True
+
+
+class StageMeter:
+    """Utilización y espera de una etapa con decaimiento exponencial"""
+
+    def __init__(self, name: str, workers: int, tau: float = 10.0):
+        self.name = name
+        self.workers = max(1, workers)
+        self.tau = tau
+        self._lock = threading.Lock()
+        self._busy = 0.0      # segundos ocupados por segundo (decaído)
+        self._wait_ms = 0.0   # espera en cola (EWMA)
+        self._updated = time.monotonic()
+        self.queued = 0
+        self.active = 0
+        self.jobs = 0
+        self.errors = 0
+
+    def _decay(self, now: float) -> float:
+        return self._busy * math.exp(-(now - self._updated) / self.tau)
+
+    def job(self, fn: Callable[..., Any], *args, discard: Optional[Callable[[Any], None]] = None) -> StageJob:
+        with self._lock:
+            self.queued += 1
+        return StageJob(self, fn, args, discard)
+
+    def _start(self, wait: float):
+        # Se llama con el lock tomado
+        self.queued -= 1
+        self.active += 1
+        wait_ms = wait * 1000
+        self._wait_ms = wait_ms if not self.jobs else 0.9 * self._wait_ms + 0.1 * wait_ms
+
+    def _finish(self, busy: float, failed: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            self._busy = self._decay(now) + busy / self.tau
+            self._updated = now
+            self.active -= 1
+            self.jobs += 1
+            self.errors += failed
+
+    def utilization(self) -> float:
+        with self._lock:
+            return min(1.0, self._decay(time.monotonic()) / self.workers)
+
+    def get_metrics(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "utilization": round(self.utilization(), 3),
+            "active": self.active,
+            "queued": self.queued,
+            "avg_wait_ms": round(self._wait_ms, 2),
+            "jobs": self.jobs,
+            "errors": self.errors,
+        }
+
+
+class _SlotLease:
+    """Lugar del scheduler tomado por un frame; se libera una sola vez"""
+
+    def __init__(self, scheduler: FairFrameScheduler, conn_id: str):
+        self.scheduler = scheduler
+        self.conn_id = conn_id
+        self.released = False
+        # Un trabajo abandonado sigue en su hilo: libera el lugar al terminar
+        self.deferred = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.scheduler.release(self.conn_id)
+
+
+class FramePipeline:
+    """
+    Orquesta las etapas de un frame. Los frames simultáneos los limita el
+    `max_concurrency` del scheduler (hilos de inferencia más los frames en
+    espera entre etapas).
+    Los detectores sin etapas separadas (cliente remoto) pasan por
+    `detect_from_base64` en una sola etapa de inferencia.
+    """
+
+    def __init__(
+        self,
+        decode_executor: Executor,
+        decode_workers: int,
+        inference_executor: Executor,
+        inference_workers: int,
+        scheduler: FairFrameScheduler,
+    ):
+        self.decode_executor = decode_executor
+        self.inference_executor = inference_executor
+        self.scheduler = scheduler
+        self.decode = StageMeter("decode", decode_workers)
+        self.inference = StageMeter("inference", inference_workers)
+        # El armado de la respuesta corre en el event loop (un hilo)
+        self.response = StageMeter("response", 1)
+
+    @staticmethod
+    async def _run_stage(
+        executor: Executor,
+        job: StageJob,
+        lease: _SlotLease,
+        skipped: Optional[Callable[[], None]] = None,
+    ) -> Any:
+        pending = asyncio.get_running_loop().run_in_executor(executor, job)
+        try:
+            # shield: al cancelar, `pending` sigue hasta que el hilo termine
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if job.cancel():
+                if skipped is not None:
+                    skipped()
+            else:
+                lease.deferred = True
+
+                def finished(done: asyncio.Future):
+                    # El trabajo ya había empezado: su resultado no tiene dueño
+                    if not done.cancelled() and done.exception() is None:
+                        if job.discard is not None and not job.discarded:
+                            job.discard(done.result())
+                    lease.release()
+
+                pending.add_done_callback(finished)
+            raise
+
+    async def run(
+        self,
+        conn_id: str,
+        detector,
+        base64_image: str,
+        confidence: float,
+        profile: Optional[str],
+        person_hint: Optional[bool] = None,
+        imgsz: Optional[int] = None,
+    ) -> DetectionResponse:
+        queued_at = time.perf_counter()
+        await self.scheduler.acquire(conn_id)
+        lease = _SlotLease(self.scheduler, conn_id)
+        try:
+            return await self._run_frame(
+                lease, detector, base64_image, confidence, profile, person_hint, imgsz, queued_at
+            )
+        finally:
+            if not lease.deferred:
+                lease.release()
+
+    async def _run_frame(
+        self,
+        lease: _SlotLease,
+        detector,
+        base64_image: str,
+        confidence: float,
+        profile: Optional[str],
+        person_hint: Optional[bool],
+        imgsz: Optional[int],
+        queued_at: float,
+    ) -> DetectionResponse:
+        if not hasattr(detector, "prepare_frame"):
+            job = self.inference.job(
+                detector.detect_from_base64, base64_image, confidence, profile, person_hint, imgsz
+            )
+            return await self._run_stage(self.inference_executor, job, lease)
+
+        decode_start = time.perf_counter()
+        job = self.decode.job(detector.prepare_frame, base64_image, imgsz, discard=detector.release_frame)
+        frame = await self._run_stage(self.decode_executor, job, lease)
+        decode_done = time.perf_counter()
+
+        def infer():
+            # El buffer vuelve al pool desde el hilo que lo usó
+            try:
+                return detector.infer_frame(frame.image, confidence, profile, frame.scale, person_hint, imgsz)
+            finally:
+                detector.release_frame(frame)
+
+        job = self.inference.job(infer)
+        raw = await self._run_stage(self.inference_executor, job, lease, lambda: detector.release_frame(frame))
+        inference_done = time.perf_counter()
+
+        result = self.response.job(detector.build_response, raw)()
+        if result.stage_timings is not None:
+            result.stage_timings.update({
+                "decode_wait_ms": (decode_start - queued_at) * 1000,
+                "decode_ms": frame.decode_ms,
+                "inference_wait_ms": max(0.0, (inference_done - decode_done) * 1000 - raw.processing_time),
+                "build_ms": (time.perf_counter() - inference_done) * 1000,
+            })
+        return result
+
+    def load(self) -> Tuple[int, int]:
+        """
+        (frames en espera, frames en inferencia): en espera cuenta los que
+        aguardan turno en el scheduler, decodificación o un hilo `yolo_`
+        """
+        queued, running = self.scheduler.load()
+        inferring = self.inference.active
+        return queued + max(0, running - inferring), inferring
+
+    def get_metrics(self) -> Dict:
+        stages = {meter.name: meter.get_metrics() for meter in (self.decode, self.inference, self.response)}
+        decode, inference = stages["decode"], stages["inference"]
+        if inference["utilization"] < 0.8 and (decode["utilization"] >= 0.9 or inference["queued"] == 0 and decode["queued"] > 0):
+            advice = "La decodificación limita: aumentar DECODE_WORKERS"
+        elif inference["utilization"] >= 0.9 and decode["utilization"] < 0.3 and decode["workers"] > 1:
+            advice = "Inferencia saturada: sobran hilos de decodificación"
+        else:
+            advice = None
+        queued, running = self.load()
+        return {
+            "stages": stages,
+            "bottleneck": max(stages, key=lambda name: stages[name]["utilization"]),
+            "queues": {
+                "slots": self.scheduler.max_concurrency,
+                "waiting": queued,
+                "inferring": running,
+            },
+            "advice": advice,
+        }
@@ -0,0 +1,253 @@
+"""
+Planificador justo de frames hacia el pipeline de inferencia.
+
+Cada conexión tiene un token bucket (FPS máximo). Los frames admitidos
+esperan por conexión un lugar en el pipeline, que se concede con
+round-robin ponderado entre clases de prioridad y round-robin simple entre
+conexiones de una misma clase, de modo que un cliente que envía frames sin
+pausa no acapara los hilos.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+
+class TokenBucket:
+    """Token bucket clásico: `rate` tokens/s con capacidad `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> Tuple[bool, float]:
+        """Consume un token. Devuelve (admitido, segundos hasta el próximo token)"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True, 0.0
+
+        if self.rate <= 0:
+            return False, math.inf
+        return False, (1.0 - self.tokens) / self.rate
+
+
+class RateMeter:
+    """Tasa de eventos/s con decaimiento exponencial (O(1) por evento)"""
+
+    def __init__(self, tau: float = 10.0):
+        self.tau = tau
+        self.rate = 0.0
+        self.count = 0
+        self.updated = time.monotonic()
+
+    def _decay(self, now: float) -> float:
+        return self.rate * math.exp(-(now - self.updated) / self.tau)
+
+    def mark(self):
+        now = time.monotonic()
+        self.rate = self._decay(now) + 1.0 / self.tau
+        self.updated = now
+        self.count += 1
+
+    def value(self) -> float:
+        return self._decay(time.monotonic())
+
+
+class _ConnectionState:
+
+    def __init__(self, priority: str, bucket: TokenBucket):
+        self.priority = priority
+        self.bucket = bucket
+        self.base_rate = bucket.rate
+        self.queue: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.admitted = RateMeter()
+        self.throttled = RateMeter()
+        self.served = RateMeter()
+
+
+class FairFrameScheduler:
+    """
+    Scheduler delante del pipeline de frames.
+
+    `try_admit` aplica el token bucket de la conexión y `acquire` espera un
+    lugar, que se ocupa hasta `release`. Como máximo `max_concurrency`
+    frames tienen lugar a la vez, elegidos por WRR entre clases de
+    prioridad; cada conexión tiene a lo sumo un frame con lugar.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        priority_weights: Dict[str, int],
+        default_priority: str = "normal",
+        max_fps: float = 5.0,
+        burst: float = 3.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.priority_weights = {name: max(1, int(w)) for name, w in priority_weights.items()}
+        self.default_priority = default_priority if default_priority in self.priority_weights else next(iter(self.priority_weights))
+        self.max_fps = max_fps
+        self.burst = burst
+
+        self._connections: Dict[str, _ConnectionState] = {}
+        # Conexiones con trabajo pendiente, por clase (round-robin interno)
+        self._ready: Dict[str, Deque[str]] = {name: deque() for name in self.priority_weights}
+        self._class_order = sorted(self.priority_weights, key=lambda n: -self.priority_weights[n])
+        self._class_index = 0
+        self._class_credits = self.priority_weights[self._class_order[0]]
+        self._running = 0
+        self._queued = 0
+        self.rate_scale = 1.0
+
+    def register(self, conn_id: str, priority: Optional[str] = None, max_fps: Optional[float] = None):
+        if priority not in self.priority_weights:
+            priority = self.default_priority
+        fps = self.max_fps if max_fps is None else max(0.1, min(max_fps, self.max_fps))
+        state = _ConnectionState(priority, TokenBucket(fps, self.burst))
+        state.bucket.rate = state.base_rate * self.rate_scale
+        self._connections[conn_id] = state
+
+    def set_rate_scale(self, scale: float):
+        """Escala el FPS de todas las conexiones (degradación por sobrecarga)"""
+        self.rate_scale = scale
+        for state in self._connections.values():
+            state.bucket.rate = state.base_rate * scale
+
+    def unregister(self, conn_id: str):
+        state = self._connections.pop(conn_id, None)
+        if state is None:
+            return
+        while state.queue:
+            future = state.queue.popleft()
+            self._queued -= 1
+            if not future.done():
+                future.cancel()
+        ready = self._ready[state.priority]
+        if conn_id in ready:
+            ready.remove(conn_id)
+
+    def is_registered(self, conn_id: str) -> bool:
+        return conn_id in self._connections
+
+    def is_idle(self, conn_id: str) -> bool:
+        """Sin trabajos en cola ni en ejecución (se puede olvidar)"""
+        state = self._connections.get(conn_id)
+        return state is None or (not state.queue and state.in_flight == 0)
+
+    def try_admit(self, conn_id: str) -> Tuple[bool, float]:
+        """Aplica el token bucket. Devuelve (admitido, retry_after en segundos)"""
+        state = self._connections.get(conn_id)
+        if state is None:
+            return True, 0.0
+
+        admitted, retry_after = state.bucket.try_acquire()
+        if admitted:
+            state.admitted.mark()
+        else:
+            state.throttled.mark()
+        return admitted, retry_after
+
+    async def acquire(self, conn_id: str):
+        """Espera el turno (WRR) de la conexión y ocupa un lugar hasta `release`"""
+        state = self._connections.get(conn_id)
+        if state is None:
+            raise RuntimeError(f"Conexión no registrada en el scheduler: {conn_id}")
+
+        future = asyncio.get_running_loop().create_future()
+        state.queue.append(future)
+        self._queued += 1
+        if len(state.queue) == 1 and state.in_flight == 0:
+            self._ready[state.priority].append(conn_id)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # El lugar pudo concederse justo al cancelar: se devuelve
+            if future.done() and not future.cancelled():
+                self.release(conn_id)
+            raise
+
+    def release(self, conn_id: str):
+        """Libera el lugar tomado con `acquire`"""
+        self._running -= 1
+        state = self._connections.get(conn_id)
+        if state is not None:
+            state.in_flight -= 1
+            state.served.mark()
+            self._requeue(conn_id, state)
+        self._dispatch()
+
+    def _next_connection(self) -> Optional[str]:
+        """WRR entre clases: cada clase sirve hasta `peso` trabajos por turno"""
+        for _ in range(len(self._class_order) + 1):
+            name = self._class_order[self._class_index]
+            ready = self._ready[name]
+            if ready and self._class_credits > 0:
+                self._class_credits -= 1
+                return ready.popleft()
+
+            self._class_index = (self._class_index + 1) % len(self._class_order)
+            self._class_credits = self.priority_weights[self._class_order[self._class_index]]
+        return None
+
+    def _dispatch(self):
+        while self._running < self.max_concurrency:
+            conn_id = self._next_connection()
+            if conn_id is None:
+                return
+
+            state = self._connections.get(conn_id)
+            if state is None:
+                continue
+
+            future = state.queue.popleft()
+            self._queued -= 1
+            if future.done():
+                # Cancelado mientras esperaba (timeout del cliente)
+                self._requeue(conn_id, state)
+                continue
+
+            self._running += 1
+            state.in_flight += 1
+            future.set_result(None)
+
+    def _requeue(self, conn_id: str, state: _ConnectionState):
+        if state.queue and state.in_flight == 0:
+            self._ready[state.priority].append(conn_id)
+
+    def load(self) -> Tuple[int, int]:
+        """Devuelve (frames esperando lugar, frames con lugar)"""
+        return self._queued, self._running
+
+    def get_metrics(self) -> Dict:
+        connections = {}
+        for conn_id, state in self._connections.items():
+            connections[conn_id] = {
+                "priority": state.priority,
+                "max_fps": state.bucket.rate,
+                "queued": len(state.queue),
+                "in_flight": state.in_flight,
+                "admitted_total": state.admitted.count,
+                "throttled_total": state.throttled.count,
+                "served_total": state.served.count,
+                "admitted_fps": round(state.admitted.value(), 3),
+                "throttled_fps": round(state.throttled.value(), 3),
+                "served_fps": round(state.served.value(), 3),
+            }
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self._running,
+            "queued": self._queued,
+            "priority_weights": self.priority_weights,
+            "rate_scale": self.rate_scale,
+            "connections": connections,
+        }
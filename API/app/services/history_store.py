@@ -0,0 +1,250 @@
+"""
+Historial persistente de detecciones en SQLite (modo WAL).
+
+Los eventos se encolan sin bloquear y un hilo escritor los inserta en lotes
+dentro de una sola transacción. Cada evento guarda el perfil de EPP y la
+máscara de elementos que exige, así los reportes de faltantes solo cuentan
+lo que la cámara debía llevar. Las consultas agregadas usan índices por
+tiempo y cámara y abren su propia conexión de lectura, así que nunca
+compiten con el camino de detección en tiempo real.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.models.ppe_models import DetectionResponse
+from app.services.response_codec import PPE_ITEMS, ppe_status_to_bits
+
+
+# Eventos anteriores a los perfiles: se exigían todos los elementos
+ALL_ITEMS_MASK = (1 << len(PPE_ITEMS)) - 1
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS detection_events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    has_person INTEGER NOT NULL,
+    is_compliant INTEGER NOT NULL,
+    ppe_bits INTEGER NOT NULL,
+    num_detections INTEGER NOT NULL,
+    processing_ms REAL,
+    profile TEXT,
+    required_bits INTEGER NOT NULL DEFAULT {ALL_ITEMS_MASK}
+);
+CREATE INDEX IF NOT EXISTS idx_events_ts ON detection_events (ts);
+CREATE INDEX IF NOT EXISTS idx_events_camera_ts ON detection_events (camera, ts);
+"""
+
+_INSERT = """
+INSERT INTO detection_events
+    (ts, camera, has_person, is_compliant, ppe_bits, num_detections, processing_ms, profile, required_bits)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Columnas agregadas después de la primera versión del esquema
+_MIGRATIONS = (
+    ("profile", "ALTER TABLE detection_events ADD COLUMN profile TEXT"),
+    ("required_bits", f"ALTER TABLE detection_events ADD COLUMN required_bits INTEGER NOT NULL DEFAULT {ALL_ITEMS_MASK}"),
+)
+
+_STOP = object()
+
+EventRow = Tuple[float, str, int, int, int, int, Optional[float], Optional[str], int]
+
+
+class DetectionHistoryStore:
+    """Store append-only con escritor en segundo plano"""
+
+    def __init__(
+        self,
+        db_path: str,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self.metrics: Dict[str, int] = {"queued": 0, "written": 0, "dropped": 0, "batches": 0}
+
+    def start(self):
+        if self._writer and self._writer.is_alive():
+            return
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self._connect()
+        try:
+            connection.executescript(_SCHEMA)
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(detection_events)")}
+            with connection:
+                for column, statement in _MIGRATIONS:
+                    if column not in columns:
+                        connection.execute(statement)
+        finally:
+            connection.close()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="history_writer", daemon=True)
+        self._writer.start()
+        print(f"Historial de detecciones: {self.db_path}")
+
+    def stop(self, timeout: float = 5.0):
+        """Vacía la cola pendiente y detiene el escritor"""
+        if not self._writer:
+            return
+        self._queue.put(_STOP)
+        self._writer.join(timeout=timeout)
+        self._writer = None
+
+    def record(
+        self,
+        camera: str,
+        result: DetectionResponse,
+        required_bits: int = ALL_ITEMS_MASK,
+        timestamp: Optional[float] = None,
+    ):
+        """
+        Encola un evento con la máscara de EPP que exige su perfil; si la
+        cola está llena se descarta (nunca bloquea)
+        """
+        row: EventRow = (
+            timestamp or time.time(),
+            camera,
+            int(result.has_person),
+            int(result.is_compliant),
+            ppe_status_to_bits(result.ppe_status),
+            len(result.detections),
+            result.processing_time,
+            result.profile,
+            required_bits,
+        )
+        try:
+            self._queue.put_nowait(row)
+            self.metrics["queued"] += 1
+        except queue.Full:
+            self.metrics["dropped"] += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=10.0, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _writer_loop(self):
+        connection = self._connect()
+        stopping = False
+        try:
+            while not stopping:
+                batch: List[EventRow] = []
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    continue
+
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+
+                if batch:
+                    try:
+                        with connection:
+                            connection.executemany(_INSERT, batch)
+                        self.metrics["written"] += len(batch)
+                        self.metrics["batches"] += 1
+                    except sqlite3.Error as e:
+                        print(f"Error escribiendo historial: {e}")
+                        self.metrics["dropped"] += len(batch)
+        finally:
+            connection.close()
+
+    def _query(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        connection = sqlite3.connect(self.db_path, timeout=10.0)
+        connection.row_factory = sqlite3.Row
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _time_filter(camera: Optional[str], since: float, until: float) -> Tuple[str, tuple]:
+        where = "ts >= ? AND ts < ?"
+        params: tuple = (since, until)
+        if camera:
+            where += " AND camera = ?"
+            params += (camera,)
+        return where, params
+
+    def compliance_by_hour(self, since: float, until: float, camera: Optional[str] = None) -> List[Dict]:
+        """Tasa de cumplimiento por cámara y hora (solo frames con persona)"""
+        where, params = self._time_filter(camera, since, until)
+        rows = self._query(
+            f"""
+            SELECT camera,
+                   CAST(ts / 3600 AS INTEGER) * 3600 AS hour,
+                   COUNT(*) AS frames,
+                   SUM(is_compliant) AS compliant
+            FROM detection_events
+            WHERE {where} AND has_person = 1
+            GROUP BY camera, hour
+            ORDER BY camera, hour
+            """,
+            params,
+        )
+        return [
+            {
+                "camera": row["camera"],
+                "hour": row["hour"],
+                "frames": row["frames"],
+                "compliant": row["compliant"],
+                "compliance_rate": round(row["compliant"] / row["frames"], 4),
+            }
+            for row in rows
+        ]
+
+    def missing_items(self, since: float, until: float, camera: Optional[str] = None) -> List[Dict]:
+        """
+        Frecuencia con la que falta cada EPP, de mayor a menor. Solo cuentan
+        los frames cuyo perfil exige el elemento (`required`)
+        """
+        where, params = self._time_filter(camera, since, until)
+        columns = ", ".join(
+            f"SUM((required_bits & {1 << index}) != 0) AS required_{index}, "
+            f"SUM((required_bits & {1 << index}) != 0 AND (ppe_bits & {1 << index}) = 0) AS missing_{index}"
+            for index in range(len(PPE_ITEMS))
+        )
+        rows = self._query(
+            f"SELECT COUNT(*) AS frames, {columns} FROM detection_events "
+            f"WHERE {where} AND has_person = 1",
+            params,
+        )
+        row = rows[0]
+        items = []
+        for index, item in enumerate(PPE_ITEMS):
+            required = row[f"required_{index}"] or 0
+            missing = row[f"missing_{index}"] or 0
+            items.append({
+                "item": item,
+                "required": required,
+                "missing": missing,
+                "missing_rate": round(missing / required, 4) if required else 0.0,
+            })
+        return sorted(items, key=lambda entry: entry["missing"], reverse=True)
+
+    def get_metrics(self) -> Dict:
+        return {**self.metrics, "pending": self._queue.qsize(), "db_path": self.db_path}
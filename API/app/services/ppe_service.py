@@ -1,26 +1,87 @@
 
-from ultralytics import YOLO
 import cv2
 import numpy as np
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import os
 import time
 import base64
 from app.models.ppe_models import PPEStatus, Detection, DetectionResponse
+from app.services.response_codec import PPE_ITEMS, bits_to_ppe_status
+from app.services.tiling import plan_tiles, nms_numpy
+from app.services.frame_memory import (
+    FrameBufferPool, FrameMemoryStats, is_jpeg, read_image_size, reduced_decode_flag
+)
+
+if TYPE_CHECKING:
+    from ultralytics import YOLO
+
+
+_yolo_class = None
+
+
+def load_yolo_class():
+    """Importa ultralytics/torch solo cuando hace falta (arranque rápido)"""
+    global _yolo_class
+    if _yolo_class is None:
+        from ultralytics import YOLO
+        _yolo_class = YOLO
+    return _yolo_class
+
+
+class DecodedFrame:
+    """Salida de la etapa de decodificación"""
+
+    def __init__(self, image: np.ndarray, scale: float, decode_ms: float):
+        self.image = image
+        self.scale = scale
+        self.decode_ms = decode_ms
+
+
+class RawDetections:
+    """Salida de la etapa de inferencia: cajas crudas sin reglas de EPP"""
+
+    def __init__(
+        self,
+        profile: str,
+        has_person: bool,
+        boxes: List[Tuple[int, float, List[float]]],
+        scale: float = 1.0,
+        processing_time: float = 0.0,
+        stage_timings: Optional[Dict[str, float]] = None,
+        error: bool = False,
+        person_inferred: bool = False
+    ):
+        self.profile = profile
+        self.has_person = has_person
+        self.boxes = boxes
+        self.scale = scale
+        self.processing_time = processing_time
+        self.stage_timings = stage_timings
+        self.error = error
+        self.person_inferred = person_inferred
+
+    @classmethod
+    def failed(cls, profile: str) -> "RawDetections":
+        return cls(profile, True, [], error=True)
 
 
 class PPEDetectorService:
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        profiles: Optional[Dict[str, List[str]]] = None,
+        default_profile: Optional[str] = None,
+        model_version: Optional[str] = None
+    ):
         self.model_path = model_path
-        self.model: Optional[YOLO] = None
-        self.person_detector: Optional[YOLO] = None
+        self.model_version = model_version or self._default_version(model_path)
+        self.model: Optional["YOLO"] = None
+        self.person_detector: Optional["YOLO"] = None
         self.model_loaded = False
         self.person_detector_loaded = False
         
-        self._load_model()
-        self._load_person_detector()
-        
         self.ppe_classes = {
             'casco': ['casco'],
             'lentes': ['gafas'],
@@ -29,16 +90,38 @@ class PPEDetectorService:
             'ropa': ['chaleco', 'protector'],
             'tapabocas': ['tapabocas'] 
         }
+        self.profiles = profiles or {"completo": list(self.ppe_classes.keys())}
+        self.default_profile = default_profile if default_profile in self.profiles else next(iter(self.profiles))
+        self.class_bits: List[int] = []
+        self.profile_masks: Dict[str, int] = {}
+        self.tiling_enabled = False
+        self.max_frame_pixels = 0
+        self.frame_downscale = False
+        self.frame_pool = FrameBufferPool()
+        self.memory_stats = FrameMemoryStats()
+        
+        # Ambos modelos se cargan en paralelo (la lectura de pesos libera el GIL)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="model_load_") as pool:
+            person_loading = pool.submit(self._load_person_detector)
+            self._load_model()
+            person_loading.result()
+        self._compile_rules()
+    
+    @staticmethod
+    def _default_version(model_path: Optional[str]) -> str:
+        if model_path and os.path.exists(model_path):
+            return f"{os.path.basename(model_path)}@{int(os.path.getmtime(model_path))}"
+        return "yolov8n"
     
     def _load_model(self):
 
         try:
             if self.model_path and os.path.exists(self.model_path):
-                self.model = YOLO(self.model_path)
+                self.model = load_yolo_class()(self.model_path)
                 print(f"Modelo personalizado cargado: {self.model_path}")
             else:
 
-                self.model = YOLO('yolov8n.pt')
+                self.model = load_yolo_class()('yolov8n.pt')
                 print("Usando YOLOv8n preentrenado. Entrena tu propio modelo para EPP.")
             
             self.model_loaded = True
@@ -47,13 +130,54 @@ class PPEDetectorService:
             self.model_loaded = False
             raise
     
+    def _compile_rules(self):
+        """
+        Compila las reglas de EPP a tablas de bits: `class_bits[class_id]` es el
+        bit del elemento de EPP que representa la clase (0 si ninguno) y
+        `profile_masks[perfil]` son los bits requeridos por el perfil.
+        """
+        names = self.model.names if self.model else {}
+        size = max(names.keys(), default=-1) + 1
+        class_bits = [0] * size
+        for class_id, class_name in names.items():
+            class_name_lower = class_name.lower()
+            for ppe_type, class_names in self.ppe_classes.items():
+                if any(cn in class_name_lower for cn in class_names):
+                    class_bits[class_id] = 1 << PPE_ITEMS.index(ppe_type)
+                    break
+        
+        profile_masks = {}
+        for profile, items in self.profiles.items():
+            unknown = [item for item in items if item not in PPE_ITEMS]
+            if unknown:
+                raise ValueError(f"Perfil '{profile}' con EPP desconocido: {unknown}")
+            mask = 0
+            for item in items:
+                mask |= 1 << PPE_ITEMS.index(item)
+            profile_masks[profile] = mask
+        
+        self.class_bits = class_bits
+        self.profile_masks = profile_masks
+        print(f"Perfiles de EPP compilados: {list(profile_masks.keys())}")
+    
+    def resolve_profile(self, profile: Optional[str]) -> str:
+        """Nombre de perfil válido (el por defecto si no se indica)"""
+        if not profile:
+            return self.default_profile
+        if profile not in self.profile_masks:
+            raise ValueError(f"Perfil de EPP desconocido: '{profile}'")
+        return profile
+    
+    def get_profile_mask(self, profile: Optional[str]) -> int:
+        return self.profile_masks[self.resolve_profile(profile)]
+    
     def _load_person_detector(self):
         try:
             person_model_path = os.path.join(os.path.dirname(self.model_path or ''), 'yolov8n.pt')
             if not os.path.exists(person_model_path):
                 person_model_path = 'models/yolov8n.pt'
             
-            self.person_detector = YOLO(person_model_path)
+            self.person_detector = load_yolo_class()(person_model_path)
             self.person_detector_loaded = True
             print(f"Detector de personas cargado: {person_model_path}")
         except Exception as e:
@@ -61,13 +185,18 @@ class PPEDetectorService:
             print("Continuando sin validación de personas")
             self.person_detector_loaded = False
     
-    def detect_person(self, image: np.ndarray, confidence: float = 0.4) -> bool:
+    def detect_persons(self, image: np.ndarray, confidence: float = 0.4) -> Optional[np.ndarray]:
+        """
+        Cajas [x1, y1, x2, y2] de las personas detectadas. Devuelve None si no
+        hay detector de personas o falló (se asume que hay personas).
+        """
         if not self.person_detector_loaded or self.person_detector is None:
-            return True
+            return None
         
         try:
             results = self.person_detector(image, conf=confidence, verbose=False)
             
+            persons = []
             for result in results:
                 boxes = result.boxes
                 for box in boxes:
@@ -77,19 +206,218 @@ class PPEDetectorService:
                     if class_name == "person":
                         conf = float(box.conf[0])
                         print(f"Persona detectada (confianza: {conf:.2%})")
-                        return True
+                        persons.append(box.xyxy[0].cpu().numpy())
             
-            print("No se detectaron personas en la imagen")
-            return False
+            if not persons:
+                print("No se detectaron personas en la imagen")
+                return np.zeros((0, 4), dtype=np.float32)
+            return np.stack(persons).astype(np.float32)
         
         except Exception as e:
             print(f"Error en detección de personas: {e}")
 
-            return True
+            return None
     
-    def detect(self, image: np.ndarray, confidence: float = 0.5) -> DetectionResponse:
-        """Detección robusta con manejo de errores que no rompe la conexión"""
+    def detect_person(self, image: np.ndarray, confidence: float = 0.4) -> bool:
+        persons = self.detect_persons(image, confidence)
+        return persons is None or len(persons) > 0
+    
+    def configure_tiling(
+        self,
+        enabled: bool,
+        tile_size: Optional[int] = None,
+        overlap: float = 0.2,
+        max_tiles: int = 8,
+        latency_budget_ms: float = 0.0,
+        nms_iou: float = 0.5,
+        around_persons: bool = True,
+        min_scale: float = 1.5
+    ):
+        """
+        Modo mosaico para frames grandes: se recorta el frame en tiles
+        solapados (solo alrededor de personas si `around_persons`), se infieren
+        en un único batch junto con el frame completo y se fusionan con NMS.
+        Con `latency_budget_ms` > 0 el número de tiles se limita según la
+        latencia medida por tile.
+        """
+        self.tiling_enabled = enabled
+        self.tile_size = tile_size or self.get_input_size()
+        self.tile_overlap = overlap
+        self.tile_max = max(1, max_tiles)
+        self.tile_latency_budget_ms = latency_budget_ms
+        self.tile_nms_iou = nms_iou
+        self.tile_around_persons = around_persons
+        self.tile_min_scale = min_scale
+        self._tile_ms: Optional[float] = None
+    
+    def configure_frames(self, max_pixels: int = 0, downscale: bool = True):
+        """
+        Límite de píxeles por frame (0 = sin límite), comprobado en la
+        cabecera antes de decodificar; con límite, los formatos cuya cabecera
+        no se lee (distintos de JPEG y PNG) se rechazan. Con `downscale` los frames mayores que
+        la entrada del modelo se decodifican reducidos (JPEG) o se reducen en
+        un buffer reutilizable; las cajas se devuelven en coordenadas originales.
+        """
+        self.max_frame_pixels = max_pixels
+        self.frame_downscale = downscale
+        if max_pixels:
+            # Segunda barrera en OpenCV; se lee en el primer imdecode del proceso
+            os.environ.setdefault("OPENCV_IO_MAX_IMAGE_PIXELS", str(max_pixels))
+    
+    def decode_frame(self, img_bytes: bytes, target: Optional[int] = None) -> tuple:
+        """Decodifica con memoria acotada. Devuelve (imagen, escala a original)"""
+        size = read_image_size(img_bytes)
+        if self.max_frame_pixels:
+            # Sin tamaño en la cabecera no se puede acotar la memoria antes
+            # de decodificar: con límite solo se aceptan JPEG y PNG
+            if size is None:
+                raise ValueError("Formato de imagen no soportado: se aceptan JPEG o PNG")
+            if size[0] * size[1] > self.max_frame_pixels:
+                raise ValueError(
+                    f"Imagen demasiado grande: {size[0]}x{size[1]} px (máx {self.max_frame_pixels} px)"
+                )
+        
+        # El modo mosaico necesita la resolución completa, salvo bajo
+        # degradación (`target`): ahí se infiere en una sola pasada reducida
+        downscale = self.frame_downscale and (not self.tiling_enabled or target is not None)
+        target = target or self.get_input_size()
+        flag, scale = cv2.IMREAD_COLOR, 1.0
+        if downscale and size and is_jpeg(img_bytes):
+            flag, factor = reduced_decode_flag(size[0], size[1], target)
+            scale = float(factor)
+        
+        image = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), flag)
+        if image is None:
+            return None, scale
+        if size and flag != cv2.IMREAD_COLOR:
+            # El factor real según el tamaño decodificado (redondeo de libjpeg).
+            # Con el lado mayor: imdecode aplica la rotación EXIF y la cabecera
+            # trae ancho/alto sin rotar
+            scale = max(size) / max(image.shape[:2])
+        self.memory_stats.record("image", image.nbytes)
+        
+        height, width = image.shape[:2]
+        longest = max(height, width)
+        if downscale and longest > target * 1.25:
+            ratio = target / longest
+            image = self.frame_pool.resize_into(
+                image, max(1, round(width * ratio)), max(1, round(height * ratio))
+            )
+            scale *= width / image.shape[1]
+        self.memory_stats.record("model_input", image.nbytes)
+        return image, scale
+    
+    def get_memory_metrics(self) -> Dict:
+        return {
+            "stages": self.memory_stats.get_metrics(),
+            "buffer_pool": self.frame_pool.get_metrics(),
+            "max_frame_pixels": self.max_frame_pixels,
+            "downscale": self.frame_downscale,
+        }
+    
+    def _use_tiling(self, image: np.ndarray) -> bool:
+        if not self.tiling_enabled:
+            return False
+        # Solo compensa si el frame es bastante mayor que la entrada del modelo
+        return max(image.shape[:2]) >= self.tile_size * self.tile_min_scale
+    
+    def _tile_budget(self) -> int:
+        if self.tile_latency_budget_ms <= 0 or not self._tile_ms:
+            return self.tile_max
+        # El frame completo también ocupa una posición del batch
+        affordable = int(self.tile_latency_budget_ms / self._tile_ms) - 1
+        return max(1, min(self.tile_max, affordable))
+    
+    def _detect_tiled(self, image: np.ndarray, confidence: float, persons: Optional[np.ndarray]):
+        height, width = image.shape[:2]
+        regions = persons if self.tile_around_persons else None
+        tiles = plan_tiles(width, height, self.tile_size, self.tile_overlap, self._tile_budget(), regions)
+        print(f"Modo mosaico: {len(tiles)} tiles de ~{self.tile_size}px")
+        
+        batch = [image] + [image[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        origins = [(0, 0)] + [(x1, y1) for x1, y1, _, _ in tiles]
+        
+        batch_start = time.time()
+        results = self.model(batch, conf=confidence, verbose=False)
+        tile_ms = (time.time() - batch_start) * 1000 / len(batch)
+        self._tile_ms = tile_ms if self._tile_ms is None else 0.8 * self._tile_ms + 0.2 * tile_ms
+        
+        all_boxes, all_scores, all_classes = [], [], []
+        for result, (offset_x, offset_y) in zip(results, origins):
+            boxes = result.boxes
+            if len(boxes) == 0:
+                continue
+            xyxy = boxes.xyxy.cpu().numpy().astype(np.float32)
+            xyxy[:, [0, 2]] += offset_x
+            xyxy[:, [1, 3]] += offset_y
+            all_boxes.append(xyxy)
+            all_scores.append(boxes.conf.cpu().numpy())
+            all_classes.append(boxes.cls.cpu().numpy().astype(np.int64))
+        
+        if not all_boxes:
+            return []
+        
+        xyxy = np.concatenate(all_boxes)
+        scores = np.concatenate(all_scores)
+        classes = np.concatenate(all_classes)
+        keep = nms_numpy(xyxy, scores, classes, self.tile_nms_iou)
+        print(f"Cajas tras NMS entre tiles: {len(keep)} de {len(xyxy)}")
+        return [(int(classes[i]), float(scores[i]), xyxy[i].tolist()) for i in keep]
+    
+    def _iter_boxes(self, results):
+        """(class_id, confianza, bbox) de cada caja de los resultados YOLO"""
+        print(f"Número de resultados: {len(results)}")
+        for result in results:
+            try:
+                boxes = result.boxes
+                print(f"Número de cajas detectadas: {len(boxes)}")
+                for box in boxes:
+                    try:
+                        yield int(box.cls[0]), float(box.conf[0]), box.xyxy[0].cpu().numpy().tolist()
+                    except Exception as box_error:
+                        print(f"Error procesando box: {str(box_error)}")
+                        continue
+            
+            except Exception as result_error:
+                print(f"Error procesando resultado: {str(result_error)}")
+                continue
+    
+    def detect(
+        self,
+        image: np.ndarray,
+        confidence: float = 0.5,
+        profile: Optional[str] = None,
+        scale: float = 1.0,
+        person_hint: Optional[bool] = None,
+        imgsz: Optional[int] = None
+    ) -> DetectionResponse:
+        """
+        Detección robusta con manejo de errores que no rompe la conexión.
+        `scale` lleva las cajas a las coordenadas del frame original si la
+        imagen se redujo al decodificar.
+        Bajo degradación: `person_hint` reutiliza el último resultado del
+        detector de personas del stream (None = ejecutarlo) e `imgsz` reduce
+        la entrada del modelo EPP; en ambos casos no se usa el modo mosaico.
+        Con la persona supuesta, el resultado se marca `person_inferred`.
+        """
+        return self.build_response(self.infer_frame(image, confidence, profile, scale, person_hint, imgsz))
+    
+    def infer_frame(
+        self,
+        image: np.ndarray,
+        confidence: float = 0.5,
+        profile: Optional[str] = None,
+        scale: float = 1.0,
+        person_hint: Optional[bool] = None,
+        imgsz: Optional[int] = None
+    ) -> RawDetections:
+        """
+        Etapa de inferencia: solo los modelos y la lectura de cajas. La
+        respuesta se arma después con `build_response`, fuera del hilo de
+        inferencia.
+        """
         start_time = time.time()
+        profile = self.resolve_profile(profile)
         
         try:
             if self.model is None:
@@ -97,108 +425,51 @@ class PPEDetectorService:
             
             print(f"\n🔍 Iniciando detección con confianza: {confidence}")
 
-            has_person = self.detect_person(image, confidence=0.4)
+            if person_hint is None:
+                persons = self.detect_persons(image, confidence=0.4)
+                has_person = persons is None or len(persons) > 0
+            else:
+                persons, has_person = None, person_hint
+            stage_timings = {"person_ms": (time.time() - start_time) * 1000}
             
             if not has_person:
                 print("Sin personas detectadas - Omitiendo detección EPP")
-                processing_time = (time.time() - start_time) * 1000
-                return DetectionResponse(
-                    ppe_status=PPEStatus(),
-                    detections=[],
-                    is_compliant=True,
-                    processing_time=processing_time,
-                    has_person=False
+                return RawDetections(
+                    profile, False, [], scale, (time.time() - start_time) * 1000, stage_timings,
+                    person_inferred=person_hint is not None
                 )
             
             print("Persona detectada - Procesando EPP")
             
+            ppe_start = time.time()
             try:
-                results = self.model(image, conf=confidence, verbose=False)
+                # Degradado: una sola pasada a `imgsz`, sin mosaico
+                degraded = imgsz is not None or person_hint is not None
+                if not degraded and self._use_tiling(image):
+                    boxes = list(self._detect_tiled(image, confidence, persons))
+                else:
+                    if imgsz:
+                        results = self.model(image, conf=confidence, verbose=False, imgsz=imgsz)
+                    else:
+                        results = self.model(image, conf=confidence, verbose=False)
+                    boxes = list(self._iter_boxes(results))
             except Exception as yolo_error:
                 print(f"Error en inferencia YOLO: {type(yolo_error).__name__}: {str(yolo_error)}")
-
-                return DetectionResponse(
-                    ppe_status=PPEStatus(),
-                    detections=[],
-                    is_compliant=False,
-                    processing_time=0.0,
-                    has_person=True
-                )
-
-            ppe_status = PPEStatus()
-            detections = []
-            
-            print(f"Número de resultados: {len(results)}")
-            for result in results:
-                try:
-                    boxes = result.boxes
-                    print(f"Número de cajas detectadas: {len(boxes)}")
-                    for box in boxes:
-                        try:
-                            class_id = int(box.cls[0])
-                            class_name = self.model.names[class_id]
-                            class_name_lower = class_name.lower()
-                            conf = float(box.conf[0])
-                            bbox = box.xyxy[0].cpu().numpy().tolist()
-                            
-                            print(f"Objeto detectado: '{class_name}' (confianza: {conf:.2%})")
-
-                            matched = False
-                            for ppe_type, class_names in self.ppe_classes.items():
-                                if any(cn in class_name_lower for cn in class_names):
-                                    setattr(ppe_status, ppe_type, True)
-                                    print(f"MATCH! {class_name} → {ppe_type}")
-                                    matched = True
-                                    break
-                            
-                            if not matched:
-                                print(f"No se encontró match para '{class_name}'")
-                            
-                            detections.append(Detection(
-                                **{"class": class_name},
-                                confidence=conf,
-                                bbox=bbox
-                            ))
-                        except Exception as box_error:
-                            print(f"Error procesando box: {str(box_error)}")
-                            continue
-                
-                except Exception as result_error:
-                    print(f"Error procesando resultado: {str(result_error)}")
-                    continue
-            
-            processing_time = (time.time() - start_time) * 1000 
-            
-            print(f"Estado final de EPP:")
-            print(f"  Casco: {ppe_status.casco}")
-            print(f"  Lentes: {ppe_status.lentes}")
-            print(f"  Guantes: {ppe_status.guantes}")
-            print(f"  Botas: {ppe_status.botas}")
-            print(f"  Ropa: {ppe_status.ropa}")
-            print(f"  Tapabocas: {ppe_status.tapabocas}")
-            
-            is_compliant = all([
-                ppe_status.casco,
-                ppe_status.lentes,
-                ppe_status.guantes,
-                ppe_status.botas,
-                ppe_status.ropa,
-                ppe_status.tapabocas
-            ])
-            
-            print(f" Cumplimiento: {is_compliant}")
-            print(f" Tiempo de procesamiento: {processing_time:.2f}ms\n")
+                return RawDetections.failed(profile)
             
-            return DetectionResponse(
-                ppe_status=ppe_status,
-                detections=detections,
-                is_compliant=is_compliant,
-                processing_time=processing_time,
-                has_person=True
+            stage_timings["ppe_ms"] = (time.time() - ppe_start) * 1000
+            return RawDetections(
+                profile, True, boxes, scale, (time.time() - start_time) * 1000, stage_timings,
+                person_inferred=person_hint is not None
             )
         
         except Exception as e:
             print(f"Error crítico en detect(): {type(e).__name__}: {str(e)}")
+            return RawDetections.failed(profile)
+    
+    def build_response(self, raw: RawDetections) -> DetectionResponse:
+        """Reglas de EPP y armado de la respuesta a partir de las cajas crudas"""
+        if raw.error:
             return DetectionResponse(
                 ppe_status=PPEStatus(),
                 detections=[],
@@ -206,22 +477,100 @@ class PPEDetectorService:
                 processing_time=0.0,
                 has_person=True
             )
+        
+        if not raw.has_person:
+            return DetectionResponse(
+                ppe_status=PPEStatus(),
+                detections=[],
+                is_compliant=True,
+                processing_time=raw.processing_time,
+                has_person=False,
+                profile=raw.profile,
+                model_version=self.model_version,
+                person_inferred=raw.person_inferred or None,
+                stage_timings=raw.stage_timings
+            )
+        
+        ppe_bits = 0
+        class_bits = self.class_bits
+        detections = []
+        
+        for class_id, conf, bbox in raw.boxes:
+            try:
+                class_name = self.model.names[class_id]
+                if raw.scale != 1.0:
+                    bbox = [value * raw.scale for value in bbox]
+                
+                print(f"Objeto detectado: '{class_name}' (confianza: {conf:.2%})")
+
+                bit = class_bits[class_id] if class_id < len(class_bits) else 0
+                if bit:
+                    ppe_bits |= bit
+                    print(f"MATCH! {class_name} → {PPE_ITEMS[bit.bit_length() - 1]}")
+                else:
+                    print(f"No se encontró match para '{class_name}'")
+                
+                detections.append(Detection(
+                    **{"class": class_name},
+                    class_id=class_id,
+                    confidence=conf,
+                    bbox=bbox
+                ))
+            except Exception as box_error:
+                print(f"Error procesando box: {str(box_error)}")
+                continue
+        
+        ppe_status = bits_to_ppe_status(ppe_bits)
+        required_mask = self.profile_masks[raw.profile]
+        
+        print(f"Estado final de EPP (perfil '{raw.profile}'):")
+        print(f"  Casco: {ppe_status.casco}")
+        print(f"  Lentes: {ppe_status.lentes}")
+        print(f"  Guantes: {ppe_status.guantes}")
+        print(f"  Botas: {ppe_status.botas}")
+        print(f"  Ropa: {ppe_status.ropa}")
+        print(f"  Tapabocas: {ppe_status.tapabocas}")
+        
+        is_compliant = ppe_bits & required_mask == required_mask
+        
+        print(f" Cumplimiento: {is_compliant}")
+        print(f" Tiempo de procesamiento: {raw.processing_time:.2f}ms\n")
+        
+        return DetectionResponse(
+            ppe_status=ppe_status,
+            detections=detections,
+            is_compliant=is_compliant,
+            processing_time=raw.processing_time,
+            has_person=True,
+            profile=raw.profile,
+            model_version=self.model_version,
+            person_inferred=raw.person_inferred or None,
+            stage_timings=raw.stage_timings
+        )
     
-    def detect_from_base64(self, base64_image: str, confidence: float = 0.5) -> DetectionResponse:
-        """Decodificación robusta de base64 con manejo de errores"""
+    def prepare_frame(self, base64_image: str, imgsz: Optional[int] = None) -> DecodedFrame:
+        """
+        Etapa de decodificación: base64 → bytes → imagen reducida a la
+        entrada del modelo. Lanza ValueError si el frame no es válido.
+        """
+        decode_start = time.time()
         try:
-            if ',' in base64_image:
-                base64_image = base64_image.split(',')[1]
+            self.memory_stats.record("base64", len(base64_image))
+            prefix_end = base64_image.find(',', 0, 100)
+            if prefix_end >= 0:
+                base64_image = base64_image[prefix_end + 1:]
             
             try:
                 img_bytes = base64.b64decode(base64_image)
             except Exception as decode_error:
                 print(f"Error decodificando base64: {str(decode_error)}")
                 raise ValueError(f"Base64 inválido: {str(decode_error)}")
+            self.memory_stats.record("decoded", len(img_bytes))
 
             try:
-                nparr = np.frombuffer(img_bytes, np.uint8)
-                image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                image, scale = self.decode_frame(img_bytes, imgsz)
+            except ValueError:
+                raise
             except Exception as cv_error:
                 print(f"Error en cv2.imdecode: {str(cv_error)}")
                 raise ValueError(f"Imagen corrupta: {str(cv_error)}")
@@ -229,16 +578,70 @@ class PPEDetectorService:
             if image is None:
                 raise ValueError("No se pudo decodificar la imagen - formato no soportado")
             
-            print(f"Imagen recibida: {image.shape} (height, width, channels)")
-            
-            return self.detect(image, confidence)
+            # Los bytes comprimidos no se retienen durante la inferencia
+            del img_bytes
+            print(f"Imagen recibida: {image.shape} (height, width, channels), escala {scale:.2f}")
+            return DecodedFrame(image, scale, (time.time() - decode_start) * 1000)
         
         except ValueError:
             raise
         except Exception as e:
-            print(f"Error inesperado en detect_from_base64: {type(e).__name__}: {str(e)}")
+            print(f"Error inesperado en prepare_frame: {type(e).__name__}: {str(e)}")
             raise ValueError(f"Error procesando imagen: {str(e)}")
     
+    def release_frame(self, frame: DecodedFrame):
+        """Devuelve al pool el buffer del frame cuando ya no se usa"""
+        self.frame_pool.release(frame.image)
+        frame.image = None
+    
+    def detect_from_base64(
+        self,
+        base64_image: str,
+        confidence: float = 0.5,
+        profile: Optional[str] = None,
+        person_hint: Optional[bool] = None,
+        imgsz: Optional[int] = None
+    ) -> DetectionResponse:
+        """Decodificación y detección en un solo paso (sin pipeline por etapas)"""
+        frame = self.prepare_frame(base64_image, imgsz)
+        try:
+            result = self.detect(frame.image, confidence, profile, frame.scale, person_hint, imgsz)
+        finally:
+            self.release_frame(frame)
+        if result.stage_timings is not None:
+            result.stage_timings["decode_ms"] = frame.decode_ms
+        return result
+    
+    def warmup(self, sizes: List[List[int]], runs: int = 1) -> float:
+        """
+        Inferencias sobre frames sintéticos [ancho, alto] para inicializar
+        grafo y asignadores antes de recibir tráfico. Devuelve el tiempo en ms.
+        """
+        start_time = time.time()
+        for width, height in sizes:
+            frame = np.full((height, width, 3), 114, dtype=np.uint8)
+            for _ in range(max(1, runs)):
+                if self.person_detector_loaded and self.person_detector is not None:
+                    self.person_detector(frame, verbose=False)
+                if self.model is not None:
+                    self.model(frame, verbose=False)
+        elapsed = (time.time() - start_time) * 1000
+        print(f"Warm-up del modelo {self.model_version}: {elapsed:.0f}ms")
+        return elapsed
+    
+    def get_class_names(self) -> Dict[int, str]:
+        """Tabla id → nombre de clase del modelo EPP"""
+        return dict(self.model.names) if self.model else {}
+    
+    def get_input_size(self, default: int = 640) -> int:
+        """Tamaño de entrada (imgsz) con el que se entrenó el modelo"""
+        if self.model is None:
+            return default
+        imgsz = getattr(self.model, "overrides", {}).get("imgsz") or default
+        if isinstance(imgsz, (list, tuple)):
+            imgsz = max(imgsz)
+        return int(imgsz)
+    
     def is_ready(self) -> bool:
         return self.model_loaded and self.model is not None
     
@@ -249,8 +652,14 @@ class PPEDetectorService:
         return {
             "loaded": True,
                 "type": "local_yolo",
+                "model_version": self.model_version,
                 "model_path": self.model_path or "yolov8n.pt (preentrenado)",
                 "classes": list(self.model.names.values()) if self.model else [],
                 "ppe_classes": list(self.ppe_classes.keys()),
-                "person_detection_enabled": self.person_detector_loaded
+                "profiles": self.profiles,
+                "default_profile": self.default_profile,
+                "input_size": self.get_input_size(),
+                "person_detection_enabled": self.person_detector_loaded,
+                "tiling_enabled": self.tiling_enabled,
+                "frame_downscale": self.frame_downscale
             }
@@ -0,0 +1,323 @@
+"""
+Inferencia en un proceso aparte, accesible por Unix socket.
+
+Con `inference_mode="remote"` la API corre en varios workers de uvicorn que
+solo terminan HTTP/WebSocket, y un servidor de inferencia local (ver
+`inference_server.py`) mantiene el modelo. Así la capacidad de I/O escala
+con los núcleos sin duplicar el modelo en memoria.
+
+Protocolo: cada mensaje es un JSON precedido por su longitud (4 bytes big
+endian). Cada hilo del cliente usa su propia conexión bloqueante con una
+petición en vuelo, así el scheduler y el executor existentes no cambian.
+
+El servidor también coordina a los workers: límite global de conexiones
+WebSocket y métricas agregadas.
+"""
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from app.models.ppe_models import DetectionResponse
+from app.services.response_codec import dumps_json
+
+
+_HEADER = struct.Struct(">I")
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+def encode_message(payload: Dict) -> bytes:
+    body = dumps_json(payload).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+def decode_body(body: bytes) -> Dict:
+    return json.loads(body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = bytearray()
+    while len(chunks) < size:
+        chunk = sock.recv(size - len(chunks))
+        if not chunk:
+            raise ConnectionError("Servidor de inferencia cerró la conexión")
+        chunks += chunk
+    return bytes(chunks)
+
+
+async def read_message(reader) -> Optional[Dict]:
+    """Lee un mensaje de un asyncio.StreamReader (None al cerrar el cliente)"""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except Exception:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_MESSAGE_BYTES:
+        raise ValueError(f"Mensaje demasiado grande: {size} bytes")
+    return decode_body(await reader.readexactly(size))
+
+
+class ClusterState:
+    """
+    Estado compartido de los workers front-end, guardado en el servidor de
+    inferencia. Cada worker reporta sus métricas periódicamente; su conteo
+    de conexiones se corrige con cada reporte y los workers que dejan de
+    reportar (caídos o reiniciados) se olvidan tras `stale_after` segundos,
+    junto con los streams que producían.
+    """
+
+    def __init__(self, max_connections: int, stale_after: float = 15.0):
+        self.max_connections = max_connections
+        self.stale_after = stale_after
+        self.active: Dict[str, int] = {}
+        self.reports: Dict[str, Dict] = {}
+        self.last_seen: Dict[str, float] = {}
+        # Productor de cada stream con nombre: (worker, conexión)
+        self.streams: Dict[str, Tuple[str, str]] = {}
+        self.rejected = 0
+
+    def _expire(self):
+        limit = time.time() - self.stale_after
+        for worker in [worker for worker, seen in self.last_seen.items() if seen < limit]:
+            self.active.pop(worker, None)
+            self.reports.pop(worker, None)
+            self.last_seen.pop(worker, None)
+        if self.streams:
+            self.streams = {
+                stream_id: producer for stream_id, producer in self.streams.items()
+                if producer[0] in self.last_seen
+            }
+
+    def _touch(self, worker: str):
+        self.last_seen[worker] = time.time()
+
+    @property
+    def total_active(self) -> int:
+        return sum(self.active.values())
+
+    def acquire(self, worker: str) -> bool:
+        self._expire()
+        self._touch(worker)
+        if self.total_active >= self.max_connections:
+            self.rejected += 1
+            return False
+        self.active[worker] = self.active.get(worker, 0) + 1
+        return True
+
+    def release(self, worker: str):
+        self._touch(worker)
+        self.active[worker] = max(0, self.active.get(worker, 0) - 1)
+
+    def claim_stream(self, worker: str, stream_id: str, owner: str) -> bool:
+        """Un productor por stream en todo el cluster"""
+        self._expire()
+        self._touch(worker)
+        return self.streams.setdefault(stream_id, (worker, owner)) == (worker, owner)
+
+    def release_stream(self, worker: str, stream_id: str, owner: str):
+        self._touch(worker)
+        if self.streams.get(stream_id) == (worker, owner):
+            del self.streams[stream_id]
+
+    def report(self, worker: str, metrics: Dict):
+        self._touch(worker)
+        self.reports[worker] = metrics
+        self.active[worker] = int(metrics.get("active", self.active.get(worker, 0)))
+
+    def get_metrics(self) -> Dict:
+        self._expire()
+        totals: Dict[str, int] = {}
+        for metrics in self.reports.values():
+            for key, value in metrics.items():
+                if isinstance(value, (int, float)):
+                    totals[key] = totals.get(key, 0) + value
+        return {
+            "workers": len(self.last_seen),
+            "active_connections": self.total_active,
+            "max_connections": self.max_connections,
+            "rejected_by_cluster": self.rejected,
+            "streams": len(self.streams),
+            "totals": totals,
+            "per_worker": self.reports,
+        }
+
+
+class RemoteDetectorService:
+    """
+    Cliente del servidor de inferencia con la misma interfaz que usa el
+    controlador de `PPEDetectorService`.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.worker_id = f"pid-{os.getpid()}"
+        self._local = threading.local()
+        self.info: Dict = {}
+
+    # --- transporte -------------------------------------------------------
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is not None and select.select([sock], [], [], 0)[0]:
+            # Sin petición en vuelo no llegan datos: legible = el servidor la cerró
+            self._drop_connection()
+            sock = None
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def call(self, op: str, timeout: Optional[float] = None, **payload) -> Dict:
+        """
+        Una petición/respuesta. Solo se reintenta (una vez, con conexión
+        nueva) si falla la conexión o el envío, antes de que el servidor
+        reciba la petición. Un error o timeout al leer la respuesta no se
+        reintenta: la operación pudo ejecutarse (detect, acquire).
+        """
+        message = encode_message({"op": op, **payload})
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                sock.settimeout(timeout or self.timeout)
+                sock.sendall(message)
+                break
+            except OSError:
+                self._drop_connection()
+                if attempt:
+                    raise ConnectionError(f"Servidor de inferencia no disponible: {self.socket_path}")
+
+        try:
+            (size,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+            response = decode_body(_recv_exact(sock, size))
+        except (OSError, ConnectionError) as e:
+            # La respuesta tardía desfasaría el socket: se descarta la conexión
+            self._drop_connection()
+            raise ConnectionError(f"Sin respuesta del servidor de inferencia ({op}): {e}")
+
+        if not response.get("ok"):
+            error = response.get("error", "Error en el servidor de inferencia")
+            if response.get("kind") == "value":
+                raise ValueError(error)
+            raise RuntimeError(error)
+        return response
+
+    def wait_until_ready(self, timeout: float = 300.0, interval: float = 0.5):
+        """Espera a que el servidor termine de cargar el modelo"""
+        deadline = time.time() + timeout
+        while True:
+            try:
+                self.refresh_info()
+                if self.is_ready():
+                    return
+            except (ConnectionError, RuntimeError):
+                pass
+            if time.time() >= deadline:
+                raise TimeoutError(f"El servidor de inferencia no estuvo listo en {timeout:.0f}s")
+            time.sleep(interval)
+
+    # --- interfaz del detector ---------------------------------------------
+
+    def refresh_info(self) -> Dict:
+        self.info = self.call("info")["info"]
+        return self.info
+
+    @property
+    def model_version(self) -> Optional[str]:
+        return self.info.get("model_version")
+
+    def is_ready(self) -> bool:
+        return bool(self.info.get("ready"))
+
+    def get_model_info(self) -> Dict:
+        return {**self.info.get("model_info", {}), "remote": self.socket_path}
+
+    def get_class_names(self) -> Dict[int, str]:
+        return {int(class_id): name for class_id, name in self.info.get("class_names", {}).items()}
+
+    def get_input_size(self, default: int = 640) -> int:
+        return int(self.info.get("input_size") or default)
+
+    def resolve_profile(self, profile: Optional[str]) -> str:
+        if not profile:
+            return self.info.get("default_profile")
+        if profile not in self.info.get("profile_masks", {}):
+            raise ValueError(f"Perfil de EPP desconocido: '{profile}'")
+        return profile
+
+    def get_profile_mask(self, profile: Optional[str]) -> int:
+        return self.info["profile_masks"][self.resolve_profile(profile)]
+
+    def detect_from_base64(
+        self,
+        base64_image: str,
+        confidence: float = 0.5,
+        profile: Optional[str] = None,
+        person_hint: Optional[bool] = None,
+        imgsz: Optional[int] = None
+    ) -> DetectionResponse:
+        response = self.call(
+            "detect",
+            image=base64_image,
+            confidence=confidence,
+            profile=profile,
+            person_hint=person_hint,
+            imgsz=imgsz,
+        )
+        result = DetectionResponse.model_validate(response["result"])
+        # Otro worker pudo recargar el modelo: se actualiza la tabla local
+        if result.model_version and result.model_version != self.model_version:
+            self.refresh_info()
+        return result
+
+    def get_memory_metrics(self) -> Dict:
+        """Memoria por etapa y RSS del servidor de inferencia"""
+        return self.call("memory")["memory"]
+
+    def warmup(self, sizes, runs: int = 1) -> float:
+        """El warm-up lo hace el servidor al cargar o recargar el modelo"""
+        return float(self.info.get("warmup_ms") or 0.0)
+
+    def reload(self, model_path: str, version: Optional[str] = None) -> Dict:
+        # Cargar y calentar un modelo puede tardar más que una inferencia
+        self.info = self.call("reload", timeout=600.0, model_path=model_path, version=version)["info"]
+        return self.info
+
+    # --- coordinación de workers ---------------------------------------------
+
+    def acquire_connection(self) -> bool:
+        return bool(self.call("acquire", worker=self.worker_id)["granted"])
+
+    def release_connection(self):
+        self.call("release", worker=self.worker_id)
+
+    def claim_stream(self, stream_id: str, owner: str) -> bool:
+        return bool(self.call("claim_stream", worker=self.worker_id, stream=stream_id, owner=owner)["granted"])
+
+    def release_stream(self, stream_id: str, owner: str):
+        self.call("release_stream", worker=self.worker_id, stream=stream_id, owner=owner)
+
+    def report_metrics(self, metrics: Dict):
+        self.call("report", worker=self.worker_id, metrics=metrics)
+
+    def cluster_metrics(self) -> Dict:
+        return self.call("metrics")["metrics"]
@@ -0,0 +1,143 @@
+"""
+Codificación de respuestas de detección para WebSocket.
+
+Modos:
+- "full": el `DetectionResponse` completo serializado con pydantic-core.
+- "compact": JSON corto con ids de clase enteros (tabla enviada una vez al
+  conectar), `ppe_status` como bitmask y bboxes cuantizadas a píxeles.
+- "msgpack": mismo contenido que "compact" pero en MessagePack binario.
+
+En los modos compactos, `delta=True` envía solo los campos que cambiaron
+respecto al frame anterior de la misma conexión.
+"""
+import json
+from typing import Dict, List, Optional, Union
+
+from app.models.ppe_models import PPEType, PPEStatus, DetectionResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+
+RESPONSE_FORMATS = ("full", "compact", "msgpack")
+PPE_ITEMS: List[str] = [ppe_type.value for ppe_type in PPEType]
+
+# Campos que siempre viajan en un frame delta
+_DELTA_ALWAYS = ("t", "n", "ms")
+
+
+def dumps_json(payload: Dict) -> str:
+    """JSON rápido con orjson si está instalado, si no stdlib"""
+    if orjson is not None:
+        return orjson.dumps(payload).decode("utf-8")
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+def ppe_status_to_bits(status: PPEStatus) -> int:
+    bits = 0
+    for index, item in enumerate(PPE_ITEMS):
+        if getattr(status, item):
+            bits |= 1 << index
+    return bits
+
+
+def bits_to_ppe_status(bits: int) -> PPEStatus:
+    return PPEStatus(**{item: bool(bits >> index & 1) for index, item in enumerate(PPE_ITEMS)})
+
+
+class ResponseEncoder:
+    """Codificador por conexión (guarda el último frame para los deltas)"""
+
+    def __init__(self, mode: str, class_names: Dict[int, str], delta: bool = False, model_version: Optional[str] = None):
+        if mode not in RESPONSE_FORMATS:
+            mode = "full"
+        if mode == "msgpack" and msgpack is None:
+            print("msgpack no instalado - usando formato compact")
+            mode = "compact"
+
+        self.mode = mode
+        self.delta = delta and mode != "full"
+        self._seq = 0
+        self.update_model(class_names, model_version)
+
+    def update_model(self, class_names: Dict[int, str], model_version: Optional[str]):
+        """Nueva tabla de clases tras recargar el modelo (reinicia los deltas)"""
+        self.class_names = dict(class_names)
+        self.model_version = model_version
+        self._class_ids = {name: class_id for class_id, name in self.class_names.items()}
+        self._last: Optional[Dict] = None
+
+    @property
+    def is_compact(self) -> bool:
+        return self.mode != "full"
+
+    def class_table(self) -> Dict:
+        """Mensaje único con la tabla de clases, enviado al conectar"""
+        return {
+            "type": "classes",
+            "format": self.mode,
+            "delta": self.delta,
+            "classes": {str(class_id): name for class_id, name in self.class_names.items()},
+            "ppe_items": PPE_ITEMS,
+            "model_version": self.model_version,
+        }
+
+    def encode(self, result: DetectionResponse) -> Union[str, bytes]:
+        if self.mode == "full":
+            return result.model_dump_json()
+
+        payload = self._compact(result)
+        if self.delta:
+            payload = self._diff(payload)
+
+        if self.mode == "msgpack":
+            return msgpack.packb(payload, use_bin_type=True)
+        return dumps_json(payload)
+
+    def _compact(self, result: DetectionResponse) -> Dict:
+        self._seq += 1
+        detections = []
+        for detection in result.detections:
+            class_id = detection.class_id
+            if class_id is None:
+                class_id = self._class_ids.get(detection.class_name, -1)
+            detections.append([
+                class_id,
+                int(round(detection.confidence * 100)),
+                *(int(round(value)) for value in detection.bbox),
+            ])
+
+        payload = {
+            "t": "r",
+            "n": self._seq,
+            "s": ppe_status_to_bits(result.ppe_status),
+            "ok": int(result.is_compliant),
+            "hp": int(result.has_person),
+            "ms": round(result.processing_time or 0.0, 1),
+            "d": detections,
+        }
+        if result.smoothed_ppe_status is not None:
+            payload["ss"] = ppe_status_to_bits(result.smoothed_ppe_status)
+            payload["sok"] = int(bool(result.smoothed_is_compliant))
+        if result.degradation_level is not None:
+            payload["dl"] = result.degradation_level
+            # Siempre presente con degradación: el delta no informa claves quitadas
+            payload["pi"] = int(bool(result.person_inferred))
+        return payload
+
+    def _diff(self, payload: Dict) -> Dict:
+        last, self._last = self._last, payload
+        if last is None:
+            return {**payload, "k": 1}
+
+        return {
+            key: value for key, value in payload.items()
+            if key in _DELTA_ALWAYS or last.get(key) != value
+        }
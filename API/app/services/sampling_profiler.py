@@ -0,0 +1,136 @@
+"""
+Perfilado bajo demanda del servicio en vivo.
+
+`SamplingProfiler` toma muestras periódicas de las pilas de los hilos de
+interés (el del event loop y los workers `yolo_`) con `sys._current_frames()`
+desde un hilo aparte. No instrumenta llamadas, así que el costo depende solo
+del intervalo de muestreo. El resultado son "pilas colapsadas" (una línea
+`hilo;modulo:funcion;... conteo`), el formato de entrada de flamegraph.pl y
+speedscope.
+
+`SlowFrameRecorder` conserva los N frames más lentos con sus tiempos por
+etapa para investigar picos de latencia sin perfilar todo.
+"""
+import heapq
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class SamplingProfiler:
+
+    def __init__(self, thread_prefixes: Iterable[str] = ("yolo_",), max_depth: int = 64):
+        self.thread_prefixes = tuple(thread_prefixes)
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    @staticmethod
+    def _frame_label(frame) -> str:
+        code = frame.f_code
+        module = frame.f_globals.get("__name__", code.co_filename)
+        return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+    def _collapse(self, frame) -> List[str]:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(self._frame_label(frame))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _target_threads(self, extra_idents: Dict[int, str]) -> Dict[int, str]:
+        targets = dict(extra_idents)
+        for thread in threading.enumerate():
+            if thread.ident is not None and thread.name.startswith(self.thread_prefixes):
+                targets[thread.ident] = thread.name
+        return targets
+
+    def run(self, seconds: float, interval: float = 0.005, extra_threads: Optional[Dict[int, str]] = None) -> Dict:
+        """
+        Muestrea durante `seconds`. `extra_threads` ({ident: nombre}) agrega
+        hilos que no siguen el prefijo, como el del event loop.
+        Bloquea el hilo que llama; un solo perfil a la vez.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Ya hay un perfil en curso")
+        try:
+            own_ident = threading.get_ident()
+            counts: Counter = Counter()
+            samples = 0
+            deadline = time.perf_counter() + seconds
+            targets = self._target_threads(extra_threads or {})
+            next_refresh = time.perf_counter() + 1.0
+
+            while time.perf_counter() < deadline:
+                if time.perf_counter() >= next_refresh:
+                    # Los workers del executor se crean bajo demanda
+                    targets = self._target_threads(extra_threads or {})
+                    next_refresh = time.perf_counter() + 1.0
+
+                frames = sys._current_frames()
+                for ident, name in targets.items():
+                    frame = frames.get(ident)
+                    if frame is None or ident == own_ident:
+                        continue
+                    counts[";".join([name] + self._collapse(frame))] += 1
+                samples += 1
+                del frames
+                time.sleep(interval)
+
+            return {
+                "samples": samples,
+                "interval_ms": interval * 1000,
+                "threads": sorted(set(targets.values())),
+                "stacks": counts,
+            }
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def to_collapsed(stacks: Counter) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+class SlowFrameRecorder:
+    """Los `capacity` frames más lentos (min-heap por tiempo total)"""
+
+    def __init__(self, capacity: int = 20):
+        self.capacity = capacity
+        self._heap: List[Tuple[float, int, Dict]] = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def record(self, total_ms: float, connection: str, stages: Dict[str, float], **details):
+        if self.capacity <= 0:
+            # Registro deshabilitado (SLOW_FRAMES_CAPACITY=0)
+            return
+        with self._lock:
+            if len(self._heap) >= self.capacity and total_ms <= self._heap[0][0]:
+                return
+            self._seq += 1
+            entry = {
+                "timestamp": time.time(),
+                "connection": connection,
+                "total_ms": round(total_ms, 2),
+                "stages": {stage: round(ms, 2) for stage, ms in stages.items()},
+                **details,
+            }
+            if len(self._heap) >= self.capacity:
+                heapq.heapreplace(self._heap, (total_ms, self._seq, entry))
+            else:
+                heapq.heappush(self._heap, (total_ms, self._seq, entry))
+
+    def slowest(self, limit: Optional[int] = None) -> List[Dict]:
+        with self._lock:
+            entries = sorted(self._heap, reverse=True)
+        return [entry for _, _, entry in entries[:limit]]
+
+    def reset(self):
+        with self._lock:
+            self._heap.clear()
@@ -0,0 +1,367 @@
+"""
+Evidencias de incumplimiento: JPEG del frame con sus detecciones.
+
+`record` solo decide y encola (deduplicación por stream y ventana de tiempo)
+y nunca bloquea: si la cola está llena el frame se descarta. Se encola el
+base64 original, que es inmutable, así el camino en vivo no copia píxeles ni
+depende de los buffers del pool de decodificación.
+
+Un hilo escritor decodifica, dibuja las cajas, recodifica a JPEG, escribe
+en disco y registra la evidencia en un índice SQLite por cámara y tiempo.
+El mismo hilo aplica la retención por tamaño total y por antigüedad.
+
+Con varios workers front-end (modo remote) todos comparten el directorio y
+el índice: el tamaño total y la deduplicación se leen del índice, así la
+cuota no se multiplica por el número de workers.
+"""
+import base64
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.models.ppe_models import DetectionResponse
+from app.services.response_codec import PPE_ITEMS, ppe_status_to_bits
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    -- AUTOINCREMENT: los ids borrados por retención no se reutilizan
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    profile TEXT,
+    ppe_bits INTEGER NOT NULL,
+    missing_bits INTEGER NOT NULL,
+    detections TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_ts ON snapshots (ts);
+CREATE INDEX IF NOT EXISTS idx_snapshots_camera_ts ON snapshots (camera, ts);
+"""
+
+_INSERT = """
+INSERT INTO snapshots (ts, camera, path, bytes, profile, ppe_bits, missing_bits, detections)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_STOP = object()
+
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+SnapshotJob = Tuple[float, str, str, DetectionResponse, int]
+
+
+def camera_folder(camera: str) -> str:
+    """Carpeta de la cámara: un solo componente de ruta, sin `.` ni `..`"""
+    name = _UNSAFE_NAME.sub("_", camera).lstrip(".")
+    return name or "camera"
+
+
+def missing_items(missing_bits: int) -> List[str]:
+    return [item for index, item in enumerate(PPE_ITEMS) if missing_bits >> index & 1]
+
+
+class ViolationSnapshotStore:
+    """Evidencias en disco con escritor en segundo plano y retención"""
+
+    def __init__(
+        self,
+        directory: str,
+        queue_size: int = 32,
+        jpeg_quality: int = 80,
+        max_side: int = 1280,
+        draw_boxes: bool = True,
+        dedup_seconds: float = 30.0,
+        max_bytes: int = 0,
+        max_age_hours: float = 0.0,
+        retention_interval: float = 60.0,
+    ):
+        self.directory = directory
+        self._root = os.path.realpath(directory)
+        self.db_path = os.path.join(directory, "snapshots.db")
+        self.jpeg_quality = jpeg_quality
+        self.max_side = max_side
+        self.draw_boxes = draw_boxes
+        self.dedup_seconds = dedup_seconds
+        self.max_bytes = max_bytes
+        self.max_age_hours = max_age_hours
+        self.retention_interval = retention_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._writer: Optional[threading.Thread] = None
+        # Última evidencia aceptada por stream: (timestamp, EPP faltante)
+        self._last: Dict[str, Tuple[float, int]] = {}
+        self._total_bytes = 0
+        self.metrics: Dict[str, int] = {
+            "queued": 0, "written": 0, "dropped": 0, "deduplicated": 0, "errors": 0, "deleted": 0,
+        }
+
+    def start(self):
+        if self._writer and self._writer.is_alive():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+
+        connection = self._connect()
+        try:
+            connection.executescript(_SCHEMA)
+            self._total_bytes = self._stored_bytes(connection)
+        finally:
+            connection.close()
+
+        self._writer = threading.Thread(target=self._writer_loop, name="snapshot_writer", daemon=True)
+        self._writer.start()
+        print(f"Evidencias de incumplimiento: {self.directory}")
+
+    def stop(self, timeout: float = 5.0):
+        """Escribe las evidencias pendientes y detiene el escritor"""
+        if not self._writer:
+            return
+        self._queue.put(_STOP)
+        self._writer.join(timeout=timeout)
+        self._writer = None
+
+    def record(
+        self,
+        camera: str,
+        base64_image: str,
+        result: DetectionResponse,
+        missing_bits: int,
+        timestamp: Optional[float] = None,
+    ) -> bool:
+        """
+        Encola la evidencia de un frame sin cumplimiento. Dentro de la ventana
+        de deduplicación solo se guarda otro frame del stream si falta un
+        conjunto distinto de EPP. Nunca bloquea; True si se encoló.
+        """
+        if result.is_compliant or not result.has_person or result.profile is None:
+            return False
+
+        timestamp = timestamp or time.time()
+        last = self._last.get(camera)
+        if last and timestamp - last[0] < self.dedup_seconds and last[1] == missing_bits:
+            self.metrics["deduplicated"] += 1
+            return False
+
+        try:
+            self._queue.put_nowait((timestamp, camera, base64_image, result, missing_bits))
+        except queue.Full:
+            self.metrics["dropped"] += 1
+            return False
+
+        self.metrics["queued"] += 1
+        self._last[camera] = (timestamp, missing_bits)
+        if len(self._last) > 1024:
+            # Streams que ya no envían frames
+            limit = timestamp - self.dedup_seconds
+            self._last = {cam: entry for cam, entry in self._last.items() if entry[0] >= limit}
+        return True
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.db_path, timeout=10.0, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _writer_loop(self):
+        connection = self._connect()
+        next_retention = 0.0
+        try:
+            while True:
+                if time.monotonic() >= next_retention:
+                    self._enforce_retention(connection)
+                    next_retention = time.monotonic() + self.retention_interval
+                try:
+                    item = self._queue.get(timeout=self.retention_interval)
+                except queue.Empty:
+                    continue
+                if item is _STOP:
+                    break
+
+                try:
+                    self._write(connection, item)
+                except Exception as e:
+                    print(f"Error guardando evidencia: {type(e).__name__}: {e}")
+                    self.metrics["errors"] += 1
+                    continue
+                if self.max_bytes and self._total_bytes > self.max_bytes:
+                    self._enforce_retention(connection)
+        finally:
+            connection.close()
+
+    def _encode(self, base64_image: str, result: DetectionResponse) -> bytes:
+        prefix_end = base64_image.find(',', 0, 100)
+        if prefix_end >= 0:
+            base64_image = base64_image[prefix_end + 1:]
+        image = cv2.imdecode(np.frombuffer(base64.b64decode(base64_image), np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("No se pudo decodificar el frame")
+
+        # Las cajas vienen en coordenadas del frame original
+        scale = 1.0
+        height, width = image.shape[:2]
+        if self.max_side and max(height, width) > self.max_side:
+            scale = self.max_side / max(height, width)
+            image = cv2.resize(
+                image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                interpolation=cv2.INTER_AREA
+            )
+
+        if self.draw_boxes:
+            for detection in result.detections:
+                x1, y1, x2, y2 = (int(value * scale) for value in detection.bbox[:4])
+                cv2.rectangle(image, (x1, y1), (x2, y2), (0, 0, 255), 2)
+                cv2.putText(
+                    image, f"{detection.class_name} {detection.confidence:.2f}", (x1, max(12, y1 - 4)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 255), 1, cv2.LINE_AA
+                )
+
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("No se pudo codificar el JPEG")
+        return encoded.tobytes()
+
+    @staticmethod
+    def _stored_bytes(connection: sqlite3.Connection) -> int:
+        """Total en disco según el índice, incluidas las evidencias de otros workers"""
+        return connection.execute("SELECT COALESCE(SUM(bytes), 0) FROM snapshots").fetchone()[0]
+
+    def _write(self, connection: sqlite3.Connection, item: SnapshotJob):
+        timestamp, camera, base64_image, result, missing_bits = item
+        # Deduplicación entre workers: otro proceso pudo guardar la misma evidencia
+        duplicate = connection.execute(
+            "SELECT 1 FROM snapshots WHERE camera = ? AND missing_bits = ? AND ts > ? AND ts <= ? LIMIT 1",
+            (camera, missing_bits, timestamp - self.dedup_seconds, timestamp),
+        ).fetchone()
+        if duplicate:
+            self.metrics["deduplicated"] += 1
+            return
+        data = self._encode(base64_image, result)
+
+        folder = os.path.join(camera_folder(camera), time.strftime("%Y%m%d", time.localtime(timestamp)))
+        # El pid evita colisiones de nombre entre workers (cámara "http")
+        path = os.path.join(folder, f"{int(timestamp * 1000)}_{missing_bits:x}_{os.getpid()}.jpg")
+        target = self._resolve(path)
+        if target is None:
+            raise ValueError(f"Ruta de evidencia fuera del directorio: {path}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as output:
+            output.write(data)
+
+        detections = [
+            {"class": d.class_name, "confidence": round(d.confidence, 4), "bbox": [round(v, 1) for v in d.bbox]}
+            for d in result.detections
+        ]
+        with connection:
+            connection.execute(_INSERT, (
+                timestamp, camera, path, len(data), result.profile,
+                ppe_status_to_bits(result.ppe_status), missing_bits, json.dumps(detections),
+            ))
+        self._total_bytes = self._stored_bytes(connection)
+        self.metrics["written"] += 1
+
+    def _resolve(self, path: str) -> Optional[str]:
+        """Ruta absoluta de una evidencia, o None si sale del directorio"""
+        target = os.path.realpath(os.path.join(self._root, path))
+        if os.path.commonpath([self._root, target]) != self._root:
+            return None
+        return target
+
+    def _delete(self, connection: sqlite3.Connection, rows: List[Tuple[int, str, int]]):
+        for _, path, _ in rows:
+            target = self._resolve(path)
+            if target is None:
+                continue
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                pass
+        with connection:
+            connection.executemany("DELETE FROM snapshots WHERE id = ?", [(row[0],) for row in rows])
+        self._total_bytes = self._stored_bytes(connection)
+        self.metrics["deleted"] += len(rows)
+
+    def _enforce_retention(self, connection: sqlite3.Connection):
+        """Borra lo más antiguo que exceda la antigüedad o el tamaño total"""
+        try:
+            self._total_bytes = self._stored_bytes(connection)
+            if self.max_age_hours > 0:
+                limit = time.time() - self.max_age_hours * 3600
+                rows = connection.execute(
+                    "SELECT id, path, bytes FROM snapshots WHERE ts < ?", (limit,)
+                ).fetchall()
+                if rows:
+                    self._delete(connection, rows)
+
+            while self.max_bytes and self._total_bytes > self.max_bytes:
+                rows = connection.execute(
+                    "SELECT id, path, bytes FROM snapshots ORDER BY ts LIMIT 100"
+                ).fetchall()
+                if not rows:
+                    break
+                excess = self._total_bytes - self.max_bytes
+                selected, freed = [], 0
+                for row in rows:
+                    if freed >= excess:
+                        break
+                    selected.append(row)
+                    freed += row[2]
+                self._delete(connection, selected)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error aplicando retención de evidencias: {e}")
+            self.metrics["errors"] += 1
+
+    def _query(self, sql: str, params: tuple) -> List[sqlite3.Row]:
+        connection = sqlite3.connect(self.db_path, timeout=10.0)
+        connection.row_factory = sqlite3.Row
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    def list_snapshots(self, since: float, until: float, camera: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Evidencias en la ventana de tiempo, de la más reciente a la más antigua"""
+        where = "ts >= ? AND ts < ?"
+        params: tuple = (since, until)
+        if camera:
+            where += " AND camera = ?"
+            params += (camera,)
+        rows = self._query(
+            f"SELECT * FROM snapshots WHERE {where} ORDER BY ts DESC LIMIT ?",
+            params + (limit,),
+        )
+        return [
+            {
+                "id": row["id"],
+                "timestamp": row["ts"],
+                "camera": row["camera"],
+                "profile": row["profile"],
+                "missing": missing_items(row["missing_bits"]),
+                "detections": json.loads(row["detections"]),
+                "bytes": row["bytes"],
+            }
+            for row in rows
+        ]
+
+    def snapshot_path(self, snapshot_id: int) -> Optional[str]:
+        rows = self._query("SELECT path FROM snapshots WHERE id = ?", (snapshot_id,))
+        if not rows:
+            return None
+        return self._resolve(rows[0]["path"])
+
+    def get_metrics(self) -> Dict:
+        return {
+            **self.metrics,
+            "pending": self._queue.qsize(),
+            "total_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "max_age_hours": self.max_age_hours,
+            "directory": self.directory,
+        }
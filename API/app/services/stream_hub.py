@@ -0,0 +1,99 @@
+"""
+Hub de difusión en proceso para streams de detección con nombre.
+
+Una conexión productora publica el resultado de cada frame una sola vez y
+cualquier número de suscriptores lo recibe. Cada suscriptor tiene su propio
+buffer acotado: si se llena se descarta el resultado más antiguo, así un
+visor lento nunca frena al productor ni a los demás visores.
+
+Cada stream tiene un único productor: otra conexión no puede publicar en un
+stream que ya tiene dueño. El hub vive en el proceso: con varios workers
+front-end la reserva del productor se hace además en el servidor de
+inferencia (`ClusterState`) y las suscripciones no están disponibles.
+"""
+import asyncio
+from typing import Dict, Set
+
+from app.models.ppe_models import DetectionResponse
+
+
+class StreamSubscription:
+    """Buffer acotado de un suscriptor"""
+
+    def __init__(self, stream_id: str, buffer_size: int):
+        self.stream_id = stream_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, buffer_size))
+        self.delivered = 0
+        self.dropped = 0
+
+    def offer(self, result: DetectionResponse):
+        if self.queue.full():
+            # Consumidor lento: se pierde el frame más viejo, no el nuevo
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(result)
+
+    async def next(self) -> DetectionResponse:
+        result = await self.queue.get()
+        self.delivered += 1
+        return result
+
+
+class StreamHub:
+
+    def __init__(self, buffer_size: int = 4):
+        self.buffer_size = buffer_size
+        self._subscribers: Dict[str, Set[StreamSubscription]] = {}
+        self._published: Dict[str, int] = {}
+        self._producers: Dict[str, str] = {}
+
+    def claim(self, stream_id: str, owner: str) -> bool:
+        """Reserva el stream para la conexión `owner`; False si ya tiene otro productor"""
+        current = self._producers.setdefault(stream_id, owner)
+        return current == owner
+
+    def release(self, stream_id: str, owner: str):
+        if self._producers.get(stream_id) == owner:
+            del self._producers[stream_id]
+
+    def subscribe(self, stream_id: str) -> StreamSubscription:
+        subscription = StreamSubscription(stream_id, self.buffer_size)
+        self._subscribers.setdefault(stream_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: StreamSubscription):
+        subscribers = self._subscribers.get(subscription.stream_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.stream_id]
+            self.forget(subscription.stream_id)
+
+    def publish(self, stream_id: str, result: DetectionResponse) -> int:
+        """Entrega el resultado a todos los suscriptores sin bloquear"""
+        self._published[stream_id] = self._published.get(stream_id, 0) + 1
+        subscribers = self._subscribers.get(stream_id)
+        if not subscribers:
+            return 0
+        for subscription in subscribers:
+            subscription.offer(result)
+        return len(subscribers)
+
+    def forget(self, stream_id: str):
+        """Olvida los contadores de un stream sin productor ni suscriptores"""
+        if stream_id not in self._subscribers and stream_id not in self._producers:
+            self._published.pop(stream_id, None)
+
+    def get_metrics(self) -> Dict:
+        streams = {}
+        for stream_id in set(self._published) | set(self._subscribers):
+            subscribers = self._subscribers.get(stream_id, set())
+            streams[stream_id] = {
+                "producer": self._producers.get(stream_id),
+                "published": self._published.get(stream_id, 0),
+                "subscribers": len(subscribers),
+                "delivered": sum(s.delivered for s in subscribers),
+                "dropped": sum(s.dropped for s in subscribers),
+            }
+        return {"buffer_size": self.buffer_size, "streams": streams}
@@ -0,0 +1,127 @@
+"""
+Agregación temporal del cumplimiento por stream.
+
+Cada stream guarda una ventana deslizante (ring buffer) con los bits de
+`PPEStatus` de los últimos frames. Los conteos por elemento se actualizan
+en O(1) al entrar y salir cada frame, y el estado suavizado usa histéresis:
+un elemento pasa a detectado cuando aparece en al menos `on_ratio` de los
+frames con persona y vuelve a faltante solo por debajo de `off_ratio`.
+Así una detección de guantes perdida no cambia el estado ni dispara alertas.
+"""
+from typing import Dict, List, Tuple
+
+from app.models.ppe_models import DetectionResponse
+from app.services.response_codec import PPE_ITEMS, bits_to_ppe_status, ppe_status_to_bits
+
+
+ALL_ITEMS_MASK = (1 << len(PPE_ITEMS)) - 1
+
+
+class ComplianceAggregator:
+
+    def __init__(
+        self,
+        window: int = 5,
+        on_ratio: float = 0.6,
+        off_ratio: float = 0.3,
+        required_mask: int = ALL_ITEMS_MASK,
+    ):
+        self.window = max(1, window)
+        self.on_ratio = on_ratio
+        self.off_ratio = off_ratio
+        self.required_mask = required_mask
+
+        self._bits: List[int] = [0] * self.window
+        self._person: List[int] = [0] * self.window
+        self._index = 0
+        self._filled = 0
+        self._counts: List[int] = [0] * len(PPE_ITEMS)
+        self._person_count = 0
+
+        self.state_bits = 0
+        self.has_person = False
+
+    def update(self, bits: int, has_person: bool) -> Tuple[int, bool]:
+        """Añade un frame a la ventana y devuelve (bits suavizados, persona)"""
+        slot = self._index
+        if self._filled == self.window:
+            old_bits = self._bits[slot]
+            for item in range(len(PPE_ITEMS)):
+                if old_bits >> item & 1:
+                    self._counts[item] -= 1
+            self._person_count -= self._person[slot]
+        else:
+            self._filled += 1
+
+        # Los frames sin persona no aportan evidencia sobre el EPP
+        if not has_person:
+            bits = 0
+        self._bits[slot] = bits
+        self._person[slot] = int(has_person)
+        self._person_count += int(has_person)
+        for item in range(len(PPE_ITEMS)):
+            if bits >> item & 1:
+                self._counts[item] += 1
+        self._index = (slot + 1) % self.window
+
+        person_ratio = self._person_count / self._filled
+        if person_ratio >= self.on_ratio:
+            self.has_person = True
+        elif person_ratio <= self.off_ratio:
+            self.has_person = False
+
+        if self._person_count:
+            for item in range(len(PPE_ITEMS)):
+                ratio = self._counts[item] / self._person_count
+                if ratio >= self.on_ratio:
+                    self.state_bits |= 1 << item
+                elif ratio <= self.off_ratio:
+                    self.state_bits &= ~(1 << item)
+
+        return self.state_bits, self.has_person
+
+    @property
+    def is_compliant(self) -> bool:
+        if not self.has_person:
+            return True
+        return self.state_bits & self.required_mask == self.required_mask
+
+    def apply(self, result: DetectionResponse) -> DetectionResponse:
+        """
+        Devuelve el resultado con los campos suavizados del stream. Un frame
+        con persona supuesta (degradación) no entra en la ventana: sin la
+        persona detectada, el EPP faltante no es evidencia.
+        """
+        if not result.person_inferred:
+            self.update(ppe_status_to_bits(result.ppe_status), result.has_person)
+        return result.model_copy(update={
+            "smoothed_ppe_status": bits_to_ppe_status(self.state_bits),
+            "smoothed_is_compliant": self.is_compliant,
+        })
+
+
+class StreamAggregators:
+    """Un agregador por stream, compartido por sus productores"""
+
+    def __init__(self, window: int, on_ratio: float, off_ratio: float):
+        self.window = window
+        self.on_ratio = on_ratio
+        self.off_ratio = off_ratio
+        self._aggregators: Dict[str, ComplianceAggregator] = {}
+        self._producers: Dict[str, int] = {}
+
+    def acquire(self, stream_id: str) -> ComplianceAggregator:
+        aggregator = self._aggregators.get(stream_id)
+        if aggregator is None:
+            aggregator = ComplianceAggregator(self.window, self.on_ratio, self.off_ratio)
+            self._aggregators[stream_id] = aggregator
+        self._producers[stream_id] = self._producers.get(stream_id, 0) + 1
+        return aggregator
+
+    def release(self, stream_id: str):
+        remaining = self._producers.get(stream_id, 0) - 1
+        if remaining > 0:
+            self._producers[stream_id] = remaining
+            return
+        self._producers.pop(stream_id, None)
+        self._aggregators.pop(stream_id, None)
@@ -0,0 +1,106 @@
+"""
+Utilidades para inferencia por mosaicos (tiles) en imágenes de alta resolución.
+
+Guantes, lentes y tapabocas ocupan pocos píxeles en un frame 1080p/4K y se
+pierden al reducir todo el frame a `imgsz`. Aquí se planifican tiles
+solapados (opcionalmente solo alrededor de las personas) y se fusionan las
+cajas de todos los tiles con NMS por clase en NumPy.
+"""
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+Tile = Tuple[int, int, int, int]
+
+
+def _axis_starts(length: int, tile: int, stride: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
+
+
+def grid_tiles(width: int, height: int, tile: int, overlap: float) -> List[Tile]:
+    """Rejilla de tiles cuadrados de lado `tile` con solapamiento fraccional"""
+    stride = max(1, int(tile * (1.0 - overlap)))
+    return [
+        (x, y, min(x + tile, width), min(y + tile, height))
+        for y in _axis_starts(height, tile, stride)
+        for x in _axis_starts(width, tile, stride)
+    ]
+
+
+def _intersects(tile: Tile, regions: np.ndarray) -> bool:
+    x1, y1, x2, y2 = tile
+    return bool(np.any(
+        (regions[:, 0] < x2) & (regions[:, 2] > x1) &
+        (regions[:, 1] < y2) & (regions[:, 3] > y1)
+    ))
+
+
+def plan_tiles(
+    width: int,
+    height: int,
+    tile: int,
+    overlap: float,
+    max_tiles: int,
+    regions: Optional[np.ndarray] = None,
+    region_padding: float = 0.1,
+) -> List[Tile]:
+    """
+    Elige los tiles para un frame. Si hay más tiles que `max_tiles`, agranda
+    el tile hasta que entren (menos detalle pero dentro del presupuesto).
+    Con `regions` (cajas de personas) solo se conservan los tiles que las tocan.
+    """
+    if regions is not None and len(regions):
+        pad_x = (regions[:, 2] - regions[:, 0]) * region_padding
+        pad_y = (regions[:, 3] - regions[:, 1]) * region_padding
+        regions = np.stack([
+            regions[:, 0] - pad_x, regions[:, 1] - pad_y,
+            regions[:, 2] + pad_x, regions[:, 3] + pad_y,
+        ], axis=1)
+    else:
+        regions = None
+
+    longest = max(width, height)
+    tile = min(tile, longest)
+    while True:
+        tiles = grid_tiles(width, height, tile, overlap)
+        if regions is not None:
+            tiles = [t for t in tiles if _intersects(t, regions)]
+        if len(tiles) <= max(1, max_tiles) or tile >= longest:
+            return tiles
+        tile = min(longest, int(math.ceil(tile * 1.25)))
+
+
+def nms_numpy(
+    boxes: np.ndarray,
+    scores: np.ndarray,
+    classes: np.ndarray,
+    iou_threshold: float,
+) -> np.ndarray:
+    """NMS greedy por clase. Devuelve los índices conservados"""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    # Desplazar cada clase a su propia región evita comparar clases distintas
+    offsets = classes.astype(np.float32)[:, None] * (float(boxes.max()) + 1.0)
+    shifted = boxes + offsets
+    x1, y1, x2, y2 = shifted[:, 0], shifted[:, 1], shifted[:, 2], shifted[:, 3]
+    areas = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        best = order[0]
+        keep.append(best)
+        rest = order[1:]
+        inter_w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        inter_h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = inter_w * inter_h
+        iou = inter / (areas[best] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
@@ -0,0 +1,207 @@
+"""
+Auto-ajuste de workers × hilos de inferencia por CPU.
+
+Recorre combinaciones de MAX_WORKERS e INTRA_OP_THREADS, mide cada una en un
+proceso nuevo (los hilos de torch solo se fijan una vez por proceso) y
+escribe en .env la de mayor throughput cuyo p95 de latencia no supere el
+objetivo.
+
+Uso:
+    python autotune.py --workers 1,2,4,8 --threads 1,2,4 --target-p95-ms 300
+    python autotune.py --image app/public/epp-2.jpg --frames 120 --dry-run
+"""
+import argparse
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+
+RESULT_PREFIX = "RESULT "
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def load_frame(image_path: Optional[str], width: int = 640, height: int = 480) -> str:
+    """Frame de prueba en base64: la imagen indicada o ruido sintético"""
+    if image_path:
+        image = cv2.imread(image_path)
+        if image is None:
+            raise ValueError(f"No se pudo cargar la imagen: {image_path}")
+    else:
+        rng = np.random.default_rng(0)
+        image = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    _, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+    return base64.b64encode(buffer.tobytes()).decode("ascii")
+
+
+def run_benchmark(frames: int, image_path: Optional[str]) -> Dict:
+    """
+    Mide la configuración del entorno actual con un executor y un detector
+    armados como los de la API (workers saturados, latencia por frame).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.config import settings
+    from app.services import ThreadTopology, load_yolo_class
+    from app.services.detector_factory import create_detector
+
+    thread_topology = ThreadTopology(
+        min(settings.max_workers, (os.cpu_count() or 1) + 1),
+        intra_op_threads=settings.intra_op_threads,
+        inter_op_threads=settings.inter_op_threads,
+        pin_cpus=settings.cpu_affinity,
+    )
+    thread_topology.limit_native_threads()
+    executor = ThreadPoolExecutor(
+        max_workers=thread_topology.workers,
+        thread_name_prefix="yolo_",
+        initializer=thread_topology.initialize_worker
+    )
+
+    load_yolo_class()
+    thread_topology.configure_process()
+    detector = create_detector(settings.model_path)
+    detector.warmup(settings.warmup_sizes, 1)
+
+    frame = load_frame(image_path)
+
+    def timed_detection(_):
+        start = time.perf_counter()
+        detector.detect_from_base64(frame, settings.confidence_threshold)
+        return (time.perf_counter() - start) * 1000
+
+    # Una ronda por worker para que todos pasen por su initializer
+    list(executor.map(timed_detection, range(thread_topology.workers)))
+
+    start_time = time.perf_counter()
+    latencies = sorted(executor.map(timed_detection, range(frames)))
+    elapsed = time.perf_counter() - start_time
+    executor.shutdown(wait=True)
+
+    return {
+        "workers": thread_topology.workers,
+        "threads": thread_topology.intra_op_threads,
+        "frames": frames,
+        "fps": round(frames / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+    }
+
+
+def measure(workers: int, threads: int, args) -> Optional[Dict]:
+    """Ejecuta una combinación en un subproceso con su propio entorno"""
+    env = dict(os.environ)
+    env.update({
+        "MAX_WORKERS": str(workers),
+        "INTRA_OP_THREADS": str(threads),
+        "CPU_AFFINITY": "true" if args.pin else "false",
+        "HISTORY_ENABLED": "false",
+    })
+    command = [sys.executable, os.path.abspath(__file__), "--bench", "--frames", str(args.frames)]
+    if args.image:
+        command += ["--image", args.image]
+
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+
+    print(f"❌ Falló {workers}x{threads}: {completed.stderr.strip()[-500:]}")
+    return None
+
+
+def choose_best(results: List[Dict], target_p95_ms: float) -> Optional[Dict]:
+    """Mayor FPS dentro del objetivo de p95; si ninguna cumple, el menor p95"""
+    if not results:
+        return None
+    within_target = [result for result in results if result["p95_ms"] <= target_p95_ms]
+    if within_target:
+        return max(within_target, key=lambda result: result["fps"])
+    return min(results, key=lambda result: result["p95_ms"])
+
+
+def update_env_file(path: str, values: Dict[str, str]):
+    """Reemplaza o agrega claves en .env conservando el resto del archivo"""
+    lines: List[str] = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as env_file:
+            lines = env_file.read().splitlines()
+
+    pending = dict(values)
+    for index, line in enumerate(lines):
+        key = line.split("=", 1)[0].strip()
+        if key in pending:
+            lines[index] = f"{key}={pending.pop(key)}"
+    lines += [f"{key}={value}" for key, value in pending.items()]
+
+    with open(path, "w", encoding="utf-8") as env_file:
+        env_file.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auto-ajuste de workers e hilos de inferencia")
+    parser.add_argument("--workers", type=_int_list, default=[1, 2, 4, 8], help="Lista de workers a probar")
+    parser.add_argument("--threads", type=_int_list, default=[1, 2, 4], help="Lista de hilos por worker")
+    parser.add_argument("--target-p95-ms", type=float, default=300.0, help="Latencia p95 máxima por frame")
+    parser.add_argument("--frames", type=int, default=60, help="Frames medidos por combinación")
+    parser.add_argument("--image", help="Imagen de prueba (por defecto ruido sintético)")
+    parser.add_argument("--pin", action="store_true", help="Probar con afinidad de CPU por worker")
+    parser.add_argument("--env-file", default=".env", help="Archivo .env a actualizar")
+    parser.add_argument("--allow-oversubscribe", action="store_true", help="Probar workers × hilos > núcleos")
+    parser.add_argument("--dry-run", action="store_true", help="Solo mostrar el resultado")
+    parser.add_argument("--bench", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.bench:
+        print(RESULT_PREFIX + json.dumps(run_benchmark(args.frames, args.image)), flush=True)
+        return
+
+    from app.services.cpu_topology import available_cpus
+    cpu_count = len(available_cpus())
+
+    print("\n" + "=" * 60)
+    print(f"🔧 AUTO-AJUSTE DE INFERENCIA - {cpu_count} núcleos, p95 objetivo {args.target_p95_ms:.0f}ms")
+    print("=" * 60)
+
+    results = []
+    for workers in args.workers:
+        for threads in args.threads:
+            if workers * threads > cpu_count and not args.allow_oversubscribe:
+                print(f"⏭️  {workers}x{threads}: supera los {cpu_count} núcleos, se omite")
+                continue
+            result = measure(workers, threads, args)
+            if result is None:
+                continue
+            results.append(result)
+            print(f"📊 {workers}x{threads}: {result['fps']:.1f} FPS, p50 {result['p50_ms']:.0f}ms, p95 {result['p95_ms']:.0f}ms")
+
+    best = choose_best(results, args.target_p95_ms)
+    if best is None:
+        print("❌ Ninguna combinación se pudo medir")
+        sys.exit(1)
+
+    if best["p95_ms"] > args.target_p95_ms:
+        print(f"⚠️  Ninguna combinación cumple el p95 objetivo; se usa la de menor latencia")
+    print(f"\n✅ Mejor: {best['workers']} workers x {best['threads']} hilos ({best['fps']:.1f} FPS, p95 {best['p95_ms']:.0f}ms)")
+
+    if args.dry_run:
+        return
+
+    values = {"MAX_WORKERS": str(best["workers"]), "INTRA_OP_THREADS": str(best["threads"])}
+    if args.pin:
+        values["CPU_AFFINITY"] = "true"
+    update_env_file(args.env_file, values)
+    print(f"💾 Configuración guardada en {args.env_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Servidor local de inferencia para el modo multi-worker.
+
+Carga el modelo una sola vez y atiende a los workers front-end de uvicorn
+por Unix socket (ver app/services/remote_inference.py). La concurrencia de
+inferencia la fija su propio executor con la topología de hilos de CPU.
+
+Uso (main.py lo lanza solo con INFERENCE_MODE=remote):
+    python inference_server.py
+"""
+import asyncio
+import itertools
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from app.config import settings
+from app.services import (
+    FairFrameScheduler, FramePipeline, PPEDetectorService, ThreadTopology, load_yolo_class
+)
+from app.services.detector_factory import create_detector
+from app.services.frame_memory import process_memory
+from app.services.remote_inference import ClusterState, encode_message, read_message
+
+
+class InferenceServer:
+
+    def __init__(self, socket_path: str, workers: int):
+        self.socket_path = socket_path
+        self.topology = ThreadTopology(
+            workers,
+            intra_op_threads=settings.intra_op_threads,
+            inter_op_threads=settings.inter_op_threads,
+            pin_cpus=settings.cpu_affinity,
+        )
+        self.topology.limit_native_threads()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.topology.workers,
+            thread_name_prefix="yolo_",
+            initializer=self.topology.initialize_worker
+        )
+        # Mismo pipeline por etapas que el modo local; la equidad entre
+        # cámaras ya la aplica el scheduler de cada worker front-end
+        self.decode_executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.decode_workers),
+            thread_name_prefix="decode_"
+        )
+        self.scheduler = FairFrameScheduler(
+            max_concurrency=self.topology.workers * (1 + max(0, settings.pipeline_queue_per_worker)),
+            priority_weights={"normal": 1},
+            max_fps=float("inf"),
+        )
+        # Cada conexión de un front-end es un hilo `yolo_` de ese worker que
+        # envía de a una petición: el scheduler reparte por conexión
+        self._client_ids = itertools.count(1)
+        self.pipeline = FramePipeline(
+            self.decode_executor,
+            max(1, settings.decode_workers),
+            self.executor,
+            self.topology.workers,
+            self.scheduler,
+        )
+        self.cluster = ClusterState(
+            settings.ws_max_connections,
+            stale_after=settings.cluster_report_interval * 3
+        )
+        self.detector: Optional[PPEDetectorService] = None
+        self.warmup_ms = 0.0
+        # Se comprueba y se marca sin ceder el event loop
+        self.reloading = False
+        self.metrics: Dict[str, int] = {"requests": 0, "errors": 0, "in_flight": 0, "clients": 0}
+
+    async def load(self, model_path: Optional[str], version: Optional[str] = None):
+        """Carga y calienta un detector; la referencia se cambia al final"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, load_yolo_class)
+        self.topology.configure_process()
+        detector = await loop.run_in_executor(None, create_detector, model_path, version)
+        self.warmup_ms = await loop.run_in_executor(
+            None, detector.warmup, settings.warmup_sizes, settings.warmup_runs
+        )
+        self.detector = detector
+
+    def info(self) -> Dict:
+        detector = self.detector
+        if detector is None:
+            return {"ready": False}
+        return {
+            "ready": detector.is_ready(),
+            "model_version": detector.model_version,
+            "model_info": detector.get_model_info(),
+            "class_names": {str(k): v for k, v in detector.get_class_names().items()},
+            "input_size": detector.get_input_size(settings.model_imgsz),
+            "profile_masks": detector.profile_masks,
+            "default_profile": detector.default_profile,
+            "warmup_ms": round(self.warmup_ms, 1),
+        }
+
+    async def handle_request(self, request: Dict, client_id: str) -> Dict:
+        op = request.get("op")
+
+        if op == "detect":
+            detector = self.detector
+            if detector is None:
+                return {"ok": False, "error": "Modelo no cargado"}
+            result = await self.pipeline.run(
+                client_id,
+                detector,
+                request["image"],
+                request.get("confidence", settings.confidence_threshold),
+                request.get("profile"),
+                request.get("person_hint"),
+                request.get("imgsz")
+            )
+            return {"ok": True, "result": result.model_dump(mode="json")}
+
+        if op == "info":
+            return {"ok": True, "info": self.info()}
+
+        if op == "reload":
+            if self.reloading:
+                return {"ok": False, "error": "Ya hay una recarga en curso"}
+            self.reloading = True
+            try:
+                await self.load(request["model_path"], request.get("version"))
+            finally:
+                self.reloading = False
+            return {"ok": True, "info": self.info()}
+
+        if op == "acquire":
+            return {"ok": True, "granted": self.cluster.acquire(request["worker"])}
+
+        if op == "release":
+            self.cluster.release(request["worker"])
+            return {"ok": True}
+
+        if op == "claim_stream":
+            granted = self.cluster.claim_stream(request["worker"], request["stream"], request["owner"])
+            return {"ok": True, "granted": granted}
+
+        if op == "release_stream":
+            self.cluster.release_stream(request["worker"], request["stream"], request["owner"])
+            return {"ok": True}
+
+        if op == "report":
+            self.cluster.report(request["worker"], request.get("metrics", {}))
+            return {"ok": True}
+
+        if op == "memory":
+            memory = self.detector.get_memory_metrics() if self.detector else {}
+            return {"ok": True, "memory": {**memory, "process": process_memory()}}
+
+        if op == "metrics":
+            return {"ok": True, "metrics": {
+                **self.cluster.get_metrics(),
+                "inference_server": {
+                    **self.metrics,
+                    "thread_topology": self.topology.get_metrics(),
+                    "pipeline": self.pipeline.get_metrics(),
+                    "model_version": self.detector.model_version if self.detector else None,
+                },
+            }}
+
+        return {"ok": False, "error": f"Operación desconocida: {op}"}
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.metrics["clients"] += 1
+        client_id = f"client-{next(self._client_ids)}"
+        self.scheduler.register(client_id)
+        try:
+            while True:
+                request = await read_message(reader)
+                if request is None:
+                    break
+
+                self.metrics["requests"] += 1
+                self.metrics["in_flight"] += 1
+                try:
+                    response = await self.handle_request(request, client_id)
+                except ValueError as e:
+                    response = {"ok": False, "error": str(e), "kind": "value"}
+                except Exception as e:
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                finally:
+                    self.metrics["in_flight"] -= 1
+                if not response["ok"]:
+                    self.metrics["errors"] += 1
+
+                writer.write(encode_message(response))
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            print(f"Cliente de inferencia desconectado: {e}")
+        except asyncio.CancelledError:
+            # Apagado del servidor con clientes todavía conectados
+            pass
+        finally:
+            self.metrics["clients"] -= 1
+            self.scheduler.unregister(client_id)
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        print(f"🧠 Servidor de inferencia en {self.socket_path} ({self.topology.workers} workers)")
+
+        # El socket acepta conexiones mientras carga; "info" informa ready=False
+        started = time.time()
+        await self.load(settings.model_path)
+        print(f"✅ Modelo listo en {time.time() - started:.1f}s")
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+
+        async with server:
+            await stop.wait()
+        self.executor.shutdown(wait=False)
+        self.decode_executor.shutdown(wait=False)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def main():
+    workers = min(settings.max_workers, (os.cpu_count() or 1) + 1)
+    asyncio.run(InferenceServer(settings.inference_socket, workers).serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,24 @@
 EPP Detection API - Main Application
 Arquitectura MVC con FastAPI
 """
+import asyncio
+import atexit
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.controllers import router, init_detector
-from app.services import PPEDetectorService
+from app.controllers import (
+    router, init_detector, init_cluster, report_cluster_metrics, set_startup_phase,
+    ws_manager, history_store, snapshot_store, thread_topology
+)
+from app.services import RemoteDetectorService, load_yolo_class
+from app.services.detector_factory import create_detector, create_remote_detector
 
 
 # ============================================================================
@@ -37,25 +49,91 @@ app.add_middleware(
 
 
 
+async def connect_inference_server():
+    """Modo remote: el modelo vive en inference_server.py, aquí solo se espera"""
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
+    try:
+        set_startup_phase("waiting_inference_server")
+        detector = RemoteDetectorService(settings.inference_socket)
+        await loop.run_in_executor(None, detector.wait_until_ready)
+        init_cluster(detector)
+        init_detector(detector, factory=create_remote_detector)
+        app.state.cluster_task = asyncio.create_task(report_cluster_metrics())
+        set_startup_phase("ready", timings_ms={"total_ms": round((time.time() - start_time) * 1000, 1)})
+        print(f"✅ Conectado al servidor de inferencia {settings.inference_socket}")
+    except Exception as e:
+        print(f"Error al conectar con el servidor de inferencia: {e}")
+        set_startup_phase("failed", error=str(e))
+
+
+async def initialize_services():
+    """
+    Carga pesada fuera del event loop: importar ultralytics/torch, cargar
+    pesos y precalentar. Mientras tanto el servidor ya acepta conexiones y
+    /api/health y /api/ready responden 503 con la fase actual.
+    """
+    loop = asyncio.get_running_loop()
+    timings = {}
+    start_time = time.time()
+    try:
+        set_startup_phase("importing")
+        phase_start = time.time()
+        await loop.run_in_executor(None, load_yolo_class)
+        thread_topology.configure_process()
+        timings["imports_ms"] = round((time.time() - phase_start) * 1000, 1)
+
+        set_startup_phase("loading_models", timings_ms=timings)
+        phase_start = time.time()
+        detector = await loop.run_in_executor(None, create_detector, settings.model_path)
+        timings["model_load_ms"] = round((time.time() - phase_start) * 1000, 1)
+
+        if settings.warmup_runs > 0:
+            set_startup_phase("warming_up", timings_ms=timings)
+            timings["warmup_ms"] = round(await loop.run_in_executor(
+                None, detector.warmup, settings.warmup_sizes, settings.warmup_runs
+            ), 1)
+
+        init_detector(detector, factory=create_detector)
+        timings["total_ms"] = round((time.time() - start_time) * 1000, 1)
+        set_startup_phase("ready", timings_ms=timings)
+        print(f"✅ Detector inicializado correctamente en {timings['total_ms']:.0f}ms")
+
+    except Exception as e:
+        print(f"Error al inicializar detector: {e}")
+        set_startup_phase("failed", error=str(e), timings_ms=timings)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Inicializa servicios al arrancar la aplicación"""
     print("Iniciando EPP Detection API...")
+    if settings.memory_tracing:
+        tracemalloc.start()
     print(f"Modelo: {settings.model_path or 'yolov8n.pt'}")
-    try:
-        detector = PPEDetectorService(model_path=settings.model_path)
-        init_detector(detector)
-        print("✅ Detector inicializado correctamente")
-            
-    except Exception as e:
-        print(f"Error al inicializar detector: {e}")
-        raise
+    if history_store:
+        history_store.start()
+    if snapshot_store:
+        snapshot_store.start()
+    # El modelo se carga en segundo plano; el puerto queda abierto de inmediato
+    if settings.inference_mode == "remote":
+        app.state.startup_task = asyncio.create_task(connect_inference_server())
+    else:
+        app.state.startup_task = asyncio.create_task(initialize_services())
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Limpia recursos al cerrar la aplicación"""
     print("👋 Cerrando EPP Detection API...")
+    await ws_manager.shutdown()
+    cluster_task = getattr(app.state, "cluster_task", None)
+    if cluster_task:
+        cluster_task.cancel()
+    if history_store:
+        history_store.stop()
+    if snapshot_store:
+        snapshot_store.stop()
 
 
 
@@ -72,7 +150,12 @@ async def root():
         "endpoints": {
             "POST /api/detect": "Detectar EPP en imagen",
             "WebSocket /api/ws/detect": "Detección en tiempo real",
-            "GET /api/health": "Estado del servicio"
+            "WebSocket /api/ws/streams/{stream_id}": "Resultados de un stream (suscriptor)",
+            "GET /api/health": "Estado del servicio",
+            "GET /api/ready": "Readiness (modelo cargado y precalentado)",
+            "GET /api/history/compliance": "Cumplimiento por cámara y hora",
+            "GET /api/history/missing": "EPP faltantes más frecuentes",
+            "GET /api/snapshots": "Evidencias de incumplimiento por cámara y tiempo"
         }
     }
 
@@ -85,11 +168,22 @@ if __name__ == "__main__":
     print("🚀 INICIANDO EPP DETECTION API - MODO PRODUCCIÓN 24/7")
     print("="*60)
     print(f"📍 Host: {settings.host}:{settings.port}")
-    print(f"🔧 Workers: {settings.max_workers}")
+    print(f"🔧 Workers: {thread_topology.workers} x {thread_topology.intra_op_threads} hilos")
     print(f"🔌 Max Conexiones: {settings.ws_max_connections}")
     print(f"📦 Max Tamaño Imagen: {settings.max_image_size_mb}MB")
     print(f"⏱️  Timeout Inactividad: {settings.ws_inactive_timeout}s")
     print(f"💓 Heartbeat: {settings.ws_heartbeat_interval}s")
+    
+    # Modo remote: N workers front-end y un servidor de inferencia compartido
+    frontend_workers = 1
+    if settings.inference_mode == "remote":
+        frontend_workers = max(1, settings.frontend_workers)
+        server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inference_server.py")
+        inference_process = subprocess.Popen([sys.executable, server_script])
+        atexit.register(inference_process.terminate)
+        print(f"🧠 Inferencia: {settings.inference_socket} (pid {inference_process.pid}), {frontend_workers} workers front-end")
+        if frontend_workers > 1:
+            print("⚠️ Con varios workers front-end /ws/streams/{stream_id} queda deshabilitado")
     print("="*60 + "\n")
     
     uvicorn.run(
@@ -100,15 +194,15 @@ if __name__ == "__main__":
         # Configuración de timeouts
         timeout_keep_alive=settings.uvicorn_timeout_keep_alive,
         timeout_graceful_shutdown=30,
-        # Configuración WebSocket
-        ws_ping_interval=settings.ws_heartbeat_interval,
-        ws_ping_timeout=20,
+        # Configuración WebSocket (el heartbeat lo gestiona WebSocketManager)
+        ws_ping_interval=None,
+        ws_ping_timeout=None,
         ws_max_size=int(settings.max_image_size_mb * 1024 * 1024 * 10), 
         # Configuración de concurrencia
         limit_concurrency=settings.uvicorn_limit_concurrency,
         limit_max_requests=settings.uvicorn_limit_max_requests,
         backlog=settings.uvicorn_backlog,
         # Performance
-        workers=1 if settings.debug else 1,  # 1 worker para WebSocket persistente
+        workers=frontend_workers,  # >1 solo en modo remote (estado de conexiones coordinado)
         log_level="info"
     )
\ No newline at end of file
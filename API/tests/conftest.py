@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los tests importan `app` igual que main.py, desde el directorio API
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services.frame_memory import FrameBufferPool, is_jpeg, read_image_size, reduced_decode_flag
+
+
+def _encode(ext: str, width: int, height: int, params=()) -> bytes:
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    ok, encoded = cv2.imencode(ext, image, list(params))
+    assert ok
+    return encoded.tobytes()
+
+
+@pytest.mark.parametrize("params", [(), (cv2.IMWRITE_JPEG_PROGRESSIVE, 1)])
+def test_read_jpeg_size(params):
+    data = _encode(".jpg", 321, 123, params)
+    assert is_jpeg(data)
+    assert read_image_size(data) == (321, 123)
+
+
+def test_read_jpeg_size_after_app_segment_and_padding():
+    data = _encode(".jpg", 64, 48)
+    # Segmento APP1 y bytes de relleno antes del resto de la cabecera
+    app1 = b"\xff\xe1" + struct.pack(">H", 6) + b"Exif"
+    patched = data[:2] + app1 + b"\xff" + data[2:]
+    assert read_image_size(patched) == (64, 48)
+
+
+def test_read_png_size():
+    data = _encode(".png", 200, 100)
+    assert not is_jpeg(data)
+    assert read_image_size(data) == (200, 100)
+
+
+@pytest.mark.parametrize("ext", [".bmp", ".webp", ".tiff"])
+def test_unknown_formats_have_no_size(ext):
+    assert read_image_size(_encode(ext, 16, 16)) is None
+
+
+def test_truncated_or_corrupt_headers():
+    data = _encode(".jpg", 64, 48)
+    assert read_image_size(data[:4]) is None
+    assert read_image_size(data[:2] + b"\x00\x00\x00\x00") is None
+    assert read_image_size(b"\x89PNG\r\n\x1a\n\x00") is None
+    assert read_image_size(b"") is None
+
+
+def test_reduced_decode_keeps_longest_side_above_target():
+    assert reduced_decode_flag(3840, 2160, 640) == (cv2.IMREAD_REDUCED_COLOR_4, 4)
+    assert reduced_decode_flag(2160, 3840, 640) == (cv2.IMREAD_REDUCED_COLOR_4, 4)
+    assert reduced_decode_flag(1920, 1080, 640) == (cv2.IMREAD_REDUCED_COLOR_2, 2)
+    assert reduced_decode_flag(1000, 600, 640) == (cv2.IMREAD_COLOR, 1)
+
+
+def test_buffer_pool_reuses_released_buffers():
+    pool = FrameBufferPool(max_free_per_shape=1)
+    image = np.full((480, 640, 3), 7, dtype=np.uint8)
+    first = pool.resize_into(image, 320, 240)
+    assert first.shape == (240, 320, 3) and int(first[0, 0, 0]) == 7
+    pool.release(first)
+
+    second = pool.resize_into(image, 320, 240)
+    assert second is first
+    assert (pool.hits, pool.misses) == (1, 1)
+
+    # Arrays ajenos al pool se ignoran
+    pool.release(np.zeros(3, dtype=np.uint8))
+    pool.release(second)
+    pool.release(second)
+    assert pool.acquire((240, 320, 3)) is first
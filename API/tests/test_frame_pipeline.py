@@ -0,0 +1,87 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.frame_pipeline import FramePipeline
+from app.services.frame_scheduler import FairFrameScheduler
+
+
+class FakeDetector:
+    """Detector con etapas separadas que cuenta los buffers tomados y devueltos"""
+
+    def __init__(self, decode_s: float = 0.05, infer_s: float = 0.2):
+        self.decode_s = decode_s
+        self.infer_s = infer_s
+        self.lock = threading.Lock()
+        self.prepared = 0
+        self.released = 0
+
+    def prepare_frame(self, base64_image, imgsz):
+        time.sleep(self.decode_s)
+        with self.lock:
+            self.prepared += 1
+        return SimpleNamespace(image=object(), scale=1.0, decode_ms=self.decode_s * 1000)
+
+    def release_frame(self, frame):
+        with self.lock:
+            self.released += 1
+
+    def infer_frame(self, image, confidence, profile, scale, person_hint, imgsz):
+        time.sleep(self.infer_s)
+        return SimpleNamespace(processing_time=self.infer_s * 1000)
+
+    def build_response(self, raw):
+        return SimpleNamespace(stage_timings=None, raw=raw)
+
+
+def _pipeline(slots: int = 2):
+    scheduler = FairFrameScheduler(slots, {"normal": 1})
+    pipeline = FramePipeline(ThreadPoolExecutor(1), 1, ThreadPoolExecutor(1), 1, scheduler)
+    return scheduler, pipeline
+
+
+def test_frame_runs_through_every_stage():
+    async def scenario():
+        scheduler, pipeline = _pipeline()
+        scheduler.register("cam")
+        detector = FakeDetector(decode_s=0.0, infer_s=0.0)
+        result = await pipeline.run("cam", detector, "x", 0.5, None)
+        return result, detector, scheduler.load(), pipeline.load()
+
+    result, detector, scheduler_load, pipeline_load = asyncio.run(scenario())
+    assert result.raw.processing_time == 0
+    assert (detector.prepared, detector.released) == (1, 1)
+    assert scheduler_load == (0, 0) and pipeline_load == (0, 0)
+
+
+def test_cancelled_frames_release_buffers_and_slots():
+    async def scenario():
+        scheduler, pipeline = _pipeline()
+        scheduler.register("c")
+        scheduler.register("d")
+        detector = FakeDetector()
+        tasks = [asyncio.create_task(pipeline.run(conn, detector, "x", 0.5, None)) for conn in "cdcdcd"]
+        await asyncio.sleep(0.02)
+        # "d" se cancela mientras decodifica o espera la decodificación
+        tasks[1].cancel()
+        await asyncio.sleep(0.15)
+        # El resto se cancela esperando turno o inferencia
+        for task in tasks[2:]:
+            task.cancel()
+        first = await tasks[0]
+        await asyncio.sleep(0.6)
+        load = scheduler.load(), pipeline.load()
+
+        # Los lugares volvieron: un frame nuevo se atiende enseguida
+        again = await asyncio.wait_for(pipeline.run("d", detector, "x", 0.5, None), 1)
+        return first, again, load, detector
+
+    first, again, load, detector = asyncio.run(scenario())
+    assert first.raw.processing_time == pytest.approx(200)
+    assert again.raw.processing_time == pytest.approx(200)
+    assert load == ((0, 0), (0, 0))
+    assert detector.prepared == detector.released
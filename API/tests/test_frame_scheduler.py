@@ -0,0 +1,187 @@
+import asyncio
+import math
+
+import pytest
+
+from app.services import frame_scheduler
+from app.services.frame_scheduler import FairFrameScheduler, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": 100.0}
+    monkeypatch.setattr(frame_scheduler.time, "monotonic", lambda: now["t"])
+    return now
+
+
+def test_token_bucket_burst_then_refill(clock):
+    bucket = TokenBucket(rate=2.0, burst=2.0)
+    assert bucket.try_acquire() == (True, 0.0)
+    assert bucket.try_acquire() == (True, 0.0)
+    admitted, retry_after = bucket.try_acquire()
+    assert not admitted and retry_after == pytest.approx(0.5)
+
+    clock["t"] += 0.25
+    admitted, retry_after = bucket.try_acquire()
+    assert not admitted and retry_after == pytest.approx(0.25)
+
+    clock["t"] += 0.25
+    assert bucket.try_acquire() == (True, 0.0)
+
+
+def test_token_bucket_never_exceeds_burst(clock):
+    bucket = TokenBucket(rate=10.0, burst=3.0)
+    clock["t"] += 60.0
+    results = [bucket.try_acquire()[0] for _ in range(5)]
+    assert results == [True, True, True, False, False]
+
+
+def test_token_bucket_zero_rate_retry_is_infinite(clock):
+    bucket = TokenBucket(rate=0.0, burst=1.0)
+    assert bucket.try_acquire()[0]
+    admitted, retry_after = bucket.try_acquire()
+    assert not admitted and math.isinf(retry_after)
+
+
+def test_try_admit_applies_rate_scale(clock):
+    scheduler = FairFrameScheduler(1, {"normal": 1}, max_fps=4.0, burst=1.0)
+    scheduler.register("cam")
+    assert scheduler.try_admit("cam")[0]
+    assert scheduler.try_admit("cam")[1] == pytest.approx(0.25)
+
+    scheduler.set_rate_scale(0.5)
+    assert scheduler.try_admit("cam")[1] == pytest.approx(0.5)
+    # Una conexión registrada después también hereda la escala
+    scheduler.register("otra")
+    assert scheduler.get_metrics()["connections"]["otra"]["max_fps"] == pytest.approx(2.0)
+
+
+def test_try_admit_unknown_connection_is_admitted():
+    scheduler = FairFrameScheduler(1, {"normal": 1})
+    assert scheduler.try_admit("desconocida") == (True, 0.0)
+
+
+def test_weighted_round_robin_between_priority_classes():
+    async def scenario():
+        scheduler = FairFrameScheduler(1, {"alta": 3, "baja": 1}, default_priority="baja")
+        for index in range(4):
+            scheduler.register(f"a{index}", priority="alta")
+            scheduler.register(f"b{index}", priority="baja")
+        scheduler.register("holder", priority="baja")
+
+        order = []
+
+        async def frame(conn_id):
+            await scheduler.acquire(conn_id)
+            order.append(conn_id[0])
+            await asyncio.sleep(0)
+            scheduler.release(conn_id)
+
+        await scheduler.acquire("holder")
+        tasks = [asyncio.create_task(frame(f"{cls}{index}")) for index in range(4) for cls in "ab"]
+        await asyncio.sleep(0)
+        assert scheduler.load() == (8, 1)
+        scheduler.release("holder")
+        await asyncio.gather(*tasks)
+        return order, scheduler.load()
+
+    order, load = asyncio.run(scenario())
+    assert order[:4] == ["a", "a", "a", "b"]
+    assert sorted(order) == ["a"] * 4 + ["b"] * 4
+    assert load == (0, 0)
+
+
+def test_round_robin_within_class_one_slot_per_connection():
+    async def scenario():
+        scheduler = FairFrameScheduler(2, {"normal": 1})
+        scheduler.register("rapida")
+        scheduler.register("lenta")
+        order = []
+
+        async def frame(conn_id):
+            await scheduler.acquire(conn_id)
+            order.append(conn_id)
+            await asyncio.sleep(0)
+            scheduler.release(conn_id)
+
+        # La conexión rápida encola cuatro frames; la lenta solo uno
+        tasks = [asyncio.create_task(frame("rapida")) for _ in range(4)]
+        tasks.append(asyncio.create_task(frame("lenta")))
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    # Un frame en curso por conexión: la lenta entra antes que el resto de la rápida
+    assert order.index("lenta") <= 1
+
+
+def test_cancel_while_queued_frees_the_queue():
+    async def scenario():
+        scheduler = FairFrameScheduler(1, {"normal": 1})
+        scheduler.register("a")
+        scheduler.register("b")
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        assert scheduler.load() == (1, 1)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        scheduler.release("a")
+        # El futuro cancelado se descarta sin ocupar lugar
+        return scheduler.load(), scheduler.is_idle("b")
+
+    assert asyncio.run(scenario()) == ((0, 0), True)
+
+
+def test_cancel_right_after_grant_returns_the_slot():
+    async def scenario():
+        scheduler = FairFrameScheduler(1, {"normal": 1})
+        scheduler.register("a")
+        scheduler.register("b")
+        await scheduler.acquire("a")
+        waiter = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+
+        # El lugar se concede y la tarea se cancela antes de reanudarse
+        scheduler.release("a")
+        assert scheduler.load() == (0, 1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        load = scheduler.load()
+
+        await asyncio.wait_for(scheduler.acquire("a"), 1)
+        scheduler.release("a")
+        return load, scheduler.load()
+
+    assert asyncio.run(scenario()) == ((0, 0), (0, 0))
+
+
+def test_unregister_cancels_waiting_frames():
+    async def scenario():
+        scheduler = FairFrameScheduler(1, {"normal": 1})
+        scheduler.register("a")
+        scheduler.register("b")
+        await scheduler.acquire("a")
+        waiters = [asyncio.create_task(scheduler.acquire("b")) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert scheduler.load() == (3, 1)
+
+        scheduler.unregister("b")
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        scheduler.release("a")
+        return results, scheduler.load()
+
+    results, load = asyncio.run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert load == (0, 0)
+
+
+def test_acquire_unregistered_connection_fails():
+    async def scenario():
+        await FairFrameScheduler(1, {"normal": 1}).acquire("nadie")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
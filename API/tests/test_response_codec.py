@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from app.models.ppe_models import Detection, DetectionResponse, PPEStatus
+from app.services import response_codec
+from app.services.response_codec import (
+    PPE_ITEMS,
+    ResponseEncoder,
+    bits_to_ppe_status,
+    ppe_status_to_bits,
+)
+
+
+CLASSES = {0: "person", 1: "hardhat"}
+
+
+def _response(casco: bool = True, confidence: float = 0.876, **extra) -> DetectionResponse:
+    return DetectionResponse(
+        ppe_status=PPEStatus(casco=casco),
+        detections=[Detection(class_name="hardhat", confidence=confidence, bbox=[10.4, 20.6, 110.5, 120.2])],
+        is_compliant=False,
+        processing_time=12.345,
+        **extra,
+    )
+
+
+def test_status_bits_round_trip():
+    status = PPEStatus(casco=True, botas=True)
+    bits = ppe_status_to_bits(status)
+    assert bits == 1 << PPE_ITEMS.index("casco") | 1 << PPE_ITEMS.index("botas")
+    assert bits_to_ppe_status(bits) == status
+
+
+def test_compact_payload():
+    encoder = ResponseEncoder("compact", CLASSES)
+    payload = json.loads(encoder.encode(_response()))
+    assert payload == {
+        "t": "r",
+        "n": 1,
+        "s": 1 << PPE_ITEMS.index("casco"),
+        "ok": 0,
+        "hp": 1,
+        "ms": 12.3,
+        "d": [[1, 88, 10, 21, 110, 120]],
+    }
+    assert encoder.class_table()["classes"] == {"0": "person", "1": "hardhat"}
+
+
+def test_compact_payload_with_smoothing_and_degradation():
+    encoder = ResponseEncoder("compact", CLASSES)
+    result = _response(
+        smoothed_ppe_status=PPEStatus(casco=True, guantes=True),
+        smoothed_is_compliant=True,
+        degradation_level=2,
+    )
+    payload = json.loads(encoder.encode(result))
+    assert payload["ss"] == 1 << PPE_ITEMS.index("casco") | 1 << PPE_ITEMS.index("guantes")
+    assert payload["sok"] == 1
+    assert payload["dl"] == 2
+    # "pi" viaja siempre junto a "dl" aunque la persona no sea supuesta
+    assert payload["pi"] == 0
+
+    payload = json.loads(encoder.encode(_response(degradation_level=2, person_inferred=True)))
+    assert payload["pi"] == 1
+
+
+def test_delta_sends_only_changed_keys():
+    encoder = ResponseEncoder("compact", CLASSES, delta=True)
+    first = json.loads(encoder.encode(_response()))
+    assert first["k"] == 1
+    assert {"s", "ok", "hp", "d"} <= first.keys()
+
+    second = json.loads(encoder.encode(_response()))
+    assert second == {"t": "r", "n": 2, "ms": 12.3}
+
+    third = json.loads(encoder.encode(_response(casco=False)))
+    assert third == {"t": "r", "n": 3, "ms": 12.3, "s": 0}
+
+
+def test_delta_restarts_after_model_update():
+    encoder = ResponseEncoder("compact", CLASSES, delta=True)
+    encoder.encode(_response())
+    encoder.update_model({0: "person", 1: "helmet"}, "v2")
+    payload = json.loads(encoder.encode(_response()))
+    assert payload["k"] == 1
+    # Clase desconocida en la tabla nueva
+    assert payload["d"][0][0] == -1
+
+
+def test_full_mode_never_uses_delta():
+    encoder = ResponseEncoder("full", CLASSES, delta=True)
+    assert not encoder.delta
+    payload = json.loads(encoder.encode(_response()))
+    assert payload["ppe_status"]["casco"] is True
+    assert "stage_timings" not in payload
+
+
+def test_unknown_mode_falls_back_to_full():
+    assert ResponseEncoder("xml", CLASSES).mode == "full"
+
+
+@pytest.mark.skipif(response_codec.msgpack is None, reason="msgpack no instalado")
+def test_msgpack_matches_compact():
+    compact = json.loads(ResponseEncoder("compact", CLASSES).encode(_response()))
+    packed = ResponseEncoder("msgpack", CLASSES).encode(_response())
+    assert response_codec.msgpack.unpackb(packed, raw=False) == compact
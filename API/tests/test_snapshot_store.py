@@ -0,0 +1,21 @@
+import os
+
+from app.services.snapshot_store import ViolationSnapshotStore, camera_folder
+
+
+def test_camera_folder_is_single_safe_component():
+    assert camera_folder("cam-1") == "cam-1"
+    assert camera_folder("..") == "camera"
+    assert camera_folder(".") == "camera"
+    assert camera_folder("") == "camera"
+    assert camera_folder("../../etc") == "_.._etc"
+    assert camera_folder(".oculta") == "oculta"
+    assert os.sep not in camera_folder("a/b\\c")
+
+
+def test_resolve_rejects_paths_outside_directory(tmp_path):
+    store = ViolationSnapshotStore(str(tmp_path / "snapshots"))
+    inside = store._resolve(os.path.join("cam", "20261019", "1.jpg"))
+    assert inside == os.path.join(os.path.realpath(tmp_path / "snapshots"), "cam", "20261019", "1.jpg")
+    assert store._resolve(os.path.join("..", "20261019", "1.jpg")) is None
+    assert store._resolve("/etc/passwd") is None
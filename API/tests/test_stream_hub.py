@@ -0,0 +1,77 @@
+import asyncio
+
+from app.models.ppe_models import DetectionResponse, PPEStatus
+from app.services.stream_hub import StreamHub
+
+
+def _response(processing_time: float) -> DetectionResponse:
+    return DetectionResponse(ppe_status=PPEStatus(), is_compliant=True, processing_time=processing_time)
+
+
+def test_single_producer_per_stream():
+    hub = StreamHub()
+    assert hub.claim("linea-1", "a")
+    assert hub.claim("linea-1", "a")
+    assert not hub.claim("linea-1", "b")
+
+    # Solo el dueño libera la reserva
+    hub.release("linea-1", "b")
+    assert not hub.claim("linea-1", "b")
+    hub.release("linea-1", "a")
+    assert hub.claim("linea-1", "b")
+
+
+def test_publish_fans_out_to_every_subscriber():
+    async def scenario():
+        hub = StreamHub(buffer_size=4)
+        first = hub.subscribe("linea-1")
+        second = hub.subscribe("linea-1")
+        delivered = hub.publish("linea-1", _response(1.0))
+        results = [await first.next(), await second.next()]
+        return delivered, results, hub.get_metrics()["streams"]["linea-1"]
+
+    delivered, results, metrics = asyncio.run(scenario())
+    assert delivered == 2
+    assert [result.processing_time for result in results] == [1.0, 1.0]
+    assert metrics["published"] == 1 and metrics["delivered"] == 2
+
+
+def test_slow_subscriber_drops_oldest_results():
+    async def scenario():
+        hub = StreamHub(buffer_size=2)
+        subscription = hub.subscribe("linea-1")
+        for index in range(5):
+            hub.publish("linea-1", _response(float(index)))
+        results = [await subscription.next() for _ in range(2)]
+        return results, subscription.dropped
+
+    results, dropped = asyncio.run(scenario())
+    assert [result.processing_time for result in results] == [3.0, 4.0]
+    assert dropped == 3
+
+
+def test_last_unsubscribe_forgets_stream_without_producer():
+    hub = StreamHub()
+    first = hub.subscribe("linea-1")
+    second = hub.subscribe("linea-1")
+    hub.publish("linea-1", _response(1.0))
+
+    hub.unsubscribe(first)
+    assert "linea-1" in hub.get_metrics()["streams"]
+    hub.unsubscribe(second)
+    assert hub.get_metrics()["streams"] == {}
+    # Desuscribir dos veces no falla
+    hub.unsubscribe(second)
+
+
+def test_stream_with_producer_keeps_counters():
+    hub = StreamHub()
+    hub.claim("linea-1", "a")
+    subscription = hub.subscribe("linea-1")
+    hub.publish("linea-1", _response(1.0))
+    hub.unsubscribe(subscription)
+    assert hub.get_metrics()["streams"]["linea-1"]["producer"] == "a"
+
+    hub.release("linea-1", "a")
+    hub.forget("linea-1")
+    assert hub.get_metrics()["streams"] == {}
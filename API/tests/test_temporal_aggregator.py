@@ -0,0 +1,99 @@
+from app.models.ppe_models import DetectionResponse, PPEStatus
+from app.services.response_codec import PPE_ITEMS
+from app.services.temporal_aggregator import ALL_ITEMS_MASK, ComplianceAggregator, StreamAggregators
+
+
+CASCO = 1 << PPE_ITEMS.index("casco")
+GUANTES = 1 << PPE_ITEMS.index("guantes")
+
+
+def _response(bits: int, has_person: bool = True, person_inferred=None) -> DetectionResponse:
+    status = PPEStatus(**{item: bool(bits >> index & 1) for index, item in enumerate(PPE_ITEMS)})
+    return DetectionResponse(
+        ppe_status=status,
+        is_compliant=bits == ALL_ITEMS_MASK,
+        has_person=has_person,
+        person_inferred=person_inferred,
+    )
+
+
+def test_item_turns_on_at_on_ratio():
+    aggregator = ComplianceAggregator(window=5, on_ratio=0.6, off_ratio=0.3)
+    assert aggregator.update(CASCO, True) == (CASCO, True)
+    for _ in range(4):
+        aggregator.update(0, True)
+    # 1 de 5 frames con casco: por debajo de off_ratio, vuelve a faltante
+    assert aggregator.state_bits & CASCO == 0
+
+    for _ in range(2):
+        aggregator.update(CASCO, True)
+    # 2 de 5 (entre off_ratio y on_ratio): mantiene el estado
+    assert aggregator.state_bits & CASCO == 0
+    aggregator.update(CASCO, True)
+    assert aggregator.state_bits & CASCO == CASCO
+
+
+def test_single_missed_detection_does_not_flip_state():
+    aggregator = ComplianceAggregator(window=5, on_ratio=0.6, off_ratio=0.3, required_mask=CASCO | GUANTES)
+    for _ in range(5):
+        aggregator.update(CASCO | GUANTES, True)
+    assert aggregator.is_compliant
+
+    bits, _ = aggregator.update(CASCO, True)
+    assert bits & GUANTES
+    assert aggregator.is_compliant
+
+    # Con la falta sostenida el estado sí cambia
+    for _ in range(3):
+        aggregator.update(CASCO, True)
+    assert not aggregator.is_compliant
+
+
+def test_person_uses_hysteresis_and_frames_without_person_are_not_evidence():
+    aggregator = ComplianceAggregator(window=5, on_ratio=0.6, off_ratio=0.3)
+    for _ in range(5):
+        aggregator.update(CASCO, True)
+    # Frames sin persona no restan el casco y la persona se mantiene
+    aggregator.update(CASCO, False)
+    bits, has_person = aggregator.update(0, False)
+    assert has_person
+    assert bits & CASCO
+
+    # 2 de 5 con persona: entre los umbrales, se mantiene
+    bits, has_person = aggregator.update(0, False)
+    assert has_person
+    bits, has_person = aggregator.update(0, False)
+    assert not has_person
+    assert bits & CASCO
+    assert aggregator.is_compliant
+
+
+def test_apply_skips_frames_with_inferred_person():
+    aggregator = ComplianceAggregator(window=3, on_ratio=0.6, off_ratio=0.3)
+    for _ in range(3):
+        aggregator.apply(_response(ALL_ITEMS_MASK))
+
+    for _ in range(3):
+        result = aggregator.apply(_response(0, person_inferred=True))
+    assert result.smoothed_is_compliant
+    assert result.smoothed_ppe_status.casco
+    assert not result.ppe_status.casco
+
+    # 2 de 3 y luego 1 de 3 con casco: por encima de off_ratio, se mantiene
+    for _ in range(2):
+        result = aggregator.apply(_response(0))
+        assert result.smoothed_ppe_status.casco
+    result = aggregator.apply(_response(0))
+    assert not result.smoothed_ppe_status.casco
+
+
+def test_stream_aggregators_are_shared_until_last_release():
+    aggregators = StreamAggregators(window=3, on_ratio=0.6, off_ratio=0.3)
+    first = aggregators.acquire("linea-1")
+    assert aggregators.acquire("linea-1") is first
+
+    aggregators.release("linea-1")
+    assert aggregators.acquire("linea-1") is first
+    aggregators.release("linea-1")
+    aggregators.release("linea-1")
+    assert aggregators.acquire("linea-1") is not first
@@ -0,0 +1,73 @@
+import numpy as np
+
+from app.services.tiling import grid_tiles, nms_numpy, plan_tiles
+
+
+def _covered(tiles, width, height) -> bool:
+    mask = np.zeros((height, width), dtype=bool)
+    for x1, y1, x2, y2 in tiles:
+        mask[y1:y2, x1:x2] = True
+    return bool(mask.all())
+
+
+def test_grid_tiles_cover_frame_with_overlap():
+    tiles = grid_tiles(1920, 1080, 640, 0.2)
+    assert _covered(tiles, 1920, 1080)
+    assert all(x2 - x1 == 640 and y2 - y1 == 640 for x1, y1, x2, y2 in tiles)
+    # Columnas consecutivas se solapan al menos el 20%
+    starts = sorted({x1 for x1, _, _, _ in tiles})
+    assert all(b - a <= 512 for a, b in zip(starts, starts[1:]))
+    assert starts[-1] == 1920 - 640
+
+
+def test_grid_tiles_smaller_frame_is_single_tile():
+    assert grid_tiles(320, 240, 640, 0.2) == [(0, 0, 320, 240)]
+
+
+def test_plan_tiles_grows_tile_to_fit_budget():
+    tiles = plan_tiles(3840, 2160, 640, 0.2, max_tiles=6)
+    assert len(tiles) <= 6
+    assert _covered(tiles, 3840, 2160)
+
+    # Con presupuesto de un tile se usa el frame completo
+    assert plan_tiles(1920, 1080, 640, 0.2, max_tiles=1) == [(0, 0, 1920, 1080)]
+
+
+def test_plan_tiles_keeps_only_tiles_near_people():
+    people = np.array([[100.0, 100.0, 200.0, 400.0]])
+    tiles = plan_tiles(1920, 1080, 640, 0.2, max_tiles=12, regions=people)
+    assert tiles
+    assert len(tiles) < len(grid_tiles(1920, 1080, 640, 0.2))
+    assert all(x1 < 210 and y1 < 430 for x1, y1, _, _ in tiles)
+
+    # Sin personas se usa la rejilla completa
+    empty = np.zeros((0, 4))
+    assert plan_tiles(1920, 1080, 640, 0.2, 12, regions=empty) == grid_tiles(1920, 1080, 640, 0.2)
+
+
+def test_nms_suppresses_same_class_and_keeps_other_classes():
+    boxes = np.array([
+        [10, 10, 50, 50],
+        [12, 12, 52, 52],      # misma clase, se solapa con la primera
+        [11, 11, 51, 51],      # otra clase en el mismo lugar
+        [200, 200, 240, 240],  # misma clase, lejos
+    ], dtype=np.float32)
+    scores = np.array([0.9, 0.95, 0.5, 0.6], dtype=np.float32)
+    classes = np.array([1, 1, 2, 1])
+    keep = nms_numpy(boxes, scores, classes, 0.5)
+    assert sorted(keep.tolist()) == [1, 2, 3]
+    assert keep[0] == 1
+
+
+def test_nms_merges_object_split_across_tiles():
+    # El mismo guante visto por dos tiles solapados, ya en coordenadas del frame
+    origins = np.array([[0, 0], [512, 0]], dtype=np.float32)
+    local = np.array([[530, 100, 560, 130], [18, 101, 48, 131]], dtype=np.float32)
+    boxes = local + np.tile(origins, 2)
+    keep = nms_numpy(boxes, np.array([0.7, 0.8]), np.array([3, 3]), 0.5)
+    assert keep.tolist() == [1]
+
+
+def test_nms_empty_input():
+    keep = nms_numpy(np.zeros((0, 4)), np.zeros(0), np.zeros(0), 0.5)
+    assert keep.dtype == np.int64 and keep.size == 0
@@ -0,0 +1,57 @@
+import asyncio
+
+from starlette.websockets import WebSocketState
+
+from app.controllers import ppe_controller
+from app.controllers.ppe_controller import INACTIVE_TIMEOUT, WebSocketManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.client_state = WebSocketState.CONNECTED
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000, reason=None):
+        self.closed = (code, reason)
+        self.client_state = WebSocketState.DISCONNECTED
+
+
+def _run_at_deadline(monkeypatch, offset: float) -> FakeWebSocket:
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(ppe_controller.time, "time", lambda: clock["now"])
+
+    async def scenario():
+        manager = WebSocketManager()
+        websocket = FakeWebSocket()
+        assert await manager.connect(websocket)
+        clock["now"] += INACTIVE_TIMEOUT + offset
+        manager._wakeup.set()
+        for _ in range(20):
+            await asyncio.sleep(0)
+        await manager.shutdown()
+        return websocket
+
+    return asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+
+def test_inactive_connection_closed_at_exact_deadline(monkeypatch):
+    websocket = _run_at_deadline(monkeypatch, 0.0)
+    assert websocket.closed == (1000, "Inactividad")
+
+
+def test_inactive_connection_closed_after_deadline(monkeypatch):
+    websocket = _run_at_deadline(monkeypatch, 1e-6)
+    assert websocket.closed == (1000, "Inactividad")
+
+
+def test_active_connection_is_pinged_not_closed(monkeypatch):
+    websocket = _run_at_deadline(monkeypatch, -1.0)
+    assert websocket.closed is None
+    assert websocket.sent and websocket.sent[-1]["type"] == "ping"
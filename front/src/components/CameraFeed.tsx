@@ -18,8 +18,13 @@ interface CameraFeedProps {
   isConnected?: boolean
 }
 
+export interface CaptureOptions {
+  maxSize?: number
+  quality?: number
+}
+
 export interface CameraFeedHandle {
-  handleCapture: () => string | null
+  handleCapture: (options?: CaptureOptions) => string | null
 }
 
 export const CameraFeed = forwardRef<CameraFeedHandle, CameraFeedProps>(
@@ -104,7 +109,7 @@ export const CameraFeed = forwardRef<CameraFeedHandle, CameraFeedProps>(
     onRefresh()
   }
 
-  const handleCapture = () => {
+  const handleCapture = (options?: CaptureOptions) => {
     if (!canvasRef.current) return null
 
     const canvas = canvasRef.current
@@ -114,8 +119,10 @@ export const CameraFeed = forwardRef<CameraFeedHandle, CameraFeedProps>(
     setImageSizeWarning(null)
 
     const processImage = (source: HTMLImageElement | HTMLVideoElement, originalWidth: number, originalHeight: number) => {
-      const maxWidth = 640
-      const maxHeight = 480
+      const maxWidth = options?.maxSize ?? 640
+      const maxHeight = options?.maxSize ?? 480
+      const quality = options?.quality ?? 0.6
+      const retryQuality = Math.min(0.4, quality)
       let targetWidth = originalWidth
       let targetHeight = originalHeight
       
@@ -134,12 +141,12 @@ export const CameraFeed = forwardRef<CameraFeedHandle, CameraFeedProps>(
       canvas.height = targetHeight
       context.drawImage(source, 0, 0, targetWidth, targetHeight)
 
-      let imageData = canvas.toDataURL('image/jpeg', 0.6)
+      let imageData = canvas.toDataURL('image/jpeg', quality)
       let sizeKB = (imageData.length * 0.75) / 1024
 
       if (sizeKB > 1024) {
         console.warn(`Imagen grande: ${sizeKB.toFixed(0)}KB - Comprimiendo...`)
-        imageData = canvas.toDataURL('image/jpeg', 0.4)
+        imageData = canvas.toDataURL('image/jpeg', retryQuality)
         sizeKB = (imageData.length * 0.75) / 1024
         setImageSizeWarning(`Imagen comprimida: ${sizeKB.toFixed(0)}KB`)
       }
@@ -151,7 +158,7 @@ export const CameraFeed = forwardRef<CameraFeedHandle, CameraFeedProps>(
         canvas.width = reducedWidth
         canvas.height = reducedHeight
         context.drawImage(source, 0, 0, reducedWidth, reducedHeight)
-        imageData = canvas.toDataURL('image/jpeg', 0.4)
+        imageData = canvas.toDataURL('image/jpeg', retryQuality)
         sizeKB = (imageData.length * 0.75) / 1024
         setImageSizeWarning(`Resolución reducida: ${sizeKB.toFixed(0)}KB`)
       }
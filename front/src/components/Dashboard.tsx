@@ -4,7 +4,7 @@ import { CameraFeed, type CameraFeedHandle } from './CameraFeed'
 import { StatusPanel } from './StatusPanel'
 import { WarningBanner } from './warningbanner'
 import { DetectionHistory } from './DetectionHistory'
-import { PPEWebSocket, type DetectionResponse } from '../services/ppeService'
+import { PPEWebSocket, type DetectionResponse, type ServerHints } from '../services/ppeService'
 import { useCameraConfig } from '../contexts/camera'
 import { alertService } from '../utils/alertService'
 
@@ -61,6 +61,7 @@ export const Dashboard = forwardRef<DashboardHandle, DashboardProps>(
   const lastSendTimeRef = useRef<number>(0)
   const adaptiveIntervalRef = useRef<number>(1500)
   const latencyHistoryRef = useRef<number[]>([])
+  const serverHintsRef = useRef<ServerHints | null>(null)
 
   // Exponer método clearHistory al componente padre
   useImperativeHandle(ref, () => ({
@@ -137,17 +138,27 @@ export const Dashboard = forwardRef<DashboardHandle, DashboardProps>(
       } else {
         adaptiveIntervalRef.current = 2500
       }
+
+      // No enviar más rápido de lo que el servidor recomienda
+      const hints = serverHintsRef.current
+      if (hints && hints.recommended_fps > 0) {
+        adaptiveIntervalRef.current = Math.max(adaptiveIntervalRef.current, 1000 / hints.recommended_fps)
+      }
       
       console.log(`Intervalo ajustado: ${adaptiveIntervalRef.current}ms (latencia avg: ${avgLatency.toFixed(0)}ms)`)
     }
 
+    // El servidor suaviza el estado por stream; se usa si está disponible
+    const ppeStatusValue = data.smoothed_ppe_status ?? data.ppe_status
+    const isCompliantValue = data.smoothed_is_compliant ?? data.is_compliant
+
     console.log('📝 Actualizando estado con:', {
       ppe_status: data.ppe_status,
       num_detections: data.detections?.length || 0,
       detections: data.detections
     })
     
-    setPpeStatus(data.ppe_status)
+    setPpeStatus(ppeStatusValue)
     setDetections(data.detections || [])
     setIsDetecting(false)
     isProcessingRef.current = false
@@ -158,10 +169,10 @@ export const Dashboard = forwardRef<DashboardHandle, DashboardProps>(
       id: Date.now().toString(),
       fecha: now.toLocaleDateString('es-ES'),
       hora: now.toLocaleTimeString('es-ES'),
-      estado: data.is_compliant ? 'Completo' : 'Incompleto',
-      faltantes: data.is_compliant
+      estado: isCompliantValue ? 'Completo' : 'Incompleto',
+      faltantes: isCompliantValue
         ? ''
-        : Object.entries(data.ppe_status)
+        : Object.entries(ppeStatusValue)
             .filter(([, detected]) => !detected)
             .map(([key]) => {
               const labels: Record<string, string> = {
@@ -188,7 +199,7 @@ export const Dashboard = forwardRef<DashboardHandle, DashboardProps>(
     })
 
     // Ejecutar alertas solo si hay detección y no es compliant
-    if (!data.is_compliant) {
+    if (!isCompliantValue) {
       try {
         const alertTriggered = alertService.trigger(
           config.alerts.type,
@@ -221,6 +232,12 @@ export const Dashboard = forwardRef<DashboardHandle, DashboardProps>(
         () => {
           setIsConnected(false)
           console.log('Desconectado del servidor')
+        },
+        (hints) => {
+          serverHintsRef.current = hints
+          if (hints.recommended_fps > 0) {
+            adaptiveIntervalRef.current = Math.max(adaptiveIntervalRef.current, 1000 / hints.recommended_fps)
+          }
         }
       )
 
@@ -258,7 +275,10 @@ export const Dashboard = forwardRef<DashboardHandle, DashboardProps>(
           setIsDetecting(true)
           lastSendTimeRef.current = Date.now()
           
-          const imageData = cameraFeedRef.current.handleCapture()
+          const hints = serverHintsRef.current
+          const imageData = cameraFeedRef.current.handleCapture(
+            hints ? { maxSize: hints.input_size, quality: hints.jpeg_quality } : undefined
+          )
           if (imageData) {
             console.log('📸 Captura realizada, enviando al servidor...')
             wsRef.current.send(imageData, 0.3)
@@ -16,11 +16,38 @@ export interface Detection {
   bbox: number[]
 }
 
+// Respuesta compacta del servidor (format=compact). Con delta=1 solo
+// llegan los campos que cambiaron respecto al frame anterior.
+interface CompactResult {
+  t: 'r'
+  n: number
+  s?: number
+  ok?: number
+  hp?: number
+  ms?: number
+  d?: number[][]
+  ss?: number
+  sok?: number
+  dl?: number
+  pi?: number
+  k?: number
+}
+
+export interface ServerHints {
+  input_size: number
+  recommended_fps: number
+  jpeg_quality: number
+}
+
 export interface DetectionResponse {
   ppe_status: PPEStatus
   detections: Detection[]
   is_compliant: boolean
   has_person?: boolean
+  smoothed_ppe_status?: PPEStatus | null
+  smoothed_is_compliant?: boolean | null
+  degradation_level?: number | null
+  person_inferred?: boolean | null
 }
 
 
@@ -64,23 +91,29 @@ export class PPEWebSocket {
   private onErrorCallback?: (error: Event) => void
   private onConnectCallback?: () => void
   private onDisconnectCallback?: () => void
+  private onConfigCallback?: (hints: ServerHints) => void
   private isManualDisconnect = false
+  private classTable: Record<string, string> = {}
+  private ppeItems: string[] = []
+  private lastCompact: CompactResult | null = null
 
   constructor(
     onMessage: (data: DetectionResponse) => void,
     onError?: (error: Event) => void,
     onConnect?: () => void,
-    onDisconnect?: () => void
+    onDisconnect?: () => void,
+    onConfig?: (hints: ServerHints) => void
   ) {
     this.onMessageCallback = onMessage
     this.onErrorCallback = onError
     this.onConnectCallback = onConnect
     this.onDisconnectCallback = onDisconnect
+    this.onConfigCallback = onConfig
   }
 
   connect() {
     this.isManualDisconnect = false
-    const wsUrl = API_URL.replace('http', 'ws') + '/api/ws/detect'
+    const wsUrl = API_URL.replace('http', 'ws') + '/api/ws/detect?format=compact&delta=1'
     console.log('🔌 Intentando conectar WebSocket a:', wsUrl)
     
     try {
@@ -89,6 +122,7 @@ export class PPEWebSocket {
       this.ws.onopen = () => {
         console.log('WebSocket conectado exitosamente')
         this.connectionStartTime = Date.now()
+        this.lastCompact = null
         this.startHeartbeat()
         
         this.startStableConnectionTimer()
@@ -108,6 +142,26 @@ export class PPEWebSocket {
             return
           }
           
+          if (data.type === 'classes') {
+            this.classTable = data.classes
+            this.ppeItems = data.ppe_items
+            this.lastCompact = null
+            return
+          }
+
+          if (data.t === 'r') {
+            this.onMessageCallback(this.decodeCompact(data as CompactResult))
+            return
+          }
+
+          if (data.type === 'config') {
+            console.log('⚙️ Recomendación del servidor:', data)
+            if (this.onConfigCallback) {
+              this.onConfigCallback(data as ServerHints)
+            }
+            return
+          }
+          
           if (data.type === 'processing') {
             console.log('⏳ Servidor procesando imagen...')
             return
@@ -180,6 +234,32 @@ export class PPEWebSocket {
     }
   }
 
+  private decodeCompact(message: CompactResult): DetectionResponse {
+    const merged: CompactResult = { ...(this.lastCompact ?? {}), ...message }
+    this.lastCompact = merged
+
+    const toStatus = (bits: number) => Object.fromEntries(
+      this.ppeItems.map((item, index) => [item, (bits & (1 << index)) !== 0])
+    ) as unknown as PPEStatus
+
+    const detections = (merged.d ?? []).map(([classId, confidence, x1, y1, x2, y2]) => ({
+      class: this.classTable[String(classId)] ?? String(classId),
+      confidence: confidence / 100,
+      bbox: [x1, y1, x2, y2],
+    }))
+
+    return {
+      ppe_status: toStatus(merged.s ?? 0),
+      detections,
+      is_compliant: merged.ok === 1,
+      has_person: merged.hp !== 0,
+      smoothed_ppe_status: merged.ss !== undefined ? toStatus(merged.ss) : null,
+      smoothed_is_compliant: merged.sok !== undefined ? merged.sok === 1 : null,
+      degradation_level: merged.dl ?? null,
+      person_inferred: merged.pi !== undefined ? merged.pi === 1 : null,
+    }
+  }
+
   disconnect() {
     this.isManualDisconnect = true
     this.stopHeartbeat()